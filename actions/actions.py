@@ -1,32 +1,141 @@
 #!/usr/local/sbin/charm-env python3
 """Actions module."""
 
+import functools
+import json
 import os
 import sys
 
 sys.path.append("lib")
 
-from charmhelpers.core.hookenv import action_fail  # NOQA E402
-from lib_cron import CronHelper  # NOQA E402
-from lib_logrotate import LogrotateHelper  # NOQA E402
+from charmhelpers.core.hookenv import (  # NOQA E402
+    action_fail,
+    action_get,
+    action_set,
+    function_log,
+)
 
-logrotate = LogrotateHelper()
-cron = CronHelper()
+
+# The helpers and the modules of each action are only loaded by the actions
+# using them, so that the other actions start faster.
+@functools.lru_cache(maxsize=None)
+def logrotate_helper():
+    """Return the logrotate helper, built on first use."""
+    from lib_logrotate import LogrotateHelper
+
+    return LogrotateHelper()
+
+
+@functools.lru_cache(maxsize=None)
+def cron_helper():
+    """Return the cron helper, built on first use."""
+    from lib_cron import CronHelper
+
+    return CronHelper()
 
 
 def update_logrotate_files(args):
     """Update the logrotate files."""
+    logrotate = logrotate_helper()
     logrotate.read_config()
     logrotate.modify_configs()
 
 
+def log_usage_report(args):
+    """Report the disk usage of the logs of every logrotate file."""
+    from lib_logfiles import log_usage
+    from lib_logrotate import LOGROTATE_DIR
+
+    usage = log_usage(LOGROTATE_DIR, action_get("top"))
+    action_set({"usage": json.dumps(usage, indent=2)})
+
+
+def glob_costs(args):
+    """Report the glob expansion cost of the logrotate blocks."""
+    import lib_globs
+    from lib_logrotate import config_paths
+    from lib_snapshot import load_snapshot
+
+    params = action_get()
+    threshold = params.get("threshold")
+    if threshold is None:
+        threshold = load_snapshot().get("logrotate-glob-threshold")
+    blocks = lib_globs.glob_costs(config_paths(), threshold)
+    ranked = sorted(blocks, key=lambda block: (-block["directories"], -block["seconds"]))
+    action_set(
+        {
+            "flagged": json.dumps(lib_globs.flagged(blocks), indent=2),
+            "blocks": json.dumps(ranked[: params["top"]], indent=2),
+        }
+    )
+
+
+def log_overlaps(args):
+    """Report the blocks of different logrotate files claiming the same logs."""
+    from lib_logrotate import config_paths
+
+    logrotate = logrotate_helper()
+    logrotate.read_config()
+    overlaps, disabled = logrotate.find_overlaps(config_paths())
+    action_set(
+        {
+            "count": len(overlaps),
+            "overlaps": json.dumps(overlaps, indent=2),
+            "disabled": json.dumps(disabled, indent=2, sort_keys=True),
+        }
+    )
+
+
+def plan_logrotate_files(args):
+    """Show the changes an update of the logrotate files would make."""
+    from lib_plan import PlanReport
+
+    logrotate = logrotate_helper()
+    logrotate.read_config()
+    params = action_get()
+    if params.get("retention") is not None:
+        logrotate.retention = params["retention"]
+    if params.get("override"):
+        logrotate.override = json.loads(params["override"])
+        logrotate.override_files = logrotate.get_override_files()
+
+    report = PlanReport(params["max-diff-bytes"])
+    for file_path, diff in logrotate.plan_configs():
+        diff = report.add(file_path, diff)
+        if diff:
+            function_log(diff)
+    action_set({"summary": report.summary(), "diff": report.diff()})
+
+
+def rotation_timings(args):
+    """Report the slowest logs of the last timed logrotate runs."""
+    from lib_rotate import load_history, slowest
+
+    history = load_history()
+    if not history:
+        action_fail("No timed logrotate run yet, is logrotate-timing enabled?")
+        return
+    action_set(
+        {
+            "runs": len(history),
+            "slowest": json.dumps(slowest(history, action_get("top")), indent=2),
+        }
+    )
+
+
 def update_cronjob(args):
     """Update the cronjob file."""
+    cron = cron_helper()
     cron.read_config()
     cron.install_cronjob()
 
 
 ACTIONS = {
+    "glob-costs": glob_costs,
+    "log-overlaps": log_overlaps,
+    "log-usage": log_usage_report,
+    "plan-logrotate-files": plan_logrotate_files,
+    "rotation-timings": rotation_timings,
     "update-cronjob": update_cronjob,
     "update-logrotate-files": update_logrotate_files,
 }
@@ -0,0 +1,97 @@
+"""Disk budget module.
+
+Sizes the rotate counts of logrotate blocks so that the rotated logs kept on
+each filesystem fit a byte budget.
+"""
+
+import re
+
+from lib_logfiles import LogScanner
+from lib_parser import parse_config
+
+SIZE_UNITS = {"": 1, "k": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+# Precision of the search for the retention fraction that fits the budget
+SEARCH_STEPS = 32
+
+
+def parse_size(value):
+    """Return the bytes of a size such as "100", "100k", "100M" or "10G"."""
+    match = re.match(r"^\s*(\d+)\s*([kMGT]?)\s*$", str(value))
+    if match is None:
+        raise ValueError("Invalid size: {!r}".format(value))
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def fit_counts(demands, budget):
+    """Return the rotate counts fitting demands in budget bytes.
+
+    demands maps keys to (bytes per rotation, maximum count). Every count is
+    the same fraction of its maximum, so all logs keep about the same number
+    of days, and the largest fraction whose rotated files fit the budget is
+    used. Counts never go below 1, even if that exceeds the budget, nor
+    above their maximum, so a maximum of 0 stays 0.
+    """
+
+    def counts(fraction):
+        return {
+            key: min(maximum, max(1, int(fraction * maximum))) if size else maximum
+            for key, (size, maximum) in demands.items()
+        }
+
+    def usage(candidate):
+        return sum(demands[key][0] * count for key, count in candidate.items())
+
+    if usage(counts(1.0)) <= budget:
+        return counts(1.0)
+
+    low, high = 0.0, 1.0
+    for _ in range(SEARCH_STEPS):
+        middle = (low + high) / 2
+        if usage(counts(middle)) <= budget:
+            low = middle
+        else:
+            high = middle
+    return counts(low)
+
+
+class DiskBudget:
+    """Rotate counts of the logrotate blocks fitting a per-filesystem budget."""
+
+    def __init__(self, budget, retention, scanner=None):
+        """Init function."""
+        self.budget = parse_size(budget)
+        self.retention = retention
+        self.scanner = scanner or LogScanner()
+
+    def block_demand(self, block, calculate_count):
+        """Return (device, bytes per rotation, maximum count) for block, or None.
+
+        None is returned if no log of the block exists yet.
+        """
+        logs = [log for path in block.paths for log in self.scanner.find(path)]
+        if not logs:
+            return None
+        # blocks spanning several filesystems are charged to the first one
+        device = logs[0].device
+        size = sum(log.rotation_size() for log in logs)
+        return device, size, calculate_count(block.interval(), self.retention)
+
+    def counts(self, contents, calculate_count):
+        """Return {file_path: {block index: rotate count}}.
+
+        contents maps the paths of the logrotate files to their content.
+        Blocks whose logs cannot be found keep their day based count.
+        """
+        demands = {}
+        for file_path, content in contents.items():
+            for index, block in enumerate(parse_config(content).blocks):
+                demand = self.block_demand(block, calculate_count)
+                if demand is not None:
+                    device, size, maximum = demand
+                    demands.setdefault(device, {})[(file_path, index)] = (size, maximum)
+
+        result = {}
+        for device_demands in demands.values():
+            for (file_path, index), count in fit_counts(device_demands, self.budget).items():
+                result.setdefault(file_path, {})[index] = count
+        return result
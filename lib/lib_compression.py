@@ -0,0 +1,129 @@
+"""Compression policy module.
+
+Chooses the program logrotate compresses rotated logs with, and renders the
+directives of the policy for the logrotate blocks.
+"""
+
+import os
+import shutil
+from functools import lru_cache
+
+# Directives managed by a compression policy
+COMPRESSION_KEYWORDS = (
+    "compress",
+    "nocompress",
+    "compresscmd",
+    "uncompresscmd",
+    "compressoptions",
+    "compressext",
+    "delaycompress",
+    "nodelaycompress",
+)
+
+# name: (compress program, uncompress program, options, extension, multi-threaded)
+COMPRESSORS = {
+    "gzip": ("gzip", "gunzip", "-6", ".gz", False),
+    "pigz": ("pigz", "unpigz", "-6 -p {threads}", ".gz", True),
+    "zstd": ("zstd", "unzstd", "-3 -q -T{threads}", ".zst", True),
+}
+# Preference of the auto policy, the first installed compressor is used
+AUTO_ORDER = ("zstd", "pigz", "gzip")
+POLICIES = ("", "none", "auto") + tuple(COMPRESSORS)
+
+
+class CompressionPolicy:
+    """Compression directives of the logrotate blocks."""
+
+    def __init__(self, name, command=None, uncommand=None, options="", extension="", threads=0):
+        """Init function.
+
+        name is "none" for a policy disabling compression.
+        """
+        self.name = name
+        self.threads = threads
+        self.command = command
+        self.uncommand = uncommand
+        self.options = options
+        self.extension = extension
+
+    def apply(self, edit, delaycompress=None):
+        """Record the directives of the policy in the block edit.
+
+        delaycompress, if not None, sets delaycompress or nodelaycompress;
+        otherwise the block keeps its own.
+        """
+        if self.name == "none":
+            edit.set(["compress", "nocompress"], "nocompress")
+            edit.remove([keyword for keyword in COMPRESSION_KEYWORDS if keyword != "compress"])
+            return
+        edit.set(["compress", "nocompress"], "compress")
+        edit.set(["compresscmd"], "compresscmd " + self.command)
+        edit.set(["uncompresscmd"], "uncompresscmd " + self.uncommand)
+        edit.set(["compressoptions"], "compressoptions " + self.options)
+        edit.set(["compressext"], "compressext " + self.extension)
+        if delaycompress is not None:
+            edit.set(
+                ["delaycompress", "nodelaycompress"],
+                "delaycompress" if delaycompress else "nodelaycompress",
+            )
+
+    def fingerprint(self):
+        """Return the settings the policy renders, to detect changes."""
+        return [self.name, self.command, self.uncommand, self.options, self.extension]
+
+
+def available_cpus():
+    """Return the number of CPUs the charm may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_policy(name, threads=0):
+    """Return the compression policy name, or None if compression is not managed.
+
+    "auto" picks the first installed compressor of AUTO_ORDER, and a missing
+    compressor falls back to gzip. Multi-threaded compressors use threads
+    threads, or half of the available CPUs if threads is 0, since rotation
+    should not starve the workloads of the unit. Policies are cached by the
+    compressors found and the CPUs available, so a long-lived process picks
+    up a compressor installed later.
+    """
+    if not name:
+        return None
+    if name not in POLICIES:
+        raise ValueError(
+            "Invalid compression {!r}, valid options: {}".format(
+                name, ", ".join(repr(policy) for policy in POLICIES)
+            )
+        )
+    if name == "none":
+        return CompressionPolicy("none", threads=threads)
+
+    candidates = AUTO_ORDER if name == "auto" else (name, "gzip")
+    found = tuple(
+        (shutil.which(COMPRESSORS[candidate][0]), shutil.which(COMPRESSORS[candidate][1]))
+        for candidate in candidates
+    )
+    return _build_policy(candidates, found, threads, available_cpus())
+
+
+@lru_cache(maxsize=None)
+def _build_policy(candidates, found, threads, cpus):
+    """Return the policy of the first compressor of candidates found installed."""
+    for candidate, (command, uncommand) in zip(candidates, found):
+        program, unprogram, options, extension, threaded = COMPRESSORS[candidate]
+        if command and uncommand:
+            break
+    else:
+        # gzip is essential on Ubuntu, keep the logrotate default
+        candidate = "gzip"
+        program, unprogram, options, extension, threaded = COMPRESSORS["gzip"]
+        command, uncommand = "/bin/gzip", "/bin/gunzip"
+
+    requested_threads = threads
+    if threaded:
+        threads = threads or max(1, cpus // 2)
+        options = options.format(threads=threads)
+    return CompressionPolicy(candidate, command, uncommand, options, extension, requested_threads)
@@ -0,0 +1,295 @@
+"""Copytruncate helper module.
+
+With copytruncate logrotate copies a log through userspace before truncating
+it, so a multi-GB log is read and written in full during the rotation. The
+helper makes the copy in the kernel instead: a reflink on filesystems
+sharing extents (btrfs, xfs), copy_file_range or sendfile elsewhere.
+
+It runs from the prerotate and postrotate scripts of a block. prerotate
+stages a copy of the log and truncates it, so that logrotate only copies
+what was written since; postrotate appends that to the staged copy and
+renames the staged copy over the archive logrotate made.
+
+The archive is named after the log with SUFFIX, a strftime format such as
+-%Y%m%d for dated archives, or the start count such as .1 for numbered ones.
+Only a file with such a name that was not there when the log was staged is
+replaced, so a sibling log or an older archive is never overwritten.
+
+Usage: lib_copytruncate.py {stage,finish} LOG [SUFFIX]
+"""
+
+import errno
+import fcntl
+import json
+import os
+import re
+import shlex
+import sys
+
+from lib_fileio import copy_attributes
+from lib_parser import INDENT
+
+# ioctl cloning a whole file, from linux/fs.h
+FICLONE = 0x40049409
+STAGED_SUFFIX = ".charm-copytruncate"
+# Archives of the log when it was staged, to tell the new one apart
+ARCHIVES_SUFFIX = STAGED_SUFFIX + ".json"
+NUMBERED_SUFFIX = ".1"
+# strftime directives of names, the others are numbers
+NAME_DIRECTIVES = "aAbBhp"
+# Errors of a copy method the filesystem or kernel does not support
+UNSUPPORTED = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+}
+CHUNK = 1 << 30
+HELPER_SCRIPTS = (("prerotate", "stage"), ("postrotate", "finish"))
+
+
+def helper_command(action, suffix=NUMBERED_SUFFIX):
+    """Return the script line running action on the log logrotate passes as $1.
+
+    The helper runs with the python of the charm virtualenv, found from the
+    location of this module so that the line is the same in every context.
+    suffix names the archives of the log.
+    """
+    lib_dir = os.path.dirname(os.path.abspath(__file__))
+    unit_dir = os.path.dirname(os.path.dirname(lib_dir))
+    return '{} {} {} "$1" {}'.format(
+        os.path.join(unit_dir, ".venv/bin/python3"),
+        os.path.join(lib_dir, "lib_copytruncate.py"),
+        action,
+        shlex.quote(suffix),
+    )
+
+
+def archive_suffix(block, date_format=None):
+    """Return the suffix logrotate adds to the name of a log of block to archive it.
+
+    date_format is the dateformat the block is switched to dated archives
+    with, if it is. A dateext set globally in logrotate.conf is not known
+    here: the helper then finds no new numbered archive and keeps the staged
+    copy.
+    """
+    if date_format is None and block.has("dateext") and not block.has("nodateext"):
+        date_format = "-%Y%m%d%H" if block.has("hourly") else "-%Y%m%d"
+    if date_format is not None:
+        formats = [node.args for node in block.directives("dateformat")]
+        return formats[-1] if formats else date_format
+    starts = [node.args for node in block.directives("start")]
+    return "." + starts[-1] if starts else NUMBERED_SUFFIX
+
+
+def is_helper_script(node):
+    """Check whether the script node runs the helper."""
+    return any("lib_copytruncate.py" in line for line in node.lines[1:-1])
+
+
+def apply(block, edit, enabled=True, date_format=None):
+    """Record the helper scripts of block in the edit, or their removal.
+
+    Only blocks using copytruncate get the helper, and only if they have no
+    prerotate or postrotate script of their own, run their scripts once for
+    all logs (sharedscripts), move archives to an olddir or name them with
+    an extension. date_format is the dateformat the block is switched to
+    dated archives with, if it is.
+    """
+    keywords = [keyword for keyword, _ in HELPER_SCRIPTS]
+    scripts = block.scripts(*keywords)
+    if not all(is_helper_script(node) for node in scripts):
+        return
+    if (
+        enabled
+        and block.has("copytruncate")
+        and not block.has("sharedscripts", "olddir", "extension", "addextension")
+    ):
+        suffix = archive_suffix(block, date_format)
+        for keyword, action in HELPER_SCRIPTS:
+            edit.set(
+                [keyword],
+                "{}\n{}{}\n{}endscript".format(
+                    keyword, INDENT * 2, helper_command(action, suffix), INDENT
+                ),
+            )
+    elif scripts:
+        edit.remove(keywords)
+
+
+def copy_range(source_fd, destination_fd, offset=0):
+    """Copy source_fd, from offset to its end, to the end of destination_fd.
+
+    copy_file_range is used if the kernel supports it for these files,
+    sendfile otherwise. Return the method used.
+    """
+    position = os.lseek(destination_fd, 0, os.SEEK_END)
+    if hasattr(os, "copy_file_range"):
+        start = offset
+        try:
+            while True:
+                copied = os.copy_file_range(source_fd, destination_fd, CHUNK, offset, position)
+                if not copied:
+                    return "copy_file_range"
+                offset += copied
+                position += copied
+        except OSError as err:
+            # only fall back before anything was copied
+            if err.errno not in UNSUPPORTED or offset != start:
+                raise
+    while True:
+        copied = os.sendfile(destination_fd, source_fd, offset, CHUNK)
+        if not copied:
+            return "sendfile"
+        offset += copied
+
+
+def clone(source, destination):
+    """Copy source to destination with the cheapest method the kernel offers.
+
+    Return the method used: "reflink", "copy_file_range" or "sendfile".
+    """
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return "reflink"
+        except OSError as err:
+            if err.errno not in UNSUPPORTED:
+                raise
+        return copy_range(source_file.fileno(), destination_file.fileno())
+
+
+def suffix_pattern(suffix):
+    """Return the regex matching the archive suffixes suffix renders to."""
+    parts = []
+    position = 0
+    for match in re.finditer("%(.)", suffix):
+        parts.append(re.escape(suffix[position : match.start()]))
+        directive = match.group(1)
+        if directive == "%":
+            parts.append("%")
+        elif directive in NAME_DIRECTIVES:
+            parts.append("[A-Za-z]+")
+        else:
+            parts.append(r"\d+")
+        position = match.end()
+    parts.append(re.escape(suffix[position:]))
+    return re.compile("".join(parts) + r"\Z")
+
+
+def archives(log, suffix):
+    """Return the archives of log named with suffix.
+
+    They map names to the inode number and modification time of the file,
+    which tell a new archive from one renamed or removed since.
+    """
+    directory, name = os.path.split(os.path.abspath(log))
+    pattern = suffix_pattern(suffix)
+    found = {}
+    for entry in os.scandir(directory):
+        if not entry.name.startswith(name) or not pattern.match(entry.name, len(name)):
+            continue
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        found[entry.name] = [stat.st_ino, stat.st_mtime_ns]
+    return found
+
+
+def stage(log, suffix=NUMBERED_SUFFIX):
+    """Copy log aside and truncate it, before logrotate copies it.
+
+    The archives of log named with suffix are recorded, for finish to find
+    the new one. Any failure leaves the log untouched, so logrotate falls
+    back to its own copy. Return the method used, or None if the log was not
+    staged.
+    """
+    staged = log + STAGED_SUFFIX
+    if os.path.exists(staged):
+        # left by a rotation that did not finish, it must not be overwritten
+        print("Not staging {}: {} exists".format(log, staged), file=sys.stderr)
+        return None
+    try:
+        with open(log + ARCHIVES_SUFFIX, "w") as archives_file:
+            json.dump(archives(log, suffix), archives_file)
+        method = clone(log, staged)
+        copy_attributes(log, staged)
+    except OSError as err:
+        print("Not staging {}: {}".format(log, err), file=sys.stderr)
+        for path in (staged, log + ARCHIVES_SUFFIX):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return None
+    os.truncate(log, 0)
+    return method
+
+
+def rotated_archive(log, suffix=NUMBERED_SUFFIX):
+    """Return the archive logrotate just copied log to, or None.
+
+    It is the only archive of log named with suffix that is not the same
+    file as when log was staged: a numbered archive replaced by the new one,
+    or a new dated archive. None is returned unless there is exactly one, so
+    that no other file is overwritten.
+    """
+    try:
+        with open(log + ARCHIVES_SUFFIX, "r") as archives_file:
+            staged = json.load(archives_file)
+    except (OSError, ValueError):
+        return None
+    new = [name for name, file_id in archives(log, suffix).items() if staged.get(name) != file_id]
+    if len(new) != 1:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(log)), new[0])
+
+
+def finish(log, suffix=NUMBERED_SUFFIX):
+    """Replace the archive logrotate made with the staged copy of log.
+
+    What was written to the log between the staging and the copy by
+    logrotate is appended to the staged copy first. Return the archive path,
+    or None if the log was not staged or its new archive is not known for
+    sure, in which case the staged copy is kept.
+    """
+    staged = log + STAGED_SUFFIX
+    if not os.path.exists(staged):
+        return None
+    archive = rotated_archive(log, suffix)
+    if archive is None:
+        print("No new archive of {} found, keeping {}".format(log, staged), file=sys.stderr)
+        return None
+    # copy_file_range and sendfile refuse files opened for appending
+    with open(archive, "rb") as archive_file, open(staged, "r+b") as staged_file:
+        copy_range(archive_file.fileno(), staged_file.fileno())
+    copy_attributes(archive, staged)
+    os.replace(staged, archive)
+    os.unlink(log + ARCHIVES_SUFFIX)
+    return archive
+
+
+def main(argv=None):
+    """Ran by the prerotate and postrotate scripts of logrotate."""
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) not in (2, 3) or args[0] not in ("stage", "finish"):
+        print(__doc__.splitlines()[-1], file=sys.stderr)
+        return 2
+    action, log, *suffix = args
+    # logrotate skips the log if prerotate fails, and reports a failed
+    # postrotate: neither should happen because of the helper
+    try:
+        if action == "stage":
+            stage(log, *suffix)
+        else:
+            finish(log, *suffix)
+    except OSError as err:
+        print("copytruncate helper {} of {} failed: {}".format(action, log, err), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
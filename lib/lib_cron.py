@@ -1,13 +1,65 @@
 """Cron helper module."""
 
+import hashlib
+import logging
 import os
 import random
 import re
+import subprocess
 from datetime import datetime
 
-from charmhelpers.core import hookenv
-
-from lib_logrotate import LogrotateHelper
+from lib_fileio import replace_file
+from lib_metrics import RunMetrics
+from lib_snapshot import load_snapshot
+from lib_systemd import (
+    is_systemd_host,
+    packaged_unit_exists,
+    remove_drop_in,
+    systemctl,
+    write_drop_in,
+)
+from lib_timer import LOGROTATE_TIMER, REFRESH_TIMER, SCHEDULERS, Timer, TimerHelper
+
+MACHINE_ID_FILE = "/etc/machine-id"
+CRON_DAILY_LOGROTATE = "/etc/cron.daily/logrotate"
+# run-parts skips names with a dot, so the diverted script only runs wrapped
+CRON_DAILY_LOGROTATE_DIVERTED = "/etc/cron.daily/logrotate.charm-diverted"
+WRAPPER_MARKER = "# Managed by the logrotate charm, do not edit."
+LOGROTATE_COMMAND = "/usr/sbin/logrotate /etc/logrotate.conf"
+# the packaged cron.daily script leaves rotation to logrotate.timer on systemd hosts
+SYSTEMD_GUARD = "if [ -d /run/systemd/system ]; then exit 0; fi"
+# so there the packaged logrotate.service runs logrotate like the wrapper does
+LOGROTATE_SERVICE = "logrotate.service"
+LOGROTATE_DROP_IN = "charm-logrotate.conf"
+# Consecutive multiples of this fraction are evenly spread over [0, 1)
+GOLDEN_RATIO_CONJUGATE = (5**0.5 - 1) / 2
+TIMER_OPTIONS = {
+    "logrotate-scheduler",
+    "logrotate-timer-randomized-delay",
+    "logrotate-timer-accuracy",
+    "logrotate-timer-persistent",
+    "logrotate-timer-cpu-weight",
+    "logrotate-timer-io-weight",
+    "logrotate-timer-nice",
+}
+# Options the cron job refreshing the logrotate files depends on
+REFRESH_JOB_OPTIONS = TIMER_OPTIONS | {
+    "logrotate-cronjob",
+    "logrotate-cronjob-frequency",
+    "logrotate-cronjob-standalone",
+    "logrotate-watcher",
+    "logrotate-pressure-defer",
+}
+# Options the cron.daily schedule and wrapper of logrotate depend on
+CRON_DAILY_OPTIONS = TIMER_OPTIONS | {
+    "logrotate-cronjob",
+    "update-cron-daily-schedule",
+    "logrotate-pressure-defer",
+    "logrotate-timing",
+    "logrotate-state-shards",
+}
+
+logger = logging.getLogger(__name__)
 
 
 class CronHelper:
@@ -19,6 +71,13 @@ class CronHelper:
         self.cronjob_etc_config = "/etc/logrotate_cronjob_config"
         self.cronjob_check_paths = ["hourly", "daily", "weekly", "monthly"]
         self.cronjob_logrotate_cron_file = "charm-logrotate"
+        self.watcher_enabled = False
+        self.cronjob_standalone = False
+        self.scheduler = "cron"
+        self.timer_helper = TimerHelper()
+        self.pressure_defer = False
+        self.rotate_timing = False
+        self.shard_workers = 0
 
     class InvalidCronConfig(ValueError):
         """Raised for invalid cron.daily config input."""
@@ -31,61 +90,337 @@ class CronHelper:
         Config changed/install hooks dumps config out to disk,
         Here we read that config to update the cronjob.
         """
-        config_file = open(self.cronjob_etc_config, "r")
-        lines = config_file.read()
-        lines = lines.split("\n")
+        snapshot = load_snapshot(self.cronjob_etc_config)
 
-        if lines[0] == "True":
-            self.cronjob_enabled = True
-        else:
-            self.cronjob_enabled = False
+        self.cronjob_enabled = snapshot.get("logrotate-cronjob")
+
+        self.cronjob_frequency = int(
+            self.cronjob_check_paths.index(snapshot.get("logrotate-cronjob-frequency"))
+        )
 
-        self.cronjob_frequency = int(self.cronjob_check_paths.index(lines[1]))
+        self.cron_daily_schedule = snapshot.get("update-cron-daily-schedule")
 
-        self.cron_daily_schedule = lines[3]
+        self.watcher_enabled = snapshot.get("logrotate-watcher")
+        self.cronjob_standalone = snapshot.get("logrotate-cronjob-standalone")
+        self.scheduler = snapshot.get("logrotate-scheduler")
+        self.timer_helper = TimerHelper.from_snapshot(snapshot)
+        self.pressure_defer = snapshot.get("logrotate-pressure-defer")
+        self.rotate_timing = snapshot.get("logrotate-timing")
+        self.shard_workers = snapshot.get("logrotate-state-shards")
 
-    def install_cronjob(self):
+    def install_cronjob(self, changed=None):
         """Install the cron job task.
 
         If logrotate-cronjob config option is set to True install cronjob,
-        otherwise cleanup.
+        otherwise cleanup. The watcher service replaces the cronjob when it
+        is enabled. With the systemd scheduler, timers replace the cronjob
+        and the cron.daily schedule of logrotate.
+        changed is the set of options changed since the last install: only
+        the cron files depending on them are rewritten. Everything is
+        installed if it is None.
+        """
+        if self.scheduler not in SCHEDULERS:
+            raise self.InvalidCronConfig(
+                "Invalid value for logrotate-scheduler: {}".format(self.scheduler)
+            )
+        refresh_job = changed is None or bool(changed & REFRESH_JOB_OPTIONS)
+        cron_daily = changed is None or bool(changed & CRON_DAILY_OPTIONS)
+        if not (refresh_job or cron_daily):
+            return
+        use_timers = self.scheduler == "systemd"
+        with RunMetrics("install_cronjob").run():
+            if refresh_job:
+                self.cleanup_cronjob_files()
+            timers = []
+
+            if self.cronjob_enabled is True:
+                if not self.watcher_enabled:
+                    if use_timers:
+                        timers.append(self.refresh_timer())
+                    elif refresh_job:
+                        self.write_cronjob_file()
+
+                if self.validate_cron_daily_schedule_conf():
+                    if use_timers:
+                        timers.append(self.logrotate_timer())
+                    elif cron_daily:
+                        self.update_cron_daily_schedule()
+            elif not self.watcher_enabled:
+                # the watcher service still needs the saved config
+                self.cleanup_etc_config()
+
+            self.timer_helper.update_timers(timers)
+            wrapped = bool(
+                self.cronjob_enabled is True
+                and (self.pressure_defer or self.rotate_timing or self.shard_workers)
+                and not use_timers
+            )
+            self.update_cron_daily_wrapper(wrapped)
+            self.update_logrotate_service(wrapped)
+            if cron_daily and not self.shard_workers:
+                from lib_state import merge_shards
+
+                if merge_shards() is False:
+                    logger.info(
+                        "logrotate is running, the update-status hook will merge the state shards."
+                    )
+
+    def uninstall_cronjob(self):
+        """Remove the cron job, the timers and the cron.daily wrapper of the charm.
+
+        The packaged cron.daily script, logrotate.timer and logrotate.service
+        take over again. The saved config is removed too.
         """
         self.cleanup_cronjob_files()
+        TimerHelper().update_timers([])
+        self.update_cron_daily_wrapper(False)
+        self.update_logrotate_service(False)
+        self.cleanup_etc_config()
+
+    def write_cronjob_file(self):
+        """Write the cron job updating the logrotate files."""
+        cronjob_path = os.path.realpath(__file__)
+        cron_file_path = (
+            self.cronjob_base_path
+            + self.cronjob_check_paths[self.cronjob_frequency]
+            + "/"
+            + self.cronjob_logrotate_cron_file
+        )
+
+        python_venv_path = self.python_venv_path()
+        prefix = self.pressure_command("refresh")
+        if self.cronjob_standalone:
+            cron_job = self.render_standalone_cronjob(python_venv_path, cronjob_path, prefix)
+        else:
+            cron_job = self.render_juju_exec_cronjob(python_venv_path, cronjob_path, prefix)
+        replace_file(cron_file_path, cron_job, mode=0o755)
+
+    def refresh_timer(self):
+        """Return the timer of the job updating the logrotate files."""
+        cronjob_path = os.path.realpath(__file__)
+        python_venv_path = self.python_venv_path()
+        if self.cronjob_standalone:
+            refresh_path = os.path.join(os.path.dirname(cronjob_path), "lib_refresh.py")
+            exec_start = "{} {}".format(python_venv_path, refresh_path)
+        else:
+            from charmhelpers.core import hookenv
 
-        if self.cronjob_enabled is True:
-            cronjob_path = os.path.realpath(__file__)
-            cron_file_path = (
-                self.cronjob_base_path
-                + self.cronjob_check_paths[self.cronjob_frequency]
-                + "/"
-                + self.cronjob_logrotate_cron_file
+            exec_start = '/usr/bin/{} {} "{} {}"'.format(
+                self.juju_exec(), hookenv.local_unit(), python_venv_path, cronjob_path
             )
+        exec_start = self.pressure_command("refresh") + exec_start
+        return Timer(
+            REFRESH_TIMER,
+            "Juju logrotate charm update of /etc/logrotate.d",
+            self.cronjob_check_paths[self.cronjob_frequency],
+            exec_start,
+        )
+
+    def logrotate_timer(self):
+        """Return the timer of logrotate, scheduled like the cron.daily job.
+
+        A random schedule starts the timer at the beginning of the range,
+        with a randomized delay spanning the range, so the time changes on
+        every run rather than on every config change. A spread schedule runs
+        at the slot of the unit without randomized delay.
+        """
+        schedule_type, _, schedule_value = self.cron_daily_schedule.partition(",")
+        randomized_delay = None
+        if schedule_type == "set":
+            on_calendar = self.calendar_time(schedule_value)
+        elif schedule_type == "random":
+            start_time, _, end_time = schedule_value.partition(",")
+            on_calendar = self.calendar_time(start_time)
+            start = datetime.strptime(start_time, "%H:%M")
+            end = datetime.strptime(end_time, "%H:%M")
+            randomized_delay = "{}min".format(int((end - start).total_seconds()) // 60)
+        elif schedule_type == "spread":
+            start_time, _, end_time = schedule_value.partition(",")
+            hour, minute = self.get_spread_time(start_time, end_time, self.unit_position())
+            on_calendar = self.calendar_time("{}:{}".format(hour, minute))
+            # the slot already spreads the units, keep it exact
+            randomized_delay = "0"
+        else:
+            on_calendar = "daily"
+        return Timer(
+            LOGROTATE_TIMER,
+            "Rotate log files",
+            on_calendar,
+            self.pressure_command("logrotate") + self.logrotate_command(),
+            randomized_delay,
+        )
 
-            logrotate_unit = hookenv.local_unit()
-            python_venv_path = os.getcwd().replace("charm", "") + ".venv/bin/python3"
-            # juju run was changed to juju exec in juju 3.0.
-            # This will return True if juju is at least version 3.0.
-            if hookenv.has_juju_version("3.0"):
-                juju_exec = "juju-exec"
-            else:
-                juju_exec = "juju-run"
-            # upgrade to template if logic increases
-            cron_job = """#!/bin/bash
-/usr/bin/sudo /usr/bin/{juju_exec} {logrotate_unit} "{python_venv_path} {cronjob_path}"
-""".format(
-                juju_exec=juju_exec,
-                logrotate_unit=logrotate_unit,
-                python_venv_path=python_venv_path,
-                cronjob_path=cronjob_path,
+    @staticmethod
+    def calendar_time(timestamp):
+        """Return the daily systemd calendar event of a "08:30" timestamp."""
+        hour, minute = [int(t) for t in timestamp.split(":")]
+        return "*-*-* {:02d}:{:02d}:00".format(hour, minute)
+
+    def pressure_command(self, job):
+        """Return the prefix deferring a command while the host is busy.
+
+        The prefix is empty if deferral is disabled. The wrapper runs outside
+        of juju-exec, so a deferred job does not hold the machine lock; as
+        its lower priority only reaches the juju-exec client, the job run in
+        the agent lowers its own priority in main.
+        """
+        if not self.pressure_defer:
+            return ""
+        pressure_path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "lib_pressure.py"
+        )
+        return "{} {} --job {} ".format(self.python_venv_path(), pressure_path, job)
+
+    def logrotate_command(self):
+        """Return the command rotating the logs.
+
+        The logs are rotated by shard with logrotate-state-shards, and timed if
+        rotation timing is enabled.
+        """
+        if self.shard_workers:
+            state_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "lib_state.py")
+            return "{} {} --workers {}{} /etc/logrotate.conf".format(
+                self.python_venv_path(),
+                state_path,
+                self.shard_workers,
+                " --timing" if self.rotate_timing else "",
             )
-            with open(cron_file_path, "w") as cron_file:
-                cron_file.write(cron_job)
-            os.chmod(cron_file_path, 0o755)
+        if not self.rotate_timing:
+            return LOGROTATE_COMMAND
+        rotate_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "lib_rotate.py")
+        return "{} {} /etc/logrotate.conf".format(self.python_venv_path(), rotate_path)
 
-            if self.validate_cron_daily_schedule_conf():
-                self.update_cron_daily_schedule()
+    def render_cron_daily_wrapper(self):
+        """Return the wrapper of the cron.daily logrotate script.
+
+        With rotation timing or state shards the wrapper runs logrotate
+        itself, keeping the systemd check of the packaged script; otherwise it
+        runs the packaged script.
+        """
+        lines = ["#!/bin/sh", WRAPPER_MARKER]
+        prefix = self.pressure_command("cron_daily")
+        if self.rotate_timing or self.shard_workers:
+            try:
+                with open(CRON_DAILY_LOGROTATE_DIVERTED, "r") as script:
+                    guarded = "/run/systemd/system" in script.read()
+            except OSError:
+                guarded = False
+            if guarded:
+                lines.append(SYSTEMD_GUARD)
+            lines.append("exec {}{}".format(prefix, self.logrotate_command()))
+        else:
+            lines.append("exec {}{}".format(prefix, CRON_DAILY_LOGROTATE_DIVERTED))
+        return "\n".join(lines) + "\n"
+
+    def update_cron_daily_wrapper(self, enabled):
+        """Wrap the cron.daily logrotate script, or unwrap it.
+
+        The wrapper defers rotation while the host is busy and times it. The
+        script of the logrotate package is diverted with dpkg-divert, so
+        package upgrades update the diverted script and keep the wrapper.
+        """
+        wrapped = self.is_cron_daily_wrapped()
+        if enabled:
+            if not wrapped:
+                if not os.path.exists(CRON_DAILY_LOGROTATE):
+                    return
+                subprocess.check_call(
+                    [
+                        "dpkg-divert",
+                        "--local",
+                        "--rename",
+                        "--divert",
+                        CRON_DAILY_LOGROTATE_DIVERTED,
+                        "--add",
+                        CRON_DAILY_LOGROTATE,
+                    ]
+                )
+            wrapper = self.render_cron_daily_wrapper()
+            replace_file(CRON_DAILY_LOGROTATE, wrapper, mode=0o755)
+        elif wrapped:
+            os.remove(CRON_DAILY_LOGROTATE)
+            subprocess.check_call(
+                ["dpkg-divert", "--local", "--rename", "--remove", CRON_DAILY_LOGROTATE]
+            )
+
+    def render_logrotate_service_drop_in(self):
+        """Return the drop-in running the packaged logrotate.service like the wrapper."""
+        return "{}\n[Service]\nExecStart=\nExecStart={}{}\n".format(
+            WRAPPER_MARKER, self.pressure_command("logrotate"), self.logrotate_command()
+        )
+
+    def update_logrotate_service(self, enabled):
+        """Run the packaged logrotate.service like the cron.daily wrapper, or restore it.
+
+        On systemd hosts the packaged cron.daily script, and so the wrapper,
+        exits early, leaving the rotation to the packaged logrotate.timer: a
+        drop-in then replaces the command of its service.
+        """
+        if enabled and is_systemd_host() and packaged_unit_exists(LOGROTATE_SERVICE):
+            changed = write_drop_in(
+                LOGROTATE_SERVICE, LOGROTATE_DROP_IN, self.render_logrotate_service_drop_in()
+            )
         else:
-            self.cleanup_etc_config()
+            changed = remove_drop_in(LOGROTATE_SERVICE, LOGROTATE_DROP_IN)
+        if changed:
+            systemctl("daemon-reload")
+
+    @staticmethod
+    def is_cron_daily_wrapped():
+        """Check whether the cron.daily logrotate script is the charm wrapper."""
+        try:
+            with open(CRON_DAILY_LOGROTATE, "r") as script:
+                return WRAPPER_MARKER in script.read(4096).splitlines()
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    @staticmethod
+    def python_venv_path():
+        """Return the python interpreter of the charm virtualenv."""
+        return os.getcwd().replace("charm", "") + ".venv/bin/python3"
+
+    @staticmethod
+    def juju_exec():
+        """Return the juju command running commands in hook context."""
+        from charmhelpers.core import hookenv
+
+        # juju run was changed to juju exec in juju 3.0.
+        # This will return True if juju is at least version 3.0.
+        if hookenv.has_juju_version("3.0"):
+            return "juju-exec"
+        return "juju-run"
+
+    @staticmethod
+    def render_juju_exec_cronjob(python_venv_path, cronjob_path, prefix=""):
+        """Return the cron job running this module through juju-exec.
+
+        prefix is prepended to the command, to wrap it.
+        """
+        from charmhelpers.core import hookenv
+
+        logrotate_unit = hookenv.local_unit()
+        juju_exec = CronHelper.juju_exec()
+        # upgrade to template if logic increases
+        return """#!/bin/bash
+{prefix}/usr/bin/sudo /usr/bin/{juju_exec} {logrotate_unit} "{python_venv_path} {cronjob_path}"
+""".format(
+            prefix=prefix,
+            juju_exec=juju_exec,
+            logrotate_unit=logrotate_unit,
+            python_venv_path=python_venv_path,
+            cronjob_path=cronjob_path,
+        )
+
+    @staticmethod
+    def render_standalone_cronjob(python_venv_path, cronjob_path, prefix=""):
+        """Return the cron job running lib_refresh without hook context.
+
+        prefix is prepended to the command, to wrap it.
+        """
+        refresh_path = os.path.join(os.path.dirname(cronjob_path), "lib_refresh.py")
+        return """#!/bin/bash
+{prefix}{python_venv_path} {refresh_path}
+""".format(prefix=prefix, python_venv_path=python_venv_path, refresh_path=refresh_path)
 
     def cleanup_cronjob_files(self):
         """Cleanup previous cronjob files."""
@@ -103,6 +438,8 @@ class CronHelper:
 
     def update_logrotate_etc(self):
         """Run logrotate update config."""
+        from lib_logrotate import LogrotateHelper
+
         logrotate = LogrotateHelper()
         logrotate.read_config()
         logrotate.modify_configs()
@@ -123,6 +460,12 @@ class CronHelper:
                 cron_daily_start, cron_daily_end
             )
 
+        elif schedule_type == "spread":
+            cron_daily_start, _, cron_daily_end = schedule_value.partition(",")
+            cron_daily_hour, cron_daily_minute = CronHelper.get_spread_time(
+                cron_daily_start, cron_daily_end, self.unit_position()
+            )
+
         elif schedule_type == "unset":
             # Revert to default ubuntu/debian values for daily cron job
             cron_daily_hour = "6"
@@ -160,6 +503,52 @@ class CronHelper:
         random_minute = (total_start_minutes + random_minutes) % 60
         return str(random_hour), str(random_minute)
 
+    @staticmethod
+    def get_spread_time(start_time, end_time, position):
+        """Return the time at position, from 0 to 1, of the provided time range.
+
+        start_time and end_time are both timestamps in the format "08:30".
+        The range is split in one minute slots and the time is returned as
+        hour and minute strings.
+        """
+        start_hour, start_minute = [int(t) for t in start_time.split(":")]
+        end_hour, end_minute = [int(t) for t in end_time.split(":")]
+        total_start_minutes = start_hour * 60 + start_minute
+        total_minutes_range = end_hour * 60 + end_minute - total_start_minutes
+
+        slot = min(int(position * (total_minutes_range + 1)), total_minutes_range)
+        return str((total_start_minutes + slot) // 60), str((total_start_minutes + slot) % 60)
+
+    @staticmethod
+    def unit_position():
+        """Return the position of this unit in the spread schedule, from 0 to 1.
+
+        Units of an application are placed by their unit number along the
+        golden ratio sequence, which keeps any number of consecutive units
+        evenly spaced; the sequence starts at an offset hashed from the model
+        and application, so applications sharing storage do not overlap.
+        Units without a number are hashed with the machine id instead.
+        The position never changes for a unit.
+        """
+        from charmhelpers.core import hookenv
+
+        unit = hookenv.local_unit()
+        application, _, number = unit.partition("/")
+        if number.isdigit():
+            key = "{}/{}".format(hookenv.model_uuid() or "", application)
+            step = int(number) * GOLDEN_RATIO_CONJUGATE
+        else:
+            try:
+                with open(MACHINE_ID_FILE, "r") as machine_id_file:
+                    machine_id = machine_id_file.read().strip()
+            except OSError:
+                machine_id = ""
+            key = "{}/{}".format(machine_id, unit)
+            step = 0.0
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        offset = int.from_bytes(digest[:8], "big") / 2**64
+        return (offset + step) % 1.0
+
     def write_to_crontab(self, cron_daily_timestamp):
         """Write daily cronjob with provided timestamp to /etc/crontab."""
         cron_pattern = re.compile(r".*\/etc\/cron.daily.*")
@@ -175,8 +564,7 @@ class CronHelper:
                 cron_daily[0],
             )
             updated_data = data.replace(cron_daily[0], updated_cron_daily)
-            with open(r"/etc/crontab", "w") as crontab:
-                crontab.write(updated_data)
+            replace_file(r"/etc/crontab", updated_data)
 
     def validate_cron_daily_schedule_conf(self):
         """Validate configuration for update-cron-daily-schedule.
@@ -187,23 +575,22 @@ class CronHelper:
             conf = self.cron_daily_schedule
             conf = conf.split(",")
             operation = conf[0]
-            if operation not in ("unset", "set", "random") or len(conf) > 3:
+            if operation not in ("unset", "set", "random", "spread") or len(conf) > 3:
                 raise ValueError("Invalid value for update-cron-daily-schedule: {}".format(conf))
 
             result = True
             # run additional validation functions
             if operation == "set":
                 result = CronHelper._validate_set_schedule(conf[1])
-            elif operation == "random":
+            elif operation in ("random", "spread"):
                 result = CronHelper._validate_random_schedule(conf[1], conf[2])
 
             return result
 
         except ValueError as err:
-            hookenv.log(
-                "Cron config validation failed: {}".format(err),
-                level=hookenv.ERROR,
-            )
+            from charmhelpers.core import hookenv
+
+            logger.error("Cron config validation failed: %s", err)
             hookenv.status_set(
                 "blocked", "Cron config validation failed. Check log for more info."
             )
@@ -263,12 +650,23 @@ class CronHelper:
 
 def main():
     """Ran by cron."""
-    hookenv.log("Executing cron job.", level=hookenv.INFO)
+    from charmhelpers.core import hookenv
+    from lib_jujulog import setup_juju_logging
+
+    setup_juju_logging()
+    if hookenv.config("logrotate-pressure-defer"):
+        from lib_pressure import lower_priority
+
+        lower_priority()
+    logger.info("Executing cron job.")
     hookenv.status_set("maintenance", "Executing cron job.")
-    cronhelper = CronHelper()
-    cronhelper.update_logrotate_etc()
-    hookenv.log("Cron job completed.", level=hookenv.INFO)
-    hookenv.status_set("active", "Unit is ready.")
+    with RunMetrics("cronjob").run():
+        cronhelper = CronHelper()
+        cronhelper.update_logrotate_etc()
+    logger.info("Cron job completed.")
+    from lib_refresh import ready_message
+
+    hookenv.status_set("active", ready_message())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+"""Dateext module.
+
+With numbered archives logrotate renames every archive of a log on each
+rotation, so the cost of a rotation grows with the rotate count. Blocks with
+a high rotate count are switched to dated archives, which are never renamed
+once created.
+"""
+
+import os
+import re
+import time
+
+from lib_logfiles import LogScanner
+
+NUMBERED_SUFFIX = re.compile(r"^\.(\d{1,6})(\.[A-Za-z0-9]+)?$")
+
+
+def dateformat(block, sized=False):
+    """Return the dateformat giving unique archive names for block.
+
+    Blocks rotated on size, as well as hourly blocks, can rotate several
+    times a day, so the rotation time is added to the date. sized tells
+    whether the block is about to be rotated on size.
+    """
+    if sized or block.has("size", "maxsize", "minsize"):
+        return "-%Y%m%d-%s"
+    if block.has("hourly"):
+        return "-%Y%m%d%H"
+    return "-%Y%m%d"
+
+
+def needs_dateext(block, count, threshold):
+    """Check whether block should be switched to dated archives.
+
+    Blocks setting dateext or nodateext themselves, and blocks keeping their
+    archives in an olddir, are left alone.
+    """
+    return (
+        bool(threshold)
+        and count is not None
+        and int(count) > threshold
+        and not block.has("dateext", "nodateext", "olddir")
+    )
+
+
+def archive_name(log_name, suffix_match, mtime, date_format):
+    """Return the dated name of a numbered archive of log_name."""
+    date = time.strftime(date_format.replace("%s", str(int(mtime))), time.localtime(mtime))
+    return log_name + date + (suffix_match.group(2) or "")
+
+
+def migrate_archives(block, date_format, scanner=None):
+    """Rename the numbered archives of the logs of block to dated names.
+
+    The date is the time the archive was last written, which is when it was
+    rotated. Return (renamed, skipped), lists of (old path, new path); an
+    archive is skipped if its dated name already exists.
+    """
+    scanner = scanner or LogScanner()
+    renamed = []
+    skipped = []
+    for pattern in block.paths:
+        for log in scanner.find(pattern):
+            directory, log_name = os.path.split(log.path)
+            entries, _ = scanner.entries(directory)
+            for name in sorted(entries):
+                if not name.startswith(log_name):
+                    continue
+                match = NUMBERED_SUFFIX.match(name[len(log_name) :])
+                if match is None:
+                    continue
+                old_path = os.path.join(directory, name)
+                try:
+                    mtime = os.stat(old_path).st_mtime
+                except OSError:
+                    continue
+                new_path = os.path.join(
+                    directory, archive_name(log_name, match, mtime, date_format)
+                )
+                if os.path.exists(new_path):
+                    skipped.append((old_path, new_path))
+                    continue
+                os.rename(old_path, new_path)
+                renamed.append((old_path, new_path))
+    return renamed, skipped
@@ -0,0 +1,112 @@
+"""File I/O helper module."""
+
+import os
+import tempfile
+import threading
+
+# logrotate skips the files ending with a tilde in its include directories, as
+# one of its taboo extensions, so it never reads a temporary file left behind
+TMP_SUFFIX = ".tmp~"
+
+
+class WriteBatch:
+    """Batch of files replaced with replace_file.
+
+    The directories of the replaced files are synced once, when the batch
+    ends, instead of once per file.
+    """
+
+    def __init__(self):
+        """Init function."""
+        self.directories = set()
+        self._lock = threading.Lock()
+
+    def add(self, directory):
+        """Add a directory to sync at the end of the batch."""
+        with self._lock:
+            self.directories.add(directory)
+
+    def sync(self):
+        """Sync the directories of the files replaced so far."""
+        with self._lock:
+            directories, self.directories = sorted(self.directories), set()
+        for directory in directories:
+            sync_directory(directory)
+
+    def __enter__(self):
+        """Start the batch."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Sync the directories, also when the batch failed half way."""
+        self.sync()
+
+
+def sync_directory(directory):
+    """Sync the entries of directory to disk, so that renames survive a crash."""
+    fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_attributes(source, destination):
+    """Copy the mode, owner and extended attributes of source to destination."""
+    stat = os.stat(source)
+    os.chmod(destination, stat.st_mode & 0o7777)
+    if (stat.st_uid, stat.st_gid) != (os.getuid(), os.getgid()):
+        os.chown(destination, stat.st_uid, stat.st_gid)
+    if not hasattr(os, "listxattr"):
+        return
+    try:
+        names = os.listxattr(source)
+    except OSError:
+        # the filesystem does not support extended attributes
+        return
+    for name in names:
+        os.setxattr(destination, name, os.getxattr(source, name))
+
+
+def replace_file(path, content, mode=0o644, batch=None):
+    """Replace the content of path atomically and durably.
+
+    Nothing is written if path already has this content. Otherwise content
+    is synced to a temporary file with the mode, owner and extended
+    attributes of path, which is then renamed over path: readers, such as a
+    concurrent logrotate run, see either the old or the new content. mode is
+    only used when path does not exist yet. The directory is synced at the
+    end of batch if given, right away otherwise. Return True if the file was
+    written.
+    """
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as current:
+            if current.read() == data:
+                return False
+        exists = True
+    except FileNotFoundError:
+        exists = False
+
+    directory, name = os.path.split(path)
+    directory = directory or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + name, suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        if exists:
+            copy_attributes(path, tmp_path)
+        else:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    if batch is not None:
+        batch.add(directory)
+    else:
+        sync_directory(directory)
+    return True
@@ -0,0 +1,196 @@
+"""Glob expansion cost module.
+
+logrotate expands the path patterns of every block with glob(3) on every run,
+listing each directory a pattern component with wildcards has to match
+against, even for blocks with missingok whose patterns match nothing. The
+charm expands the patterns the same way to report what each block costs, and
+flags the patterns matching nothing or listing more directories than a
+threshold, so they can be tightened. The update-status hook checks the
+patterns once per check interval, counting the flagged ones in the metrics.
+"""
+
+import fnmatch
+import json
+import os
+import time
+
+from lib_fileio import replace_file
+from lib_logfiles import has_magic
+from lib_parser import parse_config
+
+GLOB_CHECK_FILE = "/var/lib/charm-logrotate/glob-check.json"
+# Seconds between two checks run by the update-status hook
+CHECK_INTERVAL = 3600
+
+
+class GlobWalker:
+    """Expand path patterns like glob(3), listing every directory only once.
+
+    The listings are shared by all the patterns expanded by a walker, but the
+    cost of a pattern counts every directory it needs listed, as logrotate
+    lists them again for every pattern.
+    """
+
+    def __init__(self):
+        """Init function."""
+        self._listings = {}
+
+    def listing(self, directory):
+        """Return ({name: is a directory}, seconds spent listing) for directory.
+
+        A missing or unreadable directory is empty.
+        """
+        try:
+            return self._listings[directory]
+        except KeyError:
+            pass
+        start = time.perf_counter()
+        names = {}
+        try:
+            with os.scandir(directory) as scan:
+                for entry in scan:
+                    try:
+                        names[entry.name] = entry.is_dir()
+                    except OSError:
+                        names[entry.name] = False
+        except OSError:
+            pass
+        self._listings[directory] = names, time.perf_counter() - start
+        return self._listings[directory]
+
+    def expand(self, pattern):
+        """Return (matching paths, directories listed, seconds) for pattern.
+
+        As with glob(3), wildcards do not match names starting with a dot
+        unless the pattern component does, and "**" is not recursive.
+        """
+        pattern = os.path.expanduser(pattern)
+        if not has_magic(pattern):
+            return ([pattern] if os.path.lexists(pattern) else []), 0, 0.0
+        root = os.sep if pattern.startswith(os.sep) else os.curdir
+        parts = [part for part in pattern.split(os.sep) if part]
+        candidates = [root]
+        directories = 0
+        seconds = 0.0
+        for position, part in enumerate(parts):
+            last = position == len(parts) - 1
+            if not has_magic(part):
+                candidates = [os.path.join(candidate, part) for candidate in candidates]
+                continue
+            matched = []
+            for candidate in candidates:
+                names, listing_seconds = self.listing(candidate)
+                directories += 1
+                seconds += listing_seconds
+                for name in sorted(fnmatch.filter(names, part)):
+                    if name.startswith(".") and not part.startswith("."):
+                        continue
+                    if last or names[name]:
+                        matched.append(os.path.join(candidate, name))
+            candidates = matched
+        if not has_magic(parts[-1]):
+            candidates = [candidate for candidate in candidates if os.path.lexists(candidate)]
+        return candidates, directories, seconds
+
+
+def glob_costs(config_paths, threshold, walker=None):
+    """Return the expansion cost of the blocks of the logrotate files config_paths.
+
+    Return a list with, for each block, its file and index, whether it has
+    missingok, and for each of its patterns the paths matched, directories
+    listed and seconds spent, as well as their sums. The flags of a pattern
+    are "no-match" if it matches nothing and "costly" if it lists more than
+    threshold directories, unless threshold is 0. Blocks commented out by the
+    charm are not expanded by logrotate, so they are left out.
+    """
+    walker = walker or GlobWalker()
+    blocks = []
+    for config_path in sorted(config_paths):
+        try:
+            with open(config_path, "r") as logrotate_file:
+                document = parse_config(logrotate_file.read())
+        except OSError:
+            continue
+        for index, block in enumerate(document.blocks):
+            if block.disabled:
+                continue
+            patterns = []
+            for pattern in block.paths:
+                matches, directories, seconds = walker.expand(pattern)
+                flags = []
+                if not matches:
+                    flags.append("no-match")
+                if threshold and directories > threshold:
+                    flags.append("costly")
+                patterns.append(
+                    {
+                        "pattern": pattern,
+                        "matches": len(matches),
+                        "directories": directories,
+                        "seconds": seconds,
+                        "flags": flags,
+                    }
+                )
+            blocks.append(
+                {
+                    "file": config_path,
+                    "block": index,
+                    "missingok": block.has("missingok"),
+                    "matches": sum(pattern["matches"] for pattern in patterns),
+                    "directories": sum(pattern["directories"] for pattern in patterns),
+                    "seconds": sum(pattern["seconds"] for pattern in patterns),
+                    "patterns": patterns,
+                }
+            )
+    return blocks
+
+
+def flagged(blocks):
+    """Return [(file, pattern, flags)] for the flagged patterns of blocks."""
+    return [
+        (block["file"], pattern["pattern"], pattern["flags"])
+        for block in blocks
+        for pattern in block["patterns"]
+        if pattern["flags"]
+    ]
+
+
+def load_check(path=None):
+    """Return the summary saved by the last check, or None."""
+    try:
+        with open(path or GLOB_CHECK_FILE, "r") as check_file:
+            check = json.load(check_file)
+    except (OSError, ValueError):
+        return None
+    return check if isinstance(check, dict) else None
+
+
+def check_globs(threshold, path=None, interval=CHECK_INTERVAL):
+    """Check the patterns of the logrotate files if the last check is due.
+
+    A check is due once interval seconds passed since the last one, or if the
+    threshold changed. The flagged patterns are counted in the metrics of the
+    glob_check job. Return them, or None if no check was due.
+    """
+    from lib_logrotate import config_paths
+    from lib_metrics import RunMetrics
+
+    path = path or GLOB_CHECK_FILE
+    check = load_check(path)
+    if (
+        check is not None
+        and check.get("threshold") == threshold
+        and 0 <= time.time() - check.get("timestamp", 0) < interval
+    ):
+        return None
+    with RunMetrics("glob_check").run() as metrics:
+        patterns = flagged(glob_costs(config_paths(), threshold))
+        for _, _, flags in patterns:
+            metrics.inc("globs_no_match", int("no-match" in flags))
+            metrics.inc("globs_costly", int("costly" in flags))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(
+        path,
+        json.dumps({"timestamp": time.time(), "threshold": threshold, "flagged": len(patterns)}),
+    )
+    return patterns
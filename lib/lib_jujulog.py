@@ -0,0 +1,28 @@
+"""Juju log module.
+
+The helpers log with the logging module; in the hooks and the juju-exec cron
+job, the records are forwarded to juju-log so they show in juju debug-log.
+"""
+
+import logging
+
+
+class JujuLogHandler(logging.Handler):
+    """Log handler sending the records to juju-log."""
+
+    def emit(self, record):
+        """Send the record to juju-log at its level."""
+        from charmhelpers.core import hookenv
+
+        try:
+            hookenv.log(self.format(record), level=record.levelname)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_juju_logging(level=logging.INFO):
+    """Forward the log records from level up to juju-log, once per process."""
+    root = logging.getLogger()
+    if not any(isinstance(handler, JujuLogHandler) for handler in root.handlers):
+        root.addHandler(JujuLogHandler())
+    root.setLevel(level)
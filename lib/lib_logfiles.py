@@ -0,0 +1,275 @@
+"""Log files module.
+
+Finds the logs matched by logrotate blocks and the files rotated from them.
+"""
+
+import fnmatch
+import glob
+import json
+import os
+import re
+import time
+
+from lib_fileio import replace_file
+from lib_parser import parse_config
+
+LOG_INDEX_FILE = "/var/lib/charm-logrotate/log-index.json"
+LOG_INDEX_VERSION = 1
+MTIME_GRANULARITY_NS = 1000000000
+
+# Suffix added by logrotate to rotated files: a rotation number or a dateext
+# date, optionally followed by a compression extension
+ROTATED_SUFFIX = re.compile(
+    r"[.-](?:\d{1,6}|\d{8}(?:\d{2})?|\d{4}-\d{2}-\d{2}(?:-\d{2})?)"
+    r"(?:\.(?:gz|bz2|xz|zst|lz4|lzma|Z))?$"
+)
+
+
+def has_magic(pattern):
+    """Check whether pattern is a glob pattern."""
+    return any(char in pattern for char in "*?[")
+
+
+def rotated_base(name):
+    """Return the name of the log name was rotated from, or None."""
+    match = ROTATED_SUFFIX.search(name)
+    return name[: match.start()] if match and match.start() else None
+
+
+class LogFile:
+    """A log matched by a logrotate block, with the sizes of its rotated files."""
+
+    __slots__ = ("path", "size", "device", "rotated")
+
+    def __init__(self, path, size, device, rotated):
+        """Init function."""
+        self.path = path
+        self.size = size
+        self.device = device
+        self.rotated = rotated
+
+    def rotation_size(self):
+        """Return the estimated size of a single rotated file.
+
+        This is the average size of the rotated files, which each hold the
+        logs of one interval as stored on disk, or the size of the live log
+        when nothing was rotated yet.
+        """
+        if self.rotated:
+            return sum(self.rotated) // len(self.rotated)
+        return self.size
+
+
+class LogIndex:
+    """Persisted listings of the directories holding logs.
+
+    Every listing records the size and device of the regular files of a
+    directory together with the directory mtime. Adding, removing or renaming
+    files, which is what rotating does, changes the mtime of the directory,
+    so a listing stays valid as long as the mtime is unchanged. Only the size
+    of live logs changes in place, and those are stat'ed on every lookup.
+    The path patterns of the blocks of every logrotate file are kept too, so
+    unchanged logrotate files are not parsed again.
+    """
+
+    def __init__(self, path=None):
+        """Init function."""
+        self.path = path or LOG_INDEX_FILE
+        self.directories = {}
+        self.configs = {}
+        self.dirty = False
+
+    def load(self):
+        """Load the index from disk, a missing or outdated one is empty."""
+        try:
+            with open(self.path, "r") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == LOG_INDEX_VERSION:
+            self.directories = data.get("directories", {})
+            self.configs = data.get("configs", {})
+
+    def save(self):
+        """Write the index to disk if it changed since it was loaded."""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        replace_file(
+            self.path,
+            json.dumps(
+                {
+                    "version": LOG_INDEX_VERSION,
+                    "directories": self.directories,
+                    "configs": self.configs,
+                }
+            ),
+        )
+        self.dirty = False
+
+    def listing(self, directory):
+        """Return ({name: [size, device]}, {log name: [rotated sizes]}) for directory."""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return {}, {}
+        cached = self.directories.get(directory)
+        if cached is not None and cached["mtime"] == mtime:
+            return cached["files"], cached["rotated"]
+
+        files = list_directory(directory)
+        rotated = rotated_sizes(files)
+        self._store(self.directories, directory, mtime, {"files": files, "rotated": rotated})
+        return files, rotated
+
+    def block_paths(self, config_path):
+        """Return the path patterns of every block of the logrotate file config_path."""
+        stat = os.stat(config_path)
+        cached = self.configs.get(config_path)
+        if cached is not None and cached["mtime"] == stat.st_mtime_ns:
+            return cached["paths"]
+
+        with open(config_path, "r") as logrotate_file:
+            content = logrotate_file.read()
+        paths = [list(block.paths) for block in parse_config(content).blocks]
+        self._store(self.configs, config_path, stat.st_mtime_ns, {"paths": paths})
+        return paths
+
+    def _store(self, entries, path, mtime, entry):
+        """Keep entry for path, unless its mtime is too recent to be trusted.
+
+        A change within the mtime granularity of the listing would go
+        unnoticed, so such an entry is not kept.
+        """
+        if time.time_ns() - mtime > MTIME_GRANULARITY_NS:
+            entries[path] = dict(entry, mtime=mtime)
+        else:
+            entries.pop(path, None)
+        self.dirty = True
+
+    def prune(self, config_paths):
+        """Drop the entries of the logrotate files that are not in config_paths."""
+        for config_path in set(self.configs) - set(config_paths):
+            del self.configs[config_path]
+            self.dirty = True
+
+
+def list_directory(directory):
+    """Return {name: [size, device]} for the regular files of directory."""
+    files = {}
+    try:
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files[entry.name] = [stat.st_size, stat.st_dev]
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files
+
+
+def rotated_sizes(files):
+    """Return {log name: [rotated sizes]} for the listing files of a directory."""
+    rotated = {}
+    for name, (size, _) in files.items():
+        base = rotated_base(name)
+        if base is not None:
+            rotated.setdefault(base, []).append(size)
+    return rotated
+
+
+class LogScanner:
+    """Find logs and their rotated files, listing each directory only once.
+
+    Listings come from index if one is given, otherwise directories are
+    listed again by every scanner.
+    """
+
+    def __init__(self, index=None):
+        """Init function."""
+        self.index = index
+        self._directories = {}
+
+    def entries(self, directory):
+        """Return ({name: [size, device]}, {log name: [rotated sizes]}) for directory.
+
+        Only regular files are listed.
+        """
+        try:
+            return self._directories[directory]
+        except KeyError:
+            pass
+        if self.index is not None:
+            entries, rotated = self.index.listing(directory)
+        else:
+            entries = list_directory(directory)
+            rotated = rotated_sizes(entries)
+        self._directories[directory] = (entries, rotated)
+        return entries, rotated
+
+    def find(self, pattern):
+        """Return the logs matching the path pattern of a logrotate block.
+
+        Files rotated from another matching log are not logs themselves, even
+        if the pattern matches them.
+        """
+        directory, name_pattern = os.path.split(os.path.expanduser(pattern))
+        directories = sorted(glob.glob(directory)) if has_magic(directory) else [directory]
+        logs = []
+        for directory in directories:
+            entries, rotated = self.entries(directory)
+            if has_magic(name_pattern):
+                names = fnmatch.filter(entries, name_pattern)
+                matched = set(names)
+                names = [name for name in names if rotated_base(name) not in matched]
+            else:
+                names = [name_pattern] if name_pattern in entries else []
+
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                size, device = entries[name]
+                if self.index is not None:
+                    # live logs grow without changing the directory mtime
+                    try:
+                        size = os.stat(path).st_size
+                    except OSError:
+                        continue
+                logs.append(LogFile(path, size, device, rotated.get(name, [])))
+        return logs
+
+
+def log_usage(config_dir, top=10, index_path=None):
+    """Return the disk usage of the logs of every logrotate file in config_dir.
+
+    Return {config file: {"total": bytes, "logs": [[path, bytes], ...]}} with
+    the top largest logs of each file, counting a log with its rotated files,
+    sorted by decreasing total.
+    """
+    index = LogIndex(index_path)
+    index.load()
+    scanner = LogScanner(index)
+    usage = {}
+    config_paths = [
+        os.path.join(config_dir, config_file) for config_file in sorted(os.listdir(config_dir))
+    ]
+    for config_path in config_paths:
+        try:
+            block_paths = index.block_paths(config_path)
+        except OSError:
+            continue
+        logs = {}
+        for paths in block_paths:
+            for path in paths:
+                for log in scanner.find(path):
+                    logs[log.path] = log.size + sum(log.rotated)
+        ranked = sorted(logs.items(), key=lambda item: (-item[1], item[0]))
+        usage[os.path.basename(config_path)] = {
+            "total": sum(logs.values()),
+            "logs": [[path, size] for path, size in ranked[:top]],
+        }
+    index.prune(config_paths)
+    index.save()
+    return dict(sorted(usage.items(), key=lambda item: (-item[1]["total"], item[0])))
@@ -1,24 +1,150 @@
 """Logrotate module."""
 
+import hashlib
 import json
+import logging
 import os
-import re
+import time
 
-from charmhelpers.core import hookenv
+from lib_budget import DiskBudget
+from lib_compression import resolve_policy
+from lib_copytruncate import apply as apply_copytruncate_helper
+from lib_dateext import dateformat, migrate_archives, needs_dateext
+from lib_fileio import WriteBatch, replace_file
+from lib_logfiles import LogIndex, LogScanner
+from lib_manifest import ConfigManifest, content_hash
+from lib_metrics import RunMetrics
+from lib_overlap import POLICIES, find_overlaps, save_report
+from lib_override import OverrideIndex
+from lib_parser import INTERVAL_KEYWORDS, BlockEdit, parse_config
+from lib_snapshot import load_snapshot
 
 LOGROTATE_DIR = "/etc/logrotate.d/"
+HEADER = "# Configuration file maintained by Juju. Local changes may be overwritten"
+# Version of the rendering, to bump whenever the charm renders files differently,
+# so that files rendered by an older charm are not kept as up to date
+RENDER_VERSION = 2
+# Options the rendered logrotate files depend on
+RENDER_OPTIONS = {
+    "logrotate-retention",
+    "override",
+    "logrotate-disk-budget",
+    "logrotate-dateext-threshold",
+    "logrotate-compression",
+    "logrotate-compression-threads",
+    "logrotate-copytruncate-helper",
+    "logrotate-overlap-policy",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def config_paths():
+    """Return the paths of the logrotate files, in name order.
+
+    Dotfiles, such as the temporary files of an interrupted write, are left out.
+    """
+    return [
+        LOGROTATE_DIR + config_file
+        for config_file in sorted(os.listdir(LOGROTATE_DIR))
+        if not config_file.startswith(".")
+    ]
 
 
 class LogrotateHelper:
     """Helper class for logrotate charm."""
 
-    def __init__(self):
-        """Init function."""
-        self.retention = hookenv.config("logrotate-retention")
-        self.override_size_regex = re.compile(r"size [\d]*(k|M|G)?")
-        self.override_interval_regex = re.compile("(daily|weekly|monthly|yearly)")
-        self.override = json.loads(hookenv.config("override"))
+    class ConfigUpdateError(RuntimeError):
+        """Raised when some logrotate files could not be updated."""
+
+        pass
+
+    def __init__(
+        self,
+        retention=None,
+        override=None,
+        workers=None,
+        disk_budget=None,
+        dateext_threshold=None,
+        compression=None,
+        compression_threads=None,
+        copytruncate_helper=None,
+        overlap_policy=None,
+        state_prune_days=None,
+    ):
+        """Init function.
+
+        retention, override, workers, disk_budget, dateext_threshold,
+        compression, compression_threads, copytruncate_helper, overlap_policy
+        and state_prune_days default to the charm config.
+        """
+        settings = (
+            retention,
+            override,
+            workers,
+            disk_budget,
+            dateext_threshold,
+            compression,
+            compression_threads,
+            copytruncate_helper,
+            overlap_policy,
+            state_prune_days,
+        )
+        if None in settings:
+            from charmhelpers.core import hookenv
+
+        if retention is None:
+            retention = hookenv.config("logrotate-retention")
+        if override is None:
+            override = hookenv.config("override")
+        if workers is None:
+            workers = hookenv.config("logrotate-workers")
+        if disk_budget is None:
+            disk_budget = hookenv.config("logrotate-disk-budget")
+        if dateext_threshold is None:
+            dateext_threshold = hookenv.config("logrotate-dateext-threshold")
+        if compression is None:
+            compression = hookenv.config("logrotate-compression")
+        if compression_threads is None:
+            compression_threads = hookenv.config("logrotate-compression-threads")
+        if copytruncate_helper is None:
+            copytruncate_helper = hookenv.config("logrotate-copytruncate-helper")
+        if overlap_policy is None:
+            overlap_policy = hookenv.config("logrotate-overlap-policy")
+        if state_prune_days is None:
+            state_prune_days = hookenv.config("logrotate-state-prune-days")
+        self.retention = retention
+        self.override = json.loads(override)
         self.override_files = self.get_override_files()
+        self.workers = workers
+        self.disk_budget = disk_budget
+        self.dateext_threshold = dateext_threshold
+        self.compression = compression
+        self.compression_threads = compression_threads
+        self.copytruncate_helper = copytruncate_helper
+        self.overlap_policy = overlap_policy
+        self.state_prune_days = state_prune_days
+
+    @classmethod
+    def from_config_file(cls):
+        """Return a helper configured from the config dumped to disk.
+
+        Used outside of hook context, where the charm config is not available.
+        """
+        logrotate = cls(
+            retention=0,
+            override="[]",
+            workers=1,
+            disk_budget="",
+            dateext_threshold=0,
+            compression="",
+            compression_threads=0,
+            copytruncate_helper=False,
+            overlap_policy="report",
+            state_prune_days=0,
+        )
+        logrotate.read_config()
+        return logrotate
 
     def read_config(self):
         """Read changes from disk.
@@ -26,130 +152,424 @@ class LogrotateHelper:
         Config changed/install hooks dumps config out to disk,
         Here we read that config to update the cronjob
         """
-        config_file = open("/etc/logrotate_cronjob_config", "r")
-        lines = config_file.read()
-        lines = lines.split("\n")
+        snapshot = load_snapshot()
+
+        self.retention = snapshot.get("logrotate-retention")
+        self.override = snapshot.get("override")
+        self.override_files = snapshot.override_index()
+        self.workers = snapshot.get("logrotate-workers")
+        self.disk_budget = snapshot.get("logrotate-disk-budget")
+        self.dateext_threshold = snapshot.get("logrotate-dateext-threshold")
+        self.compression = snapshot.get("logrotate-compression")
+        self.compression_threads = snapshot.get("logrotate-compression-threads")
+        self.copytruncate_helper = snapshot.get("logrotate-copytruncate-helper")
+        self.overlap_policy = snapshot.get("logrotate-overlap-policy")
+        self.state_prune_days = snapshot.get("logrotate-state-prune-days")
+
+    def modify_configs(self, config_files=None):
+        """Modify the logrotate config files, or only the ones named in config_files.
+
+        A file that fails does not stop the others; the failures are raised once all are done.
+        """
+        metrics = RunMetrics("modify_configs")
+        with metrics.run():
+            manifest = ConfigManifest()
+            manifest.load()
+            generation = self.settings_generation()
+
+            file_paths = config_paths()
+            selected = [
+                file_path
+                for file_path in file_paths
+                if config_files is None or os.path.basename(file_path) in config_files
+            ]
+            budget_counts = self.budget_counts(file_paths)
+            # the overlaps are only looked for again once a file or the settings changed
+            disabled = None
+            if manifest.unchanged(file_paths):
+                disabled = manifest.disabled_blocks(generation)
+            if disabled is None:
+                overlaps, disabled = self.find_overlaps(file_paths)
+                save_report(overlaps)
+                manifest.record_overlaps(generation, disabled)
+            batch = WriteBatch()
+
+            def process(file_path):
+                start = time.perf_counter()
+                try:
+                    return (
+                        self.modify_config(
+                            file_path,
+                            manifest,
+                            generation,
+                            metrics,
+                            budget_counts.get(file_path),
+                            batch,
+                            disabled.get(file_path),
+                        ),
+                        None,
+                    )
+                except Exception as ex:
+                    metrics.inc("files_failed")
+                    return False, ex
+                finally:
+                    metrics.observe_file(time.perf_counter() - start)
+
+            # Results are collected in file order whatever the number of workers,
+            # so logs and errors are reported deterministically
+            if self.workers > 1 and len(selected) > 1:
+                from concurrent.futures import ThreadPoolExecutor
+
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(process, selected))
+            else:
+                results = [process(file_path) for file_path in selected]
+
+            # the renames are synced once for all the files, before the
+            # manifest records them as rendered
+            batch.sync()
+            if config_files is None:
+                manifest.prune(file_paths)
+            manifest.save()
+            if self.state_prune_days:
+                from lib_state import prune_states
+
+                metrics.inc("state_entries_pruned", prune_states(self.state_prune_days) or 0)
+
+            failed = []
+            for file_path, (_, error) in zip(selected, results):
+                if error is not None:
+                    logger.error("Error updating %s: %s", file_path, error)
+                    failed.append(file_path)
+            if failed:
+                raise self.ConfigUpdateError("Failed to update {}".format(", ".join(failed)))
+
+    def modify_config(
+        self,
+        file_path,
+        manifest,
+        generation,
+        metrics=None,
+        counts=None,
+        batch=None,
+        disabled=None,
+    ):
+        """Modify a single logrotate config file.
+
+        Return True if the file was rewritten; a file unchanged since it was
+        rendered with the same settings is skipped. counts and disabled are
+        passed on to modify_content, and the directory synced with batch.
+        """
+        metrics = metrics or RunMetrics("modify_config")
+        generation = self.file_generation(generation, file_path, counts, disabled)
+        metrics.inc("files_scanned")
+        stat = os.stat(file_path)
+        if manifest.is_fresh(file_path, stat, generation):
+            metrics.inc("files_skipped")
+            return False
+
+        logrotate_file = open(file_path, "r")
+        content = logrotate_file.read()
+        logrotate_file.close()
+        metrics.inc("bytes_read", stat.st_size)
+
+        digest = content_hash(content)
+        if manifest.matches_content(file_path, digest, generation):
+            manifest.update(file_path, stat, digest, generation)
+            metrics.inc("files_skipped")
+            return False
+
+        if parse_config(content).incomplete:
+            metrics.inc("parse_errors")
+        if file_path in self.override_files:
+            metrics.inc("override_hits")
+        mod_contents = self.modify_content(
+            content,
+            file_path,
+            header=HEADER,
+            counts=counts,
+            dateext_threshold=self.dateext_threshold,
+            compression=self.compression_policy(),
+            copytruncate_helper=self.copytruncate_helper,
+            disabled=disabled,
+        )
+
+        changed = mod_contents != content
+        if changed:
+            # archives are renamed before the file switches to dateext, so
+            # a failed rename is retried on the next run
+            self.migrate_archives(content, mod_contents)
+            replace_file(file_path, mod_contents, batch=batch)
+            stat = os.stat(file_path)
+            digest = content_hash(mod_contents)
+            metrics.inc("files_rewritten")
+            metrics.inc("bytes_written", stat.st_size)
+
+        manifest.update(file_path, stat, digest, generation)
+        return changed
+
+    def plan_configs(self, config_files=None):
+        """Yield the changes modify_configs would make, without writing anything.
+
+        Yield (file_path, diff) for every file, in file order, where diff is
+        the unified diff of the planned content, or "" if the file would not
+        change. Files rendered with the same settings are not read again.
+        """
+        import difflib
 
-        self.retention = int(lines[2])
+        manifest = ConfigManifest()
+        manifest.load()
+        generation = self.settings_generation()
+        file_paths = config_paths()
+        budget_counts = self.budget_counts(file_paths, persist=False)
+        _, disabled = self.find_overlaps(file_paths, persist=False)
 
-    def modify_configs(self):
-        """Modify the logrotate config files."""
-        for config_file in os.listdir(LOGROTATE_DIR):
-            file_path = LOGROTATE_DIR + config_file
+        for file_path in file_paths:
+            if config_files is not None and os.path.basename(file_path) not in config_files:
+                continue
+            counts = budget_counts.get(file_path)
+            file_generation = self.file_generation(
+                generation, file_path, counts, disabled.get(file_path)
+            )
+            if manifest.is_fresh(file_path, os.stat(file_path), file_generation):
+                yield file_path, ""
+                continue
+
+            with open(file_path, "r") as logrotate_file:
+                content = logrotate_file.read()
+            mod_contents = self.modify_content(
+                content,
+                file_path,
+                header=HEADER,
+                counts=counts,
+                dateext_threshold=self.dateext_threshold,
+                compression=self.compression_policy(),
+                copytruncate_helper=self.copytruncate_helper,
+                disabled=disabled.get(file_path),
+            )
+            diff = list(
+                difflib.unified_diff(
+                    content.splitlines(),
+                    mod_contents.splitlines(),
+                    fromfile=file_path,
+                    tofile=file_path + " (planned)",
+                    lineterm="",
+                )
+            )
+            yield file_path, "\n".join(diff) + "\n" if diff else ""
+
+    def settings_generation(self):
+        """Return a fingerprint of the settings that affect all rendered files.
+
+        The override only affects the files it covers, so it is part of the
+        fingerprint of each file instead.
+        """
+        policy = self.compression_policy()
+        settings = {
+            "render_version": RENDER_VERSION,
+            "retention": self.retention,
+            "disk_budget": self.disk_budget,
+            "dateext_threshold": self.dateext_threshold,
+            "compression": policy.fingerprint() if policy is not None else None,
+            "copytruncate_helper": self.copytruncate_helper,
+            "overlap_policy": self.overlap_policy,
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def compression_policy(self):
+        """Return the compression policy of the blocks, or None if not managed."""
+        return resolve_policy(self.compression, self.compression_threads)
+
+    def file_generation(self, generation, file_path, counts=None, disabled=None):
+        """Return the settings fingerprint of a file.
+
+        The override entry of the file, its disk budget counts and its
+        disabled blocks are added to the settings fingerprint, so an override
+        change only invalidates the files covered by the old or new entries.
+        """
+        override_entry = self.override_files.get(file_path)
+        if override_entry:
+            generation = "{}:{}".format(generation, json.dumps(override_entry, sort_keys=True))
+        if disabled:
+            generation = "{}:{}".format(generation, json.dumps(disabled, sort_keys=True))
+        if not counts:
+            return generation
+        return "{}:{}".format(generation, json.dumps(counts, sort_keys=True))
 
-            logrotate_file = open(file_path, "r")
-            content = logrotate_file.read()
-            logrotate_file.close()
+    def budget_counts(self, file_paths, persist=True):
+        """Return the rotate counts fitting the disk budget, by file and block index.
 
-            mod_contents = self.modify_content(content, file_path)
+        Every file is read, since the budget is shared by all the logs of a
+        filesystem. Overridden files keep their override. Empty if no disk
+        budget is configured. The log index is saved only if persist is set.
+        """
+        if not self.disk_budget:
+            return {}
+        contents = {}
+        for file_path in file_paths:
+            if file_path in self.override_files:
+                continue
+            try:
+                with open(file_path, "r") as logrotate_file:
+                    contents[file_path] = logrotate_file.read()
+            except OSError:
+                continue
+        index = LogIndex()
+        index.load()
+        budget = DiskBudget(self.disk_budget, self.retention, LogScanner(index))
+        counts = budget.counts(contents, self.calculate_count)
+        if persist:
+            index.save()
+        return counts
 
-            mod_contents = self.modify_header(mod_contents)
+    def find_overlaps(self, file_paths, persist=True):
+        """Return the overlaps between the blocks of file_paths, and the blocks to disable.
 
-            logrotate_file = open(file_path, "w")
-            logrotate_file.write(mod_contents)
-            logrotate_file.close()
+        The blocks to disable map the files to {block index: note}, and are
+        only set by the comment policy: each block whose paths are all claimed
+        by earlier files is commented out, noting the file claiming them. The
+        log index is saved only if persist is set.
+        """
+        if self.overlap_policy not in POLICIES:
+            raise ValueError(
+                "Invalid logrotate-overlap-policy {!r}, expected one of {}".format(
+                    self.overlap_policy, ", ".join(POLICIES)
+                )
+            )
+        index = LogIndex()
+        index.load()
+        overlaps, redundant = find_overlaps(file_paths, index, LogScanner(index))
+        if persist:
+            index.save()
+        disabled = {}
+        if self.overlap_policy == "comment":
+            for file_path, blocks in redundant.items():
+                disabled[file_path] = {
+                    block_index: "overlaps with " + owner for block_index, owner in blocks.items()
+                }
+        return overlaps, disabled
 
     def get_override_files(self):
-        """Return paths for files to be overrided."""
-        return [
-            override_entry["path"]
-            for override_entry in self.override
-            if "path" in override_entry  # skip those without "path".
-        ]
+        """Return the index of the files to be overridden.
+
+        The index is built once from the override option and matches exact
+        paths as well as glob and regex patterns.
+        """
+        return OverrideIndex(self.override)
 
     def get_override_settings(self, file_path):
         """Return settings in key:value pairs for the file_path requested.
 
         param: file_path: path to the file for manual settings.
         """
-        size = None
-        rotate = None
-        interval = None
-        for override_entry in self.override:
-            if file_path == override_entry["path"]:
-                size = override_entry.get("size")
-                rotate = override_entry.get("rotate")
-                interval = override_entry.get("interval")
-        return {"rotate": rotate, "interval": interval, "size": size}
-
-    def modify_content(self, content, file_path):
-        """Edit the content of a logrotate file."""
-        # Split the contents in a logrotate file in separate entries (if
-        # multiple are found in the file) and put in a list for further
-        # processing
-        split = content.split("\n")
-        items = []
-        string = ""
-        for row in split:
-            string += row + "\n"
-            if "}" in row:
-                string = "\n" + string.strip()
-                items.append(string)
-                string = ""
+        override_entry = self.override_files.get(file_path) or {}
+        return {
+            "rotate": override_entry.get("rotate"),
+            "interval": override_entry.get("interval"),
+            "size": override_entry.get("size"),
+            "compression": override_entry.get("compression"),
+            "delaycompress": override_entry.get("delaycompress"),
+        }
+
+    def migrate_archives(self, content, mod_contents):
+        """Rename the numbered archives of the blocks switched to dateext."""
+        blocks = parse_config(content).blocks
+        for block, new_block in zip(blocks, parse_config(mod_contents).blocks):
+            if block.has("dateext") or not new_block.has("dateext"):
                 continue
+            date_formats = new_block.directives("dateformat")
+            if not date_formats:
+                continue
+            # logrotate uses the last dateformat of a block
+            _, skipped = migrate_archives(block, date_formats[-1].args)
+            if skipped:
+                logger.warning(
+                    "Archives not renamed to dateext, names already taken: %s",
+                    ", ".join(old_path for old_path, _ in skipped),
+                )
 
-        # Work on each item - checking the rotation configuration and setting
-        # the rotate option to the appropriate value
-        results = []
-        rotate_pattern = re.compile(r"rotate \d+\.?[0-9]*")
+    def modify_content(
+        self,
+        content,
+        file_path,
+        header=None,
+        counts=None,
+        dateext_threshold=0,
+        compression=None,
+        copytruncate_helper=False,
+        disabled=None,
+    ):
+        """Edit the content of a logrotate file, with header as its first line if given.
+
+        The changes of every block are recorded, then rendered in a single pass.
+        """
+        document = parse_config(content)
 
         override_settings = {}
-        if file_path in self.override_files:
+        is_override = file_path in self.override_files
+        if is_override:
             override_settings = self.get_override_settings(file_path)
 
         count = override_settings.get("rotate")
-        for item in items:
-            # Override rotate, if defined
-            if file_path in self.override_files:
-                if count is None:
-                    results.append(item)
-                    continue
-            else:
-                count = self.calculate_count(item, self.retention)
-            rotate = "rotate {}".format(count)
-            # if rotate is missing, add it as last line in the item entry
-            if rotate_pattern.findall(item):
-                result = rotate_pattern.sub(rotate, item)
-            else:
-                result = item.replace("}", "    " + rotate + "\n}")
+        size = override_settings.get("size")
+        interval = override_settings.get("interval")
+        if override_settings.get("compression"):
+            threads = compression.threads if compression is not None else 0
+            compression = resolve_policy(override_settings["compression"], threads)
+        delaycompress = override_settings.get("delaycompress")
 
-            results.append(result)
+        # Work on each block - checking the rotation configuration and setting
+        # the rotate option to the appropriate value
+        edits = {}
+        for index, block in enumerate(document.blocks):
+            edit = BlockEdit()
+            # Override rotate, if defined, else the disk budget count from counts
+            if not is_override:
+                if counts and index in counts:
+                    count = counts[index]
+                else:
+                    count = self.calculate_count(block.interval(), self.retention)
+            # if rotate is missing, add it as last directive in the block
+            if count is not None:
+                edit.set(["rotate"], "rotate {}".format(count))
 
-        results = "\n".join(results) + "\n"
+            # Override interval or size, if defined. The new value replaces the
+            # interval if there is one, otherwise the size.
+            scheduling = INTERVAL_KEYWORDS if block.has(*INTERVAL_KEYWORDS) else ["size"]
+            if size is not None:
+                edit.set(scheduling, "size {}".format(size), append=False)
+            elif interval is not None:
+                edit.set(scheduling, interval, append=False)
 
-        # Override interval or size, if defined
-        size = override_settings.get("size")
-        interval = override_settings.get("interval")
-        if size is not None:
-            results = self.modify_size_directive(results, size=size)
-        elif interval is not None:
-            results = self.modify_interval_directive(results, interval=interval)
-
-        return results
-
-    def modify_size_directive(self, results, size=None):
-        """Modify size directive."""
-        # Replace interval with size if interval is defined
-        if self.override_interval_regex.search(results):
-            return self.override_interval_regex.sub(f"size {size}", results)
-        # Replace old size with new size
-        else:
-            return self.override_size_regex.sub(f"size {size}", results)
-
-    def modify_interval_directive(self, results, interval=None):
-        """Modify interval directive."""
-        # Replace old interval with new interval
-        if self.override_interval_regex.search(results):
-            return self.override_interval_regex.sub(interval, results)
-        # Replace size with interval if size is removed
-        else:
-            return self.override_size_regex.sub(interval, results)
+            # Numbered archives are all renamed on every rotation, dated ones never
+            date_format = None
+            if needs_dateext(block, count, dateext_threshold):
+                edit.set(["dateext"], "dateext")
+                date_format = dateformat(block, size is not None)
+                if not block.has("dateformat"):
+                    edit.set(["dateformat"], "dateformat " + date_format)
+
+            # compression is the policy of the override, or the managed one
+            if compression is not None:
+                compression.apply(edit, delaycompress)
+
+            apply_copytruncate_helper(block, edit, copytruncate_helper, date_format)
+
+            # disabled maps block indexes to the notes of the blocks to comment
+            # out; the blocks the charm commented out before are restored
+            if disabled and index in disabled:
+                edit.disable(disabled[index])
+            elif block.disabled:
+                edit.enable()
+
+            edits[index] = edit
+
+        return document.serialize(edits, header)
 
     def modify_header(self, content):
         """Add Juju headers to the file."""
-        header = "# Configuration file maintained by Juju. Local changes may be overwritten"
-        content = [row for row in content.splitlines() if row and not row.startswith(header)]
-        return "\n".join([header, *content]) + "\n"
+        content = [row for row in content.splitlines() if row and not row.startswith(HEADER)]
+        return "\n".join([HEADER, *content]) + "\n"
 
     @staticmethod
     def calculate_count(item, retention):
@@ -0,0 +1,134 @@
+"""Config manifest module."""
+
+import hashlib
+import json
+import os
+
+from lib_fileio import replace_file
+
+MANIFEST_FILE = "/var/lib/charm-logrotate/manifest.json"
+MANIFEST_VERSION = 1
+
+
+def content_hash(content):
+    """Return the hex digest used to fingerprint file content."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ConfigManifest:
+    """Persisted fingerprints of the files managed in /etc/logrotate.d/.
+
+    Every entry records the inode, size, mtime and ctime of a file together
+    with the hash of its content and the settings generation that content
+    was rendered with. A file whose stat still matches its entry for the
+    current generation does not need to be read again. The blocks disabled
+    by the last overlap scan are kept too, so that the scan only runs again
+    once a file or the settings change.
+    """
+
+    def __init__(self, path=None):
+        """Init function."""
+        self.path = path or MANIFEST_FILE
+        self.entries = {}
+        self.overlaps = None
+        self.dirty = False
+
+    def load(self):
+        """Load the manifest from disk.
+
+        A missing, unreadable or outdated manifest is treated as empty, which
+        simply makes the next run process every file.
+        """
+        try:
+            with open(self.path, "r") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("files", {})
+            self.overlaps = data.get("overlaps")
+
+    def save(self):
+        """Write the manifest to disk if it changed since it was loaded."""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        replace_file(
+            self.path,
+            json.dumps(
+                {"version": MANIFEST_VERSION, "files": self.entries, "overlaps": self.overlaps}
+            ),
+        )
+        self.dirty = False
+
+    def is_fresh(self, file_path, stat, generation):
+        """Check whether file_path is unchanged since it was last rendered."""
+        entry = self.entries.get(file_path)
+        return entry is not None and entry["generation"] == generation and same_file(entry, stat)
+
+    def unchanged(self, file_paths):
+        """Check whether file_paths are the recorded files, none changed since."""
+        if set(file_paths) != set(self.entries):
+            return False
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return False
+            if not same_file(self.entries[file_path], stat):
+                return False
+        return True
+
+    def disabled_blocks(self, generation):
+        """Return the blocks disabled by the last overlap scan with generation, or None.
+
+        They map the files to {block index: note}.
+        """
+        if not self.overlaps or self.overlaps.get("generation") != generation:
+            return None
+        return {
+            file_path: {int(index): note for index, note in blocks.items()}
+            for file_path, blocks in self.overlaps["disabled"].items()
+        }
+
+    def record_overlaps(self, generation, disabled):
+        """Record the blocks disabled by an overlap scan with generation."""
+        overlaps = {"generation": generation, "disabled": disabled}
+        if self.disabled_blocks(generation) != disabled:
+            self.overlaps = overlaps
+            self.dirty = True
+
+    def matches_content(self, file_path, digest, generation):
+        """Check whether content with digest was already rendered for generation."""
+        entry = self.entries.get(file_path)
+        return entry is not None and entry["generation"] == generation and entry["hash"] == digest
+
+    def update(self, file_path, stat, digest, generation):
+        """Record the fingerprint of file_path."""
+        entry = {
+            "inode": stat.st_ino,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "ctime": stat.st_ctime_ns,
+            "hash": digest,
+            "generation": generation,
+        }
+        if self.entries.get(file_path) != entry:
+            self.entries[file_path] = entry
+            self.dirty = True
+
+    def prune(self, file_paths):
+        """Drop the entries of files that are not in file_paths anymore."""
+        for file_path in set(self.entries) - set(file_paths):
+            del self.entries[file_path]
+            self.dirty = True
+
+
+def same_file(entry, stat):
+    """Check whether stat is the one of the file fingerprinted by entry."""
+    return (
+        entry["inode"] == stat.st_ino
+        and entry["size"] == stat.st_size
+        and entry["mtime"] == stat.st_mtime_ns
+        and entry["ctime"] == stat.st_ctime_ns
+    )
@@ -0,0 +1,188 @@
+"""Metrics module.
+
+Every run of the charm helpers saves its metrics in the Prometheus text
+format, to be exported by the textfile collector of node-exporter.
+"""
+
+import contextlib
+import logging
+import os
+import re
+import threading
+import time
+
+from lib_fileio import replace_file
+
+METRICS_DIR = "/var/lib/prometheus/node-exporter"
+PREFIX = "charm_logrotate_"
+FILE_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# counter name: help
+COUNTERS = {
+    "files_scanned": "Number of logrotate files looked at by the last run.",
+    "files_skipped": "Number of logrotate files unchanged since they were last rendered.",
+    "files_rewritten": "Number of logrotate files written by the last run.",
+    "files_failed": "Number of logrotate files that could not be updated by the last run.",
+    "bytes_read": "Bytes of logrotate files read by the last run.",
+    "bytes_written": "Bytes of logrotate files written by the last run.",
+    "parse_errors": "Number of logrotate files with content that could not be parsed.",
+    "override_hits": "Number of logrotate files matched by an override entry.",
+    "state_entries_pruned": "Number of stale entries pruned from the logrotate state files.",
+    "globs_no_match": "Number of log path patterns matching nothing at the last check.",
+    "globs_costly": "Number of log path patterns listing too many directories at the last check.",
+    "deferrals": "Number of times the last run was deferred because the host was busy.",
+    "deferred_seconds": "Seconds the last run was deferred because the host was busy.",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def metrics_dir():
+    """Return the textfile collector directory, or "" if metrics are disabled."""
+    from lib_snapshot import load_snapshot
+
+    try:
+        return load_snapshot().get("metrics-textfile-dir")
+    except (OSError, ValueError):
+        return METRICS_DIR
+
+
+class RunMetrics:
+    """Metrics of a single run of job.
+
+    Counters and the per-file histogram may be updated from several threads.
+    """
+
+    def __init__(self, job, directory=None):
+        """Init function."""
+        self.job = job
+        self.directory = directory
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.buckets = [0] * len(FILE_DURATION_BUCKETS)
+        self.file_count = 0
+        self.file_seconds = 0.0
+        self.duration = None
+        self.success = None
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        """Increment the counter name by value."""
+        with self._lock:
+            self.counters[name] += value
+
+    def observe_file(self, seconds):
+        """Record the time spent processing a single file."""
+        with self._lock:
+            self.file_count += 1
+            self.file_seconds += seconds
+            for index, bound in enumerate(FILE_DURATION_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[index] += 1
+
+    @contextlib.contextmanager
+    def run(self):
+        """Time the enclosed code and save the metrics when it ends.
+
+        The run is a failure if an exception escapes; the exception is not
+        caught.
+        """
+        start = time.monotonic()
+        self.success = False
+        try:
+            yield self
+            self.success = True
+        finally:
+            self.duration = time.monotonic() - start
+            self.write()
+
+    def path(self):
+        """Return the path of the metrics file, or None if metrics are disabled."""
+        directory = self.directory if self.directory is not None else metrics_dir()
+        if not directory:
+            return None
+        return os.path.join(directory, "charm-logrotate-{}.prom".format(self.job))
+
+    def render(self, last_success=None):
+        """Return the metrics in the Prometheus text format."""
+        labels = 'job="{}"'.format(self.job)
+        lines = []
+
+        def add(name, kind, help_text, samples):
+            lines.append("# HELP {}{} {}".format(PREFIX, name, help_text))
+            lines.append("# TYPE {}{} {}".format(PREFIX, name, kind))
+            for suffix, extra, value in samples:
+                lines.append(
+                    "{}{}{}{{{}{}}} {}".format(PREFIX, name, suffix, labels, extra, value)
+                )
+
+        add(
+            "run_duration_seconds",
+            "gauge",
+            "Duration of the last run in seconds.",
+            [("", "", _format(self.duration))],
+        )
+        add(
+            "run_success",
+            "gauge",
+            "Whether the last run succeeded.",
+            [("", "", int(bool(self.success)))],
+        )
+        if last_success is not None:
+            add(
+                "last_success_timestamp_seconds",
+                "gauge",
+                "Unix time of the last successful run.",
+                [("", "", _format(last_success))],
+            )
+        for name, help_text in COUNTERS.items():
+            add(name, "gauge", help_text, [("", "", self.counters[name])])
+
+        samples = [
+            ("_bucket", ',le="{}"'.format(bound), count)
+            for bound, count in zip(FILE_DURATION_BUCKETS, self.buckets)
+        ]
+        samples.append(("_bucket", ',le="+Inf"', self.file_count))
+        samples.append(("_sum", "", _format(self.file_seconds)))
+        samples.append(("_count", "", self.file_count))
+        add(
+            "file_duration_seconds",
+            "histogram",
+            "Time spent processing each logrotate file by the last run.",
+            samples,
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Save the metrics for the textfile collector.
+
+        Nothing is saved if metrics are disabled or the collector directory
+        does not exist, and failing to save them does not fail the run.
+        """
+        path = self.path()
+        if path is None or not os.path.isdir(os.path.dirname(path)):
+            return
+        last_success = time.time() if self.success else _read_last_success(path)
+        try:
+            replace_file(path, self.render(last_success))
+        except OSError as err:
+            logger.warning("Could not save metrics to %s: %s", path, err)
+
+
+def _format(value):
+    """Format a sample value."""
+    return "NaN" if value is None else "{:.6f}".format(value)
+
+
+def _read_last_success(path):
+    """Return the last success timestamp saved at path, or None."""
+    try:
+        with open(path, "r") as metrics_file:
+            content = metrics_file.read()
+    except OSError:
+        return None
+    match = re.search(
+        r"^{}last_success_timestamp_seconds\{{[^}}]*\}} (\S+)$".format(PREFIX),
+        content,
+        re.MULTILINE,
+    )
+    return float(match.group(1)) if match else None
@@ -0,0 +1,96 @@
+"""Overlapping log paths module.
+
+logrotate reads the files of /etc/logrotate.d in name order, and a log claimed
+by several blocks is either rotated twice or rejected as a duplicate entry of
+the later block. The charm finds the blocks of different files claiming the
+same path pattern or the same log, reports them, and can comment out the later
+block when all of its paths are claimed by earlier ones.
+"""
+
+import json
+import os
+
+from lib_fileio import replace_file
+from lib_logfiles import has_magic
+
+OVERLAPS_FILE = "/var/lib/charm-logrotate/overlaps.json"
+# report only lists the overlaps, comment also disables the redundant blocks
+POLICIES = ("report", "comment")
+
+
+def find_overlaps(config_paths, index, scanner):
+    """Return the overlaps between the blocks of the logrotate files config_paths.
+
+    Every path pattern, and every log it matches, is claimed by the first
+    block listing it in logrotate order. A block is redundant if each of its
+    patterns is claimed elsewhere, either the same pattern or, for a plain
+    path, the log itself: a glob may match logs created later, so it is never
+    redundant because of the logs it matches now. Return (overlaps, redundant):
+    overlaps is a list of {"file", "block", "owner", "owner_block", "logs"},
+    one for every block claiming paths already claimed by the block of
+    another file, with the paths in logs; redundant maps the files to the
+    indexes of their blocks whose paths are all claimed elsewhere, with the
+    file of the first owner of each.
+    """
+    claims = {}
+    overlaps = []
+    redundant = {}
+    for config_path in sorted(config_paths):
+        try:
+            block_paths = index.block_paths(config_path)
+        except OSError:
+            continue
+        for block_index, paths in enumerate(block_paths):
+            owners = {}
+            unclaimed = False
+            for pattern in paths:
+                keys = [os.path.expanduser(pattern)]
+                keys.extend(log.path for log in scanner.find(pattern))
+                claimed = []
+                for key in keys:
+                    owner = claims.setdefault(key, (config_path, block_index))
+                    if owner[0] != config_path:
+                        owners.setdefault(owner, []).append(key)
+                        claimed.append(key)
+                if keys[0] not in claimed and (has_magic(pattern) or not claimed):
+                    unclaimed = True
+            for (owner_path, owner_block), logs in sorted(owners.items()):
+                overlaps.append(
+                    {
+                        "file": config_path,
+                        "block": block_index,
+                        "owner": owner_path,
+                        "owner_block": owner_block,
+                        "logs": sorted(set(logs)),
+                    }
+                )
+            if owners and not unclaimed:
+                redundant.setdefault(config_path, {})[block_index] = min(owners)[0]
+    return overlaps, redundant
+
+
+def save_report(overlaps, path=None):
+    """Save the overlaps found by the last update of the logrotate files."""
+    path = path or OVERLAPS_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(path, json.dumps(overlaps))
+
+
+def load_report(path=None):
+    """Return the overlaps found by the last update, empty if none was saved."""
+    try:
+        with open(path or OVERLAPS_FILE, "r") as report_file:
+            return json.load(report_file)
+    except (OSError, ValueError):
+        return []
+
+
+def status_message(path=None):
+    """Return the active status message, noting the overlaps of the last update."""
+    overlaps = load_report(path)
+    if not overlaps:
+        return "Unit is ready."
+    files = {overlap["file"] for overlap in overlaps}
+    return "Unit is ready. {} logrotate blocks in {} files overlap, see log-overlaps.".format(
+        len(overlaps), len(files)
+    )
@@ -0,0 +1,91 @@
+"""Override index module."""
+
+import fnmatch
+import re
+
+GLOB_CHARS = ("*", "?", "[")
+
+
+class OverrideIndex:
+    """Precompiled lookup of override entries by logrotate config path.
+
+    Entries with a plain "path" are kept in a dict. Entries whose "path" is a
+    glob, and entries with a "regex", are compiled once each and tried in
+    order, so that every regex keeps its own flags, groups and backreferences.
+    An exact path always takes precedence over a pattern; when several
+    entries exist for the same exact path the last one wins, and when several
+    patterns match the first one in the override list wins.
+    """
+
+    def __init__(self, override):
+        """Init function."""
+        self.exact = {}
+        self.patterns = []
+        for entry in override:
+            if "regex" in entry:
+                self.patterns.append((_compile_regex(entry["regex"]), entry))
+            elif "path" in entry:
+                path = entry["path"]
+                if any(char in path for char in GLOB_CHARS):
+                    self.patterns.append((fnmatch.translate(path), entry))
+                else:
+                    self.exact[path] = entry
+        self._build_matchers()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return the index saved by to_dict, without validating it again."""
+        index = cls([])
+        index.exact = data["exact"]
+        index.patterns = [tuple(pattern) for pattern in data["patterns"]]
+        index._build_matchers()
+        return index
+
+    def to_dict(self):
+        """Return the pre-parsed index as JSON serializable data."""
+        return {"exact": self.exact, "patterns": [list(pattern) for pattern in self.patterns]}
+
+    def _build_matchers(self):
+        """Compile the patterns, in the order they are tried."""
+        self.matchers = [(re.compile(pattern), entry) for pattern, entry in self.patterns]
+        self._cache = {}
+
+    def get(self, file_path):
+        """Return the override entry for file_path, or None."""
+        entry = self.exact.get(file_path)
+        if entry is not None or not self.matchers:
+            return entry
+
+        try:
+            return self._cache[file_path]
+        except KeyError:
+            pass
+        for matcher, pattern_entry in self.matchers:
+            if matcher.fullmatch(file_path):
+                entry = pattern_entry
+                break
+        self._cache[file_path] = entry
+        return entry
+
+    def __contains__(self, file_path):
+        """Check whether an override entry applies to file_path."""
+        return self.get(file_path) is not None
+
+    def __iter__(self):
+        """Iterate over the configured paths and patterns."""
+        yield from self.exact
+        for _, entry in self.patterns:
+            yield entry.get("regex", entry.get("path"))
+
+    def __len__(self):
+        """Return the number of configured paths and patterns."""
+        return len(self.exact) + len(self.patterns)
+
+
+def _compile_regex(regex):
+    """Validate regex, which is matched against whole paths."""
+    try:
+        re.compile(regex)
+    except re.error as err:
+        raise ValueError("Invalid override regex {!r}: {}".format(regex, err))
+    return regex
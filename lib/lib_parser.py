@@ -0,0 +1,429 @@
+"""Logrotate config parser module."""
+
+import re
+import shlex
+from functools import lru_cache
+
+BLANK = "blank"
+COMMENT = "comment"
+DIRECTIVE = "directive"
+INCLUDE = "include"
+SCRIPT = "script"
+RAW = "raw"
+
+SCRIPT_KEYWORDS = frozenset(["postrotate", "prerotate", "firstaction", "lastaction", "preremove"])
+INTERVAL_KEYWORDS = ("daily", "weekly", "monthly", "yearly")
+PATH_PREFIXES = ("/", '"', "'", "~")
+# Directives of logrotate(8), used to split the body of a block on one line
+KEYWORDS = frozenset(
+    [
+        "allowhardlink",
+        "compress",
+        "compresscmd",
+        "compressext",
+        "compressoptions",
+        "copy",
+        "copytruncate",
+        "create",
+        "createolddir",
+        "daily",
+        "dateext",
+        "dateformat",
+        "dateyesterday",
+        "delaycompress",
+        "extension",
+        "hourly",
+        "ifempty",
+        "include",
+        "mail",
+        "mailfirst",
+        "maillast",
+        "maxage",
+        "maxsize",
+        "minage",
+        "minsize",
+        "missingok",
+        "monthly",
+        "noallowhardlink",
+        "nocompress",
+        "nocopy",
+        "nocopytruncate",
+        "nocreate",
+        "nocreateolddir",
+        "nodateext",
+        "nodelaycompress",
+        "nomail",
+        "nomissingok",
+        "noolddir",
+        "norenamecopy",
+        "nosharedscripts",
+        "noshred",
+        "notifempty",
+        "olddir",
+        "renamecopy",
+        "rotate",
+        "sharedscripts",
+        "shred",
+        "shredcycles",
+        "size",
+        "start",
+        "su",
+        "tabooext",
+        "taboopat",
+        "weekly",
+        "yearly",
+    ]
+)
+# Braces open and close blocks only when separated from other text by whitespace,
+# so that a directive such as "olddir /var/log/${SVC}" does not close its block
+OPEN_BRACE = re.compile(r"\{(?=\s|\}|$)")
+CLOSE_BRACE = re.compile(r"(?:^|\s)\}$")
+INDENT = "    "
+# Comments around a block disabled by the charm, which keeps it parseable
+DISABLED_MARKER = "# Disabled by the logrotate charm: "
+DISABLED_END = "# End of the block disabled by the logrotate charm"
+
+
+class Node:
+    """A line, or a script section, of a logrotate config file."""
+
+    __slots__ = ("kind", "lines", "keyword", "args")
+
+    def __init__(self, kind, lines, keyword=None, args=""):
+        """Init function."""
+        self.kind = kind
+        self.lines = tuple(lines)
+        self.keyword = keyword
+        self.args = args
+
+    @property
+    def indent(self):
+        """Return the leading whitespace of the node."""
+        first = self.lines[0]
+        return first[: len(first) - len(first.lstrip())]
+
+    def __repr__(self):
+        """Return the node representation."""
+        return "Node({!r}, {!r})".format(self.kind, self.lines)
+
+
+class Block:
+    """A block of directives applied to one or more log paths."""
+
+    __slots__ = ("leading", "header", "paths", "body", "closing", "disabled")
+
+    def __init__(self, leading, header, paths, body, closing, disabled=None):
+        """Init function.
+
+        disabled is the reason the charm commented the block out, if it did.
+        """
+        self.leading = tuple(leading)
+        self.header = tuple(header)
+        self.paths = tuple(paths)
+        self.body = tuple(body)
+        self.closing = closing
+        self.disabled = disabled
+
+    def directives(self, *keywords):
+        """Return the directive nodes of the block matching keywords."""
+        return [
+            node
+            for node in self.body
+            if node.kind == DIRECTIVE and (not keywords or node.keyword in keywords)
+        ]
+
+    def has(self, *keywords):
+        """Check whether the block sets any of the directives in keywords."""
+        return any(node.kind == DIRECTIVE and node.keyword in keywords for node in self.body)
+
+    def scripts(self, *keywords):
+        """Return the script nodes of the block matching keywords."""
+        return [node for node in self.body if node.kind == SCRIPT and node.keyword in keywords]
+
+    def interval(self):
+        """Return the text of the interval directives in the block."""
+        return "\n".join(node.keyword for node in self.directives(*INTERVAL_KEYWORDS))
+
+
+class ConfigDocument:
+    """Parsed logrotate config file."""
+
+    __slots__ = ("blocks", "trailing")
+
+    def __init__(self, blocks, trailing):
+        """Init function."""
+        self.blocks = tuple(blocks)
+        self.trailing = tuple(trailing)
+
+    @property
+    def incomplete(self):
+        """Check whether part of the content could not be parsed into blocks."""
+        return any(node.kind == RAW for node in self.trailing)
+
+    def serialize(self, edits=None, header=None):
+        """Render the document with edits applied.
+
+        edits maps block indexes to BlockEdit instances. Without a header the
+        output keeps every block as a separate paragraph; with a header the
+        header is put on the first line and blank lines, as well as previous
+        copies of the header, are dropped.
+        """
+        edits = edits or {}
+        items = []
+        for index, block in enumerate(self.blocks):
+            edit = edits.get(index)
+            lines = [line for node in block.leading for line in node.lines]
+            block_lines = list(block.header)
+            block_lines.extend(_render_body(block, edit))
+            block_lines.append(block.closing)
+            disabled = block.disabled
+            if edit is not None and edit.disabled is not None:
+                disabled = edit.disabled
+            if disabled:
+                lines.append(DISABLED_MARKER + disabled)
+                lines.extend("# " + line if line.strip() else "#" for line in block_lines)
+                lines.append(DISABLED_END)
+            else:
+                lines.extend(block_lines)
+            items.append("\n".join(lines).strip())
+        trailing = "\n".join(line for node in self.trailing for line in node.lines).strip()
+        if trailing:
+            items.append(trailing)
+
+        if header is None:
+            return "\n".join("\n" + item for item in items) + "\n"
+
+        rows = [header]
+        for item in items:
+            rows.extend(row for row in item.splitlines() if row and not row.startswith(header))
+        return "\n".join(rows) + "\n"
+
+
+class BlockEdit:
+    """Directive updates to apply to a block when serializing it."""
+
+    __slots__ = ("updates", "disabled")
+
+    def __init__(self):
+        """Init function."""
+        self.updates = []
+        # None keeps the block as it is, "" enables it
+        self.disabled = None
+
+    def set(self, keywords, text, append=True):
+        """Replace the directives matching keywords with text.
+
+        If none of the directives is present and append is True, text is
+        added as the last directive of the block. Scripts are matched by
+        their keyword, such as prerotate, like directives.
+        """
+        self.updates.append((frozenset(keywords), text, append))
+
+    def remove(self, keywords):
+        """Drop the directives matching keywords."""
+        self.updates.append((frozenset(keywords), None, False))
+
+    def disable(self, reason):
+        """Comment the block out, noting reason."""
+        self.disabled = reason
+
+    def enable(self):
+        """Restore the block if the charm commented it out."""
+        self.disabled = ""
+
+    def __bool__(self):
+        """Check whether the edit changes anything."""
+        return bool(self.updates) or self.disabled is not None
+
+
+def _render_body(block, edit):
+    """Yield the body lines of block with edit applied."""
+    if not edit:
+        for node in block.body:
+            yield from node.lines
+        return
+
+    applied = set()
+    for node in block.body:
+        matched = None
+        if node.kind in (DIRECTIVE, SCRIPT):
+            for index, (keywords, _, _) in enumerate(edit.updates):
+                if node.keyword in keywords:
+                    matched = index
+                    break
+        if matched is None:
+            yield from node.lines
+            continue
+        text = edit.updates[matched][1]
+        if text is not None:
+            yield node.indent + text
+        applied.add(matched)
+
+    for index, (_, text, append) in enumerate(edit.updates):
+        if append and index not in applied:
+            yield INDENT + text
+
+
+def _split_paths(text):
+    """Split a block header into its path patterns."""
+    if not any(char in text for char in "\"'\\"):
+        return text.split()
+    try:
+        return shlex.split(text)
+    except ValueError:
+        return text.split()
+
+
+def _split_one_line(text):
+    """Split the body of a block written on one line into one line per directive.
+
+    A directive starts at every logrotate keyword, and a script runs from its
+    keyword to endscript.
+    """
+    lines = []
+    tokens = text.split()
+    while tokens:
+        token = tokens.pop(0)
+        if token.lower() in SCRIPT_KEYWORDS:
+            lines.append(token)
+            script = []
+            while tokens and tokens[0] != "endscript":
+                script.append(tokens.pop(0))
+            if script:
+                lines.append(" ".join(script))
+            if tokens:
+                lines.append(tokens.pop(0))
+        elif token.lower() in KEYWORDS or not lines:
+            lines.append(token)
+        else:
+            lines[-1] += " " + token
+    return lines
+
+
+def _directive(line):
+    """Build the node for a directive line."""
+    keyword, *args = line.split(None, 1)
+    keyword = keyword.lower()
+    kind = INCLUDE if keyword == "include" else DIRECTIVE
+    return Node(kind, [line], keyword, args[0].strip() if args else "")
+
+
+def _tokenize(content):
+    """Yield (kind, line) tokens for content in a single pass.
+
+    The body of a block on the same line as its opening brace is split so
+    that every directive stands on its own line, as is a closing brace after
+    a directive. Block headers are kept verbatim, with the opening brace.
+    """
+    lines = content.split("\n")
+    in_block = False
+    in_script = False
+    disabled = False
+    pending = list(reversed(lines))
+    while pending:
+        line = pending.pop()
+        stripped = line.strip()
+        if disabled:
+            # the lines of a disabled block are parsed without their comment
+            if stripped == DISABLED_END:
+                disabled = False
+                yield "disabled_end", line
+                continue
+            if line == "#" or line.startswith("# "):
+                line = line[2:]
+                stripped = line.strip()
+        elif not in_block and stripped.startswith(DISABLED_MARKER):
+            disabled = True
+            yield "disabled_start", stripped[len(DISABLED_MARKER) :]
+            continue
+        if in_script:
+            yield "script_end" if stripped == "endscript" else "script_line", line
+            in_script = stripped != "endscript"
+        elif not stripped:
+            yield BLANK, line
+        elif stripped.startswith("#"):
+            yield COMMENT, line
+        elif not in_block:
+            brace = OPEN_BRACE.search(line)
+            if brace is not None:
+                yield "open", line[: brace.end()]
+                in_block = True
+                rest = line[brace.end() :].strip()
+                if rest:
+                    close = CLOSE_BRACE.search(rest)
+                    if close is not None:
+                        rest = rest[: close.start()]
+                        pending.append("}")
+                    for directive in reversed(_split_one_line(rest)):
+                        pending.append(INDENT + directive)
+            elif stripped.startswith(PATH_PREFIXES):
+                yield "header", line
+            else:
+                yield DIRECTIVE, line
+        elif stripped.startswith("}"):
+            yield "close", line[: len(line) - len(line.lstrip())] + "}"
+            in_block = False
+            if stripped[1:].strip():
+                pending.append(stripped[1:].strip())
+        elif CLOSE_BRACE.search(stripped):
+            pending.append(line[: len(line) - len(line.lstrip())] + "}")
+            pending.append(line.rstrip()[:-1].rstrip())
+        elif stripped.split()[0].lower() in SCRIPT_KEYWORDS:
+            yield "script_start", line
+            in_script = True
+        else:
+            yield DIRECTIVE, line
+
+
+@lru_cache(maxsize=1024)
+def parse_config(content):
+    """Parse the content of a logrotate config file.
+
+    The parse runs in a single pass over the lines of content. The returned
+    document is never modified by serialization, so parses of identical
+    content are cached and shared.
+    """
+    blocks = []
+    pending = []
+    header = []
+    body = []
+    script = []
+    in_block = False
+    disabled = None
+
+    for kind, line in _tokenize(content):
+        if kind == "disabled_start":
+            disabled = line
+        elif kind == "disabled_end":
+            disabled = None
+        elif kind == "script_start":
+            script = [line]
+        elif kind == "script_line":
+            script.append(line)
+        elif kind == "script_end":
+            script.append(line)
+            keyword = script[0].strip().split()[0].lower()
+            body.append(Node(SCRIPT, script, keyword))
+            script = []
+        elif kind == "header":
+            header.append(line)
+        elif kind == "open":
+            header.append(line)
+            in_block = True
+        elif kind == "close":
+            paths = _split_paths(" ".join(header).rsplit("{", 1)[0])
+            blocks.append(Block(pending, header, paths, body, line, disabled))
+            pending, header, body = [], [], []
+            in_block = False
+        elif kind == DIRECTIVE:
+            (body if in_block else pending).append(_directive(line))
+        else:
+            (body if in_block else pending).append(Node(kind, [line]))
+
+    # Keep whatever could not be parsed into a complete block verbatim
+    trailing = pending + [Node(RAW, header)] if header else pending
+    if in_block or script:
+        trailing.extend(body)
+        if script:
+            trailing.append(Node(RAW, script))
+    return ConfigDocument(blocks, [node for node in trailing if node.lines])
@@ -0,0 +1,58 @@
+"""Plan report module."""
+
+TRUNCATED = "... diff truncated\n"
+
+
+class PlanReport:
+    """Bounded report of the changes planned for the logrotate files.
+
+    Diffs are kept until they add up to max_bytes, including the marker of
+    the cut diff; the rest is cut, but every file is still counted in the
+    summary.
+    """
+
+    def __init__(self, max_bytes):
+        """Init function."""
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.files_checked = 0
+        self.files_changed = 0
+        self.truncated = False
+        self.diffs = []
+
+    def add(self, file_path, diff):
+        """Record the diff planned for file_path.
+
+        Return the part of diff within the size bound, "" once the bound is
+        reached or if the file does not change.
+        """
+        self.files_checked += 1
+        if not diff:
+            return ""
+        self.files_changed += 1
+
+        remaining = self.max_bytes - self.used
+        data = diff.encode("utf-8")
+        if len(data) > remaining:
+            self.truncated = True
+            # room is left for the marker, so the report stays within the bound
+            remaining -= len(TRUNCATED)
+            if remaining <= 0:
+                return ""
+            diff = data[:remaining].decode("utf-8", errors="ignore")
+            diff = diff[: diff.rfind("\n") + 1] + TRUNCATED
+        self.used += len(diff.encode("utf-8"))
+        self.diffs.append(diff)
+        return diff
+
+    def diff(self):
+        """Return the diffs kept within the size bound."""
+        return "".join(self.diffs)
+
+    def summary(self):
+        """Return the counts of the report."""
+        return {
+            "files-checked": self.files_checked,
+            "files-changed": self.files_changed,
+            "truncated": self.truncated,
+        }
@@ -0,0 +1,182 @@
+"""Pressure module.
+
+Wraps the periodic jobs so that they wait while the host is busy: the job
+is deferred, with an exponential backoff, while the CPU or IO pressure
+stall information or the load average is above its threshold, and runs
+anyway once the deadline has passed. The job then runs with the idle IO
+scheduling class and a lower CPU priority. A job started again while its
+previous run is still deferred or running exits right away, so deferred jobs
+do not pile up when the deadline is longer than the period of the job.
+
+Usage: lib_pressure.py --job NAME COMMAND [ARGS...]
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from lib_metrics import RunMetrics
+
+PRESSURE_DIR = "/proc/pressure"
+# Held by the wrapper of a job while it is deferred or running
+LOCK_FILE = "/run/lock/charm-logrotate-{job}.lock"
+# niceness of the wrapped jobs
+NICE = 10
+INITIAL_DELAY = 30
+MAX_DELAY = 600
+
+logger = logging.getLogger(__name__)
+
+
+def read_pressure(resource):
+    """Return the share of time in percent some tasks stalled on resource.
+
+    The average over the last minute is used. Return None if the kernel
+    does not provide pressure stall information.
+    """
+    try:
+        with open(os.path.join(PRESSURE_DIR, resource), "r") as pressure_file:
+            for line in pressure_file:
+                kind, *fields = line.split()
+                if kind == "some":
+                    return float(dict(field.split("=") for field in fields)["avg60"])
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def load_per_cpu():
+    """Return the one minute load average divided by the CPUs of the job."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return os.getloadavg()[0] / cpus
+
+
+class PressureGate:
+    """Wait until the host is quiet enough to run a job."""
+
+    def __init__(
+        self,
+        io=20.0,
+        cpu=50.0,
+        load=1.5,
+        deadline=7200,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        """Init function.
+
+        io and cpu are pressure thresholds in percent, load a threshold of
+        the load average per CPU and deadline the longest deferral in
+        seconds. A threshold of 0 is not checked.
+        """
+        self.thresholds = {"io": io, "cpu": cpu, "load": load}
+        self.deadline = deadline
+        self.sleep = sleep
+        self.clock = clock
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Return a gate configured from the config snapshot."""
+        return cls(
+            io=snapshot.get("logrotate-pressure-io"),
+            cpu=snapshot.get("logrotate-pressure-cpu"),
+            load=snapshot.get("logrotate-pressure-load"),
+            deadline=snapshot.get("logrotate-pressure-deadline") * 60,
+        )
+
+    @staticmethod
+    def readings():
+        """Return the current pressure readings, None if not available."""
+        return {"io": read_pressure("io"), "cpu": read_pressure("cpu"), "load": load_per_cpu()}
+
+    def busy(self, readings):
+        """Return the names of the readings above their threshold."""
+        return [
+            name
+            for name, threshold in self.thresholds.items()
+            if threshold and readings[name] is not None and readings[name] > threshold
+        ]
+
+    def wait(self, metrics=None):
+        """Wait until no reading is above its threshold or the deadline passed.
+
+        Return the number of seconds the job was deferred. Deferrals are
+        counted in metrics if given.
+        """
+        start = self.clock()
+        delay = INITIAL_DELAY
+        while True:
+            busy = self.busy(self.readings())
+            waited = self.clock() - start
+            if not busy:
+                break
+            if waited >= self.deadline:
+                logger.warning("Deadline passed, running despite %s pressure.", ", ".join(busy))
+                break
+            delay = min(delay, self.deadline - waited)
+            logger.info("Deferring for %.0fs, %s pressure.", delay, ", ".join(busy))
+            if metrics is not None:
+                metrics.inc("deferrals")
+            self.sleep(delay)
+            delay = min(delay * 2, MAX_DELAY)
+        if metrics is not None:
+            metrics.inc("deferred_seconds", waited)
+        return waited
+
+
+def low_priority_command(command):
+    """Return command run with the idle IO scheduling class and a lower CPU priority."""
+    return ["ionice", "-c3", "nice", "-n", str(NICE)] + list(command)
+
+
+def lower_priority():
+    """Move the running process to the idle IO scheduling class and a lower CPU priority.
+
+    Used by the job juju-exec runs in the unit agent, out of reach of the wrapper.
+    """
+    os.nice(NICE)
+    try:
+        subprocess.check_call(["ionice", "-c3", "-p", str(os.getpid())])
+    except (OSError, subprocess.CalledProcessError) as err:
+        logger.warning("Could not set the idle IO scheduling class: %s", err)
+
+
+def main(argv=None):
+    """Ran by cron and the systemd timers to wrap a job."""
+    from lib_snapshot import load_snapshot
+
+    parser = argparse.ArgumentParser(description="Defer a job while the host is busy.")
+    parser.add_argument("--job", required=True, help="job name of the metrics")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="command to run")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    with open(LOCK_FILE.format(job=args.job), "a") as lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info("Skipping %s, its previous run is still deferred or running.", args.job)
+            return 0
+        try:
+            gate = PressureGate.from_snapshot(load_snapshot())
+        except (OSError, ValueError, TypeError) as err:
+            # the wrapper fronts logrotate itself, which must run regardless
+            logger.warning(
+                "Could not read the saved config, using the default thresholds: %s", err
+            )
+            gate = PressureGate()
+        metrics = RunMetrics("defer_" + args.job)
+        with metrics.run():
+            gate.wait(metrics)
+        return subprocess.call(low_priority_command(args.command))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Standalone refresh module.
+
+Entry point of the cron job in standalone mode. It runs without hook context,
+so it neither goes through juju-exec and the machine lock, nor imports
+charmhelpers: the charm config comes from the config dumped to disk by the
+hooks, and the outcome is saved to a status file that the next hook forwards
+to the Juju status.
+"""
+
+import json
+import os
+import sys
+import time
+
+from lib_fileio import replace_file
+from lib_metrics import RunMetrics
+
+STATUS_FILE = "/var/lib/charm-logrotate/status.json"
+
+
+def write_status(status, message, **details):
+    """Save the outcome of a run for the next hook to forward."""
+    data = dict(details, status=status, message=message, timestamp=time.time())
+    os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
+    replace_file(STATUS_FILE, json.dumps(data))
+
+
+def pop_status():
+    """Return the saved outcome of the last run and forget it.
+
+    Return None if no run happened since the status was last forwarded.
+    """
+    try:
+        with open(STATUS_FILE, "r") as status_file:
+            data = json.load(status_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        data = None
+    os.remove(STATUS_FILE)
+    return data
+
+
+def ready_message():
+    """Return the active status message, noting the overlaps of the last update."""
+    from lib_overlap import status_message
+
+    return status_message()
+
+
+def main():
+    """Ran by cron in standalone mode."""
+    start = time.monotonic()
+    try:
+        from lib_logrotate import LogrotateHelper
+
+        with RunMetrics("cronjob").run():
+            logrotate = LogrotateHelper.from_config_file()
+            logrotate.modify_configs()
+    except Exception as ex:
+        print("Error running cron job: {}".format(ex), file=sys.stderr)
+        write_status(
+            "blocked",
+            "Cron job failed: {}".format(ex),
+            error=str(ex),
+            duration=time.monotonic() - start,
+        )
+        return 1
+    write_status("active", ready_message(), duration=time.monotonic() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Rotation timing module.
+
+Runs logrotate verbosely and times every step from the arrival of its
+output: logrotate prints a line when it starts a step, so the time until
+the next line is the time the step took. The timings of each log and
+block are kept for the last runs, to find what makes rotation slow.
+
+Usage: lib_rotate.py [LOGROTATE ARGS...]
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from lib_fileio import replace_file
+
+LOGROTATE = "/usr/sbin/logrotate"
+HISTORY_FILE = "/var/lib/charm-logrotate/rotate-history.json"
+# runs kept in the history
+HISTORY_RUNS = 30
+
+# (line pattern, step); the first matching pattern is used
+STEPS = (
+    (re.compile(r"^renaming "), "rename"),
+    (re.compile(r"^(compressing log with|compressing )"), "compress"),
+    (re.compile(r"^running (prerotate|postrotate|first action|last action|shred) "), "script"),
+    (re.compile(r"^(copying |truncating )"), "copytruncate"),
+    (re.compile(r"^removing old log "), "remove"),
+    (re.compile(r"^creating new "), "create"),
+)
+BLOCK_LINE = re.compile(r"^rotating pattern: (.*?)\s{2,}")
+FILE_LINE = re.compile(r"^considering log (\S+)")
+ERROR_LINE = re.compile(r"^(error|warning): ")
+
+
+class RotationTimer:
+    """Timings of the steps of a verbose logrotate run."""
+
+    def __init__(self):
+        """Init function."""
+        self.blocks = {}
+        self.files = {}
+        self.block = None
+        self.file = None
+        self.step = None
+        self.last = None
+
+    def feed(self, line, now):
+        """Account the time since the previous line and start the step of line."""
+        self._close(now)
+        line = line.strip()
+        match = BLOCK_LINE.match(line)
+        if match is not None:
+            self.block = match.group(1)
+            self.file = None
+            self.step = "check"
+            return
+        match = FILE_LINE.match(line)
+        if match is not None:
+            self.file = match.group(1)
+            self.step = "check"
+            return
+        for pattern, step in STEPS:
+            if pattern.match(line):
+                self.step = step
+                return
+
+    def finish(self, now):
+        """Account the time of the last step."""
+        self._close(now)
+        self.last = None
+
+    def _close(self, now):
+        """Add the time since the previous line to the current step."""
+        if self.last is not None and self.block is not None:
+            seconds = now - self.last
+            self.blocks[self.block] = self.blocks.get(self.block, 0.0) + seconds
+            if self.file is not None:
+                steps = self.files.setdefault(self.file, {"block": self.block})
+                steps[self.step] = steps.get(self.step, 0.0) + seconds
+        self.last = now
+
+
+def run(args, clock=time.monotonic):
+    """Run logrotate verbosely with args and return (returncode, run record)."""
+    timer = RotationTimer()
+    started = time.time()
+    start = clock()
+    process = subprocess.Popen(
+        [LOGROTATE, "-v"] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    for line in process.stdout:
+        timer.feed(line, clock())
+        if ERROR_LINE.match(line):
+            # cron mails what the job prints, as it would for logrotate
+            sys.stderr.write(line)
+    returncode = process.wait()
+    timer.finish(clock())
+    record = {
+        "timestamp": started,
+        "duration": clock() - start,
+        "returncode": returncode,
+        "blocks": timer.blocks,
+        "files": timer.files,
+    }
+    return returncode, record
+
+
+def load_history(path=None):
+    """Return the saved runs, oldest first."""
+    try:
+        with open(path or HISTORY_FILE, "r") as history_file:
+            return json.load(history_file)
+    except (OSError, ValueError):
+        return []
+
+
+def save_run(record, path=None):
+    """Add the run record to the history, dropping the oldest runs."""
+    path = path or HISTORY_FILE
+    history = (load_history(path) + [record])[-HISTORY_RUNS:]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(path, json.dumps(history))
+
+
+def slowest(history, top=10):
+    """Return the top slowest logs of the history, slowest first.
+
+    Each entry has the log path, its block, the number of runs it was
+    considered in, its longest and mean total time and its mean time per
+    step.
+    """
+    totals = {}
+    for record in history:
+        for path, steps in record["files"].items():
+            entry = totals.setdefault(
+                path, {"path": path, "block": steps["block"], "runs": 0, "max": 0.0, "steps": {}}
+            )
+            total = sum(seconds for step, seconds in steps.items() if step != "block")
+            entry["runs"] += 1
+            entry["block"] = steps["block"]
+            entry["max"] = max(entry["max"], total)
+            entry["total"] = entry.get("total", 0.0) + total
+            for step, seconds in steps.items():
+                if step != "block":
+                    entry["steps"][step] = entry["steps"].get(step, 0.0) + seconds
+
+    entries = []
+    for entry in totals.values():
+        runs = entry["runs"]
+        entries.append(
+            {
+                "path": entry["path"],
+                "block": entry["block"],
+                "runs": runs,
+                "max": round(entry["max"], 3),
+                "mean": round(entry.pop("total") / runs, 3),
+                "steps": {
+                    step: round(seconds / runs, 3) for step, seconds in entry["steps"].items()
+                },
+            }
+        )
+    entries.sort(key=lambda entry: (-entry["mean"], entry["path"]))
+    return entries[:top]
+
+
+def main(argv=None):
+    """Ran by the cron.daily wrapper and the logrotate timer."""
+    args = sys.argv[1:] if argv is None else argv
+    returncode, record = run(args)
+    try:
+        save_run(record)
+    except OSError as err:
+        print("Could not save the rotation timings: {}".format(err), file=sys.stderr)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Config snapshot module.
+
+The hooks save the charm config to disk so that the cron job, the watcher
+service and the actions can use it without hook context.
+"""
+
+import json
+import os
+
+from lib_fileio import replace_file
+from lib_override import OverrideIndex
+
+SNAPSHOT_FILE = "/etc/logrotate_cronjob_config"
+SNAPSHOT_VERSION = 1
+
+
+def _to_bool(value):
+    """Convert a boolean option, saved as "True"/"False" by older versions."""
+    return value if isinstance(value, bool) else str(value) == "True"
+
+
+def _to_override(value):
+    """Convert the override option from its JSON string."""
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+# option name: (converter, default)
+OPTIONS = {
+    "logrotate-cronjob": (_to_bool, True),
+    "logrotate-cronjob-frequency": (str, "hourly"),
+    "logrotate-retention": (int, 30),
+    "update-cron-daily-schedule": (str, "unset"),
+    "logrotate-watcher": (_to_bool, False),
+    "override": (_to_override, []),
+    "logrotate-workers": (int, 1),
+    "logrotate-cronjob-standalone": (_to_bool, False),
+    "metrics-textfile-dir": (str, "/var/lib/prometheus/node-exporter"),
+    "logrotate-disk-budget": (str, ""),
+    "logrotate-dateext-threshold": (int, 0),
+    "logrotate-compression": (str, ""),
+    "logrotate-compression-threads": (int, 0),
+    "logrotate-copytruncate-helper": (_to_bool, False),
+    "logrotate-overlap-policy": (str, "report"),
+    "logrotate-glob-threshold": (int, 100),
+    "logrotate-state-prune-days": (int, 0),
+    "logrotate-state-shards": (int, 0),
+    "logrotate-scheduler": (str, "cron"),
+    "logrotate-timer-randomized-delay": (str, "15m"),
+    "logrotate-timer-accuracy": (str, "1m"),
+    "logrotate-timer-persistent": (_to_bool, True),
+    "logrotate-timer-cpu-weight": (int, 20),
+    "logrotate-timer-io-weight": (int, 20),
+    "logrotate-timer-nice": (int, 10),
+    "logrotate-pressure-defer": (_to_bool, False),
+    "logrotate-pressure-io": (float, 20.0),
+    "logrotate-pressure-cpu": (float, 50.0),
+    "logrotate-pressure-load": (float, 1.5),
+    "logrotate-pressure-deadline": (int, 120),
+    "logrotate-timing": (_to_bool, False),
+}
+
+# Order of the options in the unversioned, one value per line, format
+LEGACY_OPTIONS = [
+    "logrotate-cronjob",
+    "logrotate-cronjob-frequency",
+    "logrotate-retention",
+    "update-cron-daily-schedule",
+]
+
+_cache = {}
+
+
+class ConfigSnapshot:
+    """Typed snapshot of the charm config.
+
+    The generation is incremented every time a snapshot with different
+    options is written, so later stages can tell whether anything changed
+    since they last ran. applied is the last generation all the stages ran
+    with, so a generation they failed to apply is run again in full.
+    """
+
+    def __init__(self, options, generation=0, override_index=None, applied=None):
+        """Init function."""
+        self.options = {}
+        for option, (converter, default) in OPTIONS.items():
+            value = options.get(option)
+            self.options[option] = default if value is None else converter(value)
+        self.generation = generation
+        self.applied = generation if applied is None else applied
+        self._override_index = override_index
+        # options changed by the last write, all of them until then
+        self.changed = set(self.options)
+
+    @classmethod
+    def from_charm_config(cls, config):
+        """Return a snapshot of the charm config."""
+        return cls({option: config.get(option) for option in OPTIONS})
+
+    @classmethod
+    def from_content(cls, content):
+        """Return the snapshot saved with content."""
+        if not content.lstrip().startswith("{"):
+            lines = content.split("\n")
+            return cls(
+                {option: value for option, value in zip(LEGACY_OPTIONS, lines) if value != ""}
+            )
+
+        data = json.loads(content)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported config snapshot version: {}".format(data.get("version")))
+        override_index = data.get("override_index")
+        if override_index is not None:
+            override_index = OverrideIndex.from_dict(override_index)
+        return cls(data["options"], data["generation"], override_index, data.get("applied"))
+
+    def get(self, option):
+        """Return the value of option."""
+        return self.options[option]
+
+    def override_index(self):
+        """Return the override index, built once per snapshot."""
+        if self._override_index is None:
+            self._override_index = OverrideIndex(self.options["override"])
+        return self._override_index
+
+    def to_content(self):
+        """Return the snapshot serialized for disk."""
+        return json.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "generation": self.generation,
+                "applied": self.applied,
+                "options": self.options,
+                "override_index": self.override_index().to_dict(),
+            },
+            indent=2,
+            sort_keys=True,
+        )
+
+    def write(self, path=None):
+        """Save the snapshot atomically, bumping the generation on changes.
+
+        Nothing is written if the saved snapshot has the same options, unless
+        it was saved in the legacy format. Return True if the snapshot was
+        written. The options that differ from the saved snapshot are kept in
+        changed, all of them if the saved generation was not applied.
+        """
+        path = path or SNAPSHOT_FILE
+        try:
+            previous = load_snapshot(path)
+        except (OSError, ValueError):
+            previous = None
+
+        self.changed = self.diff(previous)
+        if previous is not None and previous.generation and previous.options == self.options:
+            self.generation = previous.generation
+            self.applied = previous.applied
+            return False
+        self.generation = previous.generation + 1 if previous is not None else 1
+        self.applied = previous.applied if previous is not None else 0
+        replace_file(path, self.to_content())
+        return True
+
+    def diff(self, previous):
+        """Return the names of the options that differ from the previous snapshot.
+
+        All the options differ from a missing snapshot, one saved in the
+        legacy format, which may predate options, or one whose generation was
+        not applied, as the stages may have stopped half way.
+        """
+        if previous is None or not previous.generation or previous.applied != previous.generation:
+            return set(self.options)
+        return {
+            option
+            for option, value in self.options.items()
+            if previous.options.get(option) != value
+        }
+
+
+def mark_applied(path=None):
+    """Record that all the stages ran with the saved snapshot.
+
+    Nothing is recorded when the cron job stages removed the snapshot, as the
+    next hook then saves a new one and runs all the stages anyway. Return True
+    if the snapshot was written.
+    """
+    path = path or SNAPSHOT_FILE
+    try:
+        snapshot = load_snapshot(path)
+    except FileNotFoundError:
+        return False
+    if snapshot.applied == snapshot.generation:
+        return False
+    snapshot.applied = snapshot.generation
+    replace_file(path, snapshot.to_content())
+    return True
+
+
+def load_snapshot(path=None):
+    """Return the snapshot saved at path.
+
+    The parsed snapshot is cached until the file changes on disk, so repeated
+    readers in the same process parse it only once.
+    """
+    path = path or SNAPSHOT_FILE
+    stat = os.stat(path)
+    key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, "r") as snapshot_file:
+        snapshot = ConfigSnapshot.from_content(snapshot_file.read())
+    _cache[path] = (key, snapshot)
+    return snapshot
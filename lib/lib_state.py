@@ -0,0 +1,426 @@
+"""logrotate state module.
+
+logrotate reads and rewrites its whole state file on every run, under a lock
+held for the run, and the file keeps the entries of logs long gone, such as
+the logs of removed containers and services. The charm prunes these entries
+once a day, and can run logrotate for each file of /etc/logrotate.d with a
+state file of its own, so that the state each run handles stays small and
+the runs of independent files do not wait for each other.
+
+Usage: lib_state.py [--workers N] [--timing] [LOGROTATE ARGS...] CONFIG
+"""
+
+import argparse
+import contextlib
+import fcntl
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from lib_fileio import replace_file
+from lib_parser import DIRECTIVE, INCLUDE, parse_config
+
+LOGROTATE = "/usr/sbin/logrotate"
+LOGROTATE_CONF = "/etc/logrotate.conf"
+LOGROTATE_DIR = "/etc/logrotate.d/"
+STATE_FILE = "/var/lib/logrotate/status"
+STATE_HEADER = "logrotate state -- version 2"
+SHARD_DIR = "/var/lib/charm-logrotate/shards/"
+# Held shared by the sharded runs, and exclusively by a merge
+SHARD_LOCK = "/var/lib/charm-logrotate/shards.lock"
+# Shard of the blocks of logrotate.conf itself, saved as .conf and .status: it
+# cannot collide with the shard of a file of logrotate.d, whose name is never empty
+MAIN_SHARD = ""
+PRUNE_FILE = "/var/lib/charm-logrotate/state-prune.json"
+# Seconds between two prunes
+PRUNE_INTERVAL = 86400
+# Files of an included directory logrotate skips, from its default tabooext
+TABOO_SUFFIXES = (
+    ",v",
+    ".cfsaved",
+    ".disabled",
+    ".dpkg-bak",
+    ".dpkg-del",
+    ".dpkg-dist",
+    ".dpkg-new",
+    ".dpkg-old",
+    ".dpkg-tmp",
+    ".rpmnew",
+    ".rpmorig",
+    ".rpmsave",
+    ".swp",
+    ".ucf-dist",
+    ".ucf-new",
+    ".ucf-old",
+    "~",
+)
+ENTRY_LINE = re.compile(r'^"((?:[^"\\]|\\.)*)" (\d+)-(\d+)-(\d+)(?:-(\d+):(\d+):(\d+))?$')
+ESCAPED = re.compile(r"\\(.)")
+
+
+class StateFile:
+    """Entries of a logrotate state file, by log path.
+
+    The date of an entry is kept as logrotate wrote it.
+    """
+
+    def __init__(self, path):
+        """Init function."""
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        """Read the entries, raise ValueError if a line is not understood."""
+        with open(self.path, "r") as state_file:
+            lines = state_file.read().splitlines()
+        self.entries = {}
+        for line in lines[1:]:
+            if not line.strip():
+                continue
+            match = ENTRY_LINE.match(line)
+            if match is None:
+                raise ValueError("Unexpected line in {}: {}".format(self.path, line))
+            log_path = ESCAPED.sub(r"\1", match.group(1))
+            self.entries[log_path] = line[match.end(1) + 2 :]
+
+    def save(self):
+        """Write the entries, keeping the attributes of the file."""
+        lines = [STATE_HEADER]
+        for log_path, date in self.entries.items():
+            escaped = log_path.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append('"{}" {}'.format(escaped, date))
+        replace_file(self.path, "\n".join(lines) + "\n", mode=0o644)
+
+    @staticmethod
+    def rotated(date):
+        """Return the datetime of the last rotation recorded as date."""
+        fields = [int(field) for field in re.split("[-:]", date)]
+        return datetime(*fields)
+
+
+def matches(log_path, patterns):
+    """Check whether log_path is matched by one of the path patterns of blocks.
+
+    Components are matched one by one, as glob(3) expands them.
+    """
+    parts = log_path.split(os.sep)
+    for pattern in patterns:
+        pattern_parts = os.path.expanduser(pattern).split(os.sep)
+        if len(pattern_parts) == len(parts) and all(
+            fnmatch.fnmatchcase(part, pattern_part)
+            for part, pattern_part in zip(parts, pattern_parts)
+        ):
+            return True
+    return False
+
+
+def prune_state(path, max_age_days, patterns=None, now=None):
+    """Drop the stale entries of the state file path.
+
+    An entry is stale if its log no longer exists and was last rotated more
+    than max_age_days ago, or if patterns are given and none matches it.
+    The state is left alone while logrotate holds its lock. Return the number
+    of entries dropped, or None if the state could not be pruned.
+    """
+    now = now or datetime.now()
+    try:
+        lock = open(path, "r")
+    except OSError:
+        return None
+    with lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        state = StateFile(path)
+        try:
+            state.load()
+        except (OSError, ValueError):
+            return None
+        oldest = now - timedelta(days=max_age_days)
+        kept = {}
+        for log_path, date in state.entries.items():
+            if patterns is not None and not matches(log_path, patterns):
+                continue
+            if os.path.lexists(log_path) or state.rotated(date) > oldest:
+                kept[log_path] = date
+        dropped = len(state.entries) - len(kept)
+        if dropped:
+            state.entries = kept
+            state.save()
+        return dropped
+
+
+def block_patterns(config_path):
+    """Return the path patterns of the blocks of the logrotate file config_path."""
+    try:
+        with open(config_path, "r") as config_file:
+            document = parse_config(config_file.read())
+    except OSError:
+        return []
+    return [pattern for block in document.blocks for pattern in block.paths]
+
+
+def shard_source(name):
+    """Return the logrotate file the blocks of the shard name come from."""
+    return LOGROTATE_CONF if name == MAIN_SHARD else os.path.join(LOGROTATE_DIR, name)
+
+
+def shard_names():
+    """Return the names of the shards with a state file."""
+    try:
+        names = os.listdir(SHARD_DIR)
+    except OSError:
+        return []
+    return sorted(name[: -len(".status")] for name in names if name.endswith(".status"))
+
+
+def prune_states(max_age_days, path=None, interval=PRUNE_INTERVAL, now=None):
+    """Prune the stale entries of the global and shard state files, if due.
+
+    A prune is due once interval seconds passed since the last one, and
+    disabled if max_age_days is 0. Each shard state also drops the entries of
+    the logs its logrotate file no longer rotates. Return the number of
+    entries dropped, or None if no prune was due.
+    """
+    path = path or PRUNE_FILE
+    if not max_age_days:
+        return None
+    try:
+        with open(path, "r") as prune_file:
+            last = json.load(prune_file).get("timestamp", 0)
+    except (OSError, ValueError, AttributeError):
+        last = 0
+    if time.time() - last < interval:
+        return None
+
+    dropped = prune_state(STATE_FILE, max_age_days, now=now) or 0
+    for name in shard_names():
+        patterns = block_patterns(shard_source(name))
+        state_path = os.path.join(SHARD_DIR, name + ".status")
+        dropped += prune_state(state_path, max_age_days, patterns, now) or 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    replace_file(path, json.dumps({"timestamp": time.time(), "dropped": dropped}))
+    return dropped
+
+
+def split_config(conf_path=None, config_dir=None):
+    """Split the main logrotate config into its global directives and the rest.
+
+    Return (global directive lines, main config without the include of
+    config_dir, whether the rest has blocks or includes), or None if the main
+    config does not include config_dir.
+    """
+    conf_path = conf_path or LOGROTATE_CONF
+    config_dir = os.path.normpath(config_dir or LOGROTATE_DIR)
+    with open(conf_path, "r") as conf_file:
+        content = conf_file.read()
+    document = parse_config(content)
+    # the top level nodes, in order; blocks belong to the main config
+    nodes = [node for block in document.blocks for node in block.leading + (None,)]
+    nodes.extend(document.trailing)
+
+    include = None
+    global_lines = []
+    for node in nodes:
+        if node is None:
+            continue
+        if node.kind == INCLUDE and os.path.normpath(node.args) == config_dir:
+            include = node
+            break
+        if node.kind == DIRECTIVE:
+            global_lines.extend(line.strip() for line in node.lines)
+    if include is None:
+        return None
+
+    lines = content.split("\n")
+    include_line = include.lines[0].strip()
+    del lines[[line.strip() for line in lines].index(include_line)]
+    has_rest = bool(document.blocks) or any(
+        node is not None and node is not include and node.kind == INCLUDE for node in nodes
+    )
+    return global_lines, "\n".join(lines), has_rest
+
+
+def build_shards(conf_path=None, config_dir=None):
+    """Write the config of every shard, seeding the state of new shards.
+
+    Every file of config_dir is a shard, with the global directives of the
+    main config; the main config without the include of config_dir is
+    another if it has blocks of its own. A new shard starts with the entries
+    of the global state its blocks match, so rotation carries on where it
+    was. The files of the shards that are gone are removed. Return [(config,
+    state)] for every shard, or None if the main config cannot be split.
+    """
+    config_dir = config_dir or LOGROTATE_DIR
+    split = split_config(conf_path, config_dir)
+    if split is None:
+        return None
+    global_lines, main_content, has_main = split
+
+    configs = {}
+    if has_main:
+        configs[MAIN_SHARD] = (main_content, block_patterns(conf_path or LOGROTATE_CONF))
+    for name in sorted(os.listdir(config_dir)):
+        config_path = os.path.join(config_dir, name)
+        if name.startswith(".") or name.endswith(TABOO_SUFFIXES):
+            continue
+        if not os.path.isfile(config_path):
+            continue
+        content = "\n".join(global_lines + ["include {}".format(config_path)])
+        configs[name] = (content, block_patterns(config_path))
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    for name in os.listdir(SHARD_DIR):
+        if name.rsplit(".", 1)[0] not in configs:
+            os.remove(os.path.join(SHARD_DIR, name))
+
+    global_state = StateFile(STATE_FILE)
+    try:
+        global_state.load()
+    except (OSError, ValueError):
+        pass
+    shards = []
+    for name, (content, patterns) in configs.items():
+        config_path = os.path.join(SHARD_DIR, name + ".conf")
+        state_path = os.path.join(SHARD_DIR, name + ".status")
+        replace_file(config_path, content + "\n")
+        if not os.path.exists(state_path):
+            state = StateFile(state_path)
+            state.entries = {
+                log_path: date
+                for log_path, date in global_state.entries.items()
+                if matches(log_path, patterns)
+            }
+            state.save()
+        shards.append((config_path, state_path))
+    return shards
+
+
+def try_lock(stack, path):
+    """Lock path exclusively without waiting, until stack closes.
+
+    Return False if the lock is held elsewhere.
+    """
+    lock = stack.enter_context(open(path, "a"))
+    try:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def merge_shards():
+    """Merge the shard states back into the global state and remove the shards.
+
+    The latest rotation of a log wins. Used when sharding is turned off, so
+    that the global state carries on from the shards. The hooks do not wait
+    for a running logrotate: while a sharded run holds the shards lock, or
+    logrotate holds the lock of the global state or of a shard state, the
+    merge is left for a later call. Return True if the shards were merged,
+    False if they were left for later, or None if there were none.
+    """
+    names = shard_names()
+    if not names:
+        return None
+    shard_paths = [os.path.join(SHARD_DIR, name + ".status") for name in names]
+    with contextlib.ExitStack() as locks:
+        for path in [SHARD_LOCK, STATE_FILE] + shard_paths:
+            if not try_lock(locks, path):
+                return False
+        state = StateFile(STATE_FILE)
+        try:
+            state.load()
+        except ValueError:
+            return False
+        for shard_path in shard_paths:
+            shard = StateFile(shard_path)
+            try:
+                shard.load()
+            except (OSError, ValueError):
+                continue
+            for log_path, date in shard.entries.items():
+                current = state.entries.get(log_path)
+                if current is None or state.rotated(date) > state.rotated(current):
+                    state.entries[log_path] = date
+        state.save()
+        for name in os.listdir(SHARD_DIR):
+            os.remove(os.path.join(SHARD_DIR, name))
+    return True
+
+
+def rotate_shard(shard, args, timing=False):
+    """Run logrotate on a shard, return (returncode, timing record or None)."""
+    config_path, state_path = shard
+    shard_args = list(args) + ["--state", state_path, config_path]
+    if timing:
+        from lib_rotate import run
+
+        return run(shard_args)
+    return subprocess.call([LOGROTATE] + shard_args), None
+
+
+def run_shards(args, conf_path=None, workers=1, timing=False):
+    """Run logrotate on every shard, workers at a time, and return its exit status.
+
+    logrotate runs on the main config with the global state if it cannot be
+    split into shards. With timing, the runs of the shards are saved as one.
+    The shards lock is held shared for the run, so that the shards are not
+    merged away while they are built or rotated.
+    """
+    os.makedirs(os.path.dirname(SHARD_LOCK), exist_ok=True)
+    with open(SHARD_LOCK, "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_SH)
+        shards = build_shards(conf_path)
+        if shards is None:
+            shards = [(conf_path or LOGROTATE_CONF, STATE_FILE)]
+        started = time.time()
+        start = time.monotonic()
+        if workers > 1 and len(shards) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(lambda shard: rotate_shard(shard, args, timing), shards)
+                )
+        else:
+            results = [rotate_shard(shard, args, timing) for shard in shards]
+
+    returncode = max(code for code, _ in results)
+    if timing:
+        from lib_rotate import save_run
+
+        record = {
+            "timestamp": started,
+            "duration": time.monotonic() - start,
+            "returncode": returncode,
+            "blocks": {},
+            "files": {},
+        }
+        for _, shard_record in results:
+            record["blocks"].update(shard_record["blocks"])
+            record["files"].update(shard_record["files"])
+        try:
+            save_run(record)
+        except OSError as err:
+            print("Could not save the rotation timings: {}".format(err), file=sys.stderr)
+    return returncode
+
+
+def main(argv=None):
+    """Ran by the cron.daily wrapper and the logrotate timer."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timing", action="store_true")
+    parser.add_argument("config")
+    args, logrotate_args = parser.parse_known_args(argv)
+    return run_shards(logrotate_args, args.config, args.workers, args.timing)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
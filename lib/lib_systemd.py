@@ -0,0 +1,89 @@
+"""Systemd helper module."""
+
+import os
+import subprocess
+
+from lib_fileio import replace_file
+
+SYSTEMD_DIR = "/etc/systemd/system/"
+# Exists when systemd is the init system, as checked by sd_booted(3)
+SYSTEMD_RUN_DIR = "/run/systemd/system"
+# Directories of the units shipped by packages
+PACKAGED_DIRS = ("/lib/systemd/system/", "/usr/lib/systemd/system/")
+
+
+def is_systemd_host():
+    """Check whether the host runs systemd."""
+    return os.path.isdir(SYSTEMD_RUN_DIR)
+
+
+def systemctl(*args):
+    """Run systemctl with args."""
+    subprocess.check_call(["systemctl", *args])
+
+
+def unit_exists(name):
+    """Check whether the systemd unit name is installed."""
+    return os.path.exists(os.path.join(SYSTEMD_DIR, name))
+
+
+def packaged_unit_exists(name):
+    """Check whether a package ships the systemd unit name."""
+    return any(os.path.exists(os.path.join(path, name)) for path in PACKAGED_DIRS)
+
+
+def read_unit(name):
+    """Return the content of the systemd unit name, or None if not installed."""
+    try:
+        with open(os.path.join(SYSTEMD_DIR, name), "r") as unit_file:
+            return unit_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_unit(name, content, batch=None):
+    """Write the systemd unit name atomically if its content changed.
+
+    The unit directory is synced at the end of batch if given. Return True if
+    the unit file was written.
+    """
+    return replace_file(os.path.join(SYSTEMD_DIR, name), content, mode=0o644, batch=batch)
+
+
+def write_drop_in(unit, name, content):
+    """Write the drop-in name of the systemd unit if its content changed.
+
+    Return True if the drop-in was written.
+    """
+    directory = os.path.join(SYSTEMD_DIR, unit + ".d")
+    os.makedirs(directory, exist_ok=True)
+    return replace_file(os.path.join(directory, name), content, mode=0o644)
+
+
+def remove_drop_in(unit, name):
+    """Remove the drop-in name of the systemd unit, and its directory if empty.
+
+    Return True if the drop-in existed.
+    """
+    directory = os.path.join(SYSTEMD_DIR, unit + ".d")
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        return False
+    os.remove(path)
+    try:
+        os.rmdir(directory)
+    except OSError:
+        # other drop-ins are left alone
+        pass
+    return True
+
+
+def remove_unit(name):
+    """Remove the systemd unit name.
+
+    Return True if the unit file existed.
+    """
+    if not unit_exists(name):
+        return False
+    os.remove(os.path.join(SYSTEMD_DIR, name))
+    return True
@@ -0,0 +1,175 @@
+"""Systemd timer module.
+
+An alternative to the cron files: the job updating the logrotate files and
+logrotate itself run from systemd timers, which can spread the start of the
+jobs of many units over a time window and run them with low CPU and IO
+weights.
+"""
+
+from lib_fileio import WriteBatch
+from lib_systemd import packaged_unit_exists, read_unit, remove_unit, systemctl, write_unit
+
+# Marks the units written by the charm, other units are never removed
+MANAGED_MARKER = "# Managed by the logrotate charm, do not edit."
+REFRESH_TIMER = "charm-logrotate-refresh"
+# Shadows the logrotate.timer and logrotate.service shipped by the package
+LOGROTATE_TIMER = "logrotate"
+TIMERS = (REFRESH_TIMER, LOGROTATE_TIMER)
+SCHEDULERS = ("cron", "systemd")
+
+
+class Timer:
+    """A systemd timer and the oneshot service it starts."""
+
+    def __init__(self, name, description, on_calendar, exec_start, randomized_delay=None):
+        """Init function.
+
+        randomized_delay replaces the randomized delay of the timer settings
+        if set.
+        """
+        self.name = name
+        self.description = description
+        self.on_calendar = on_calendar
+        self.exec_start = exec_start
+        self.randomized_delay = randomized_delay
+
+
+class TimerHelper:
+    """Helper class to manage the systemd timers of the charm."""
+
+    def __init__(
+        self,
+        randomized_delay="15m",
+        accuracy="1m",
+        persistent=True,
+        cpu_weight=20,
+        io_weight=20,
+        nice=10,
+    ):
+        """Init function."""
+        self.randomized_delay = randomized_delay
+        self.accuracy = accuracy
+        self.persistent = persistent
+        self.cpu_weight = cpu_weight
+        self.io_weight = io_weight
+        self.nice = nice
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Return a helper configured from the config snapshot."""
+        return cls(
+            randomized_delay=snapshot.get("logrotate-timer-randomized-delay"),
+            accuracy=snapshot.get("logrotate-timer-accuracy"),
+            persistent=snapshot.get("logrotate-timer-persistent"),
+            cpu_weight=snapshot.get("logrotate-timer-cpu-weight"),
+            io_weight=snapshot.get("logrotate-timer-io-weight"),
+            nice=snapshot.get("logrotate-timer-nice"),
+        )
+
+    def validate(self):
+        """Raise ValueError if a setting is out of the range systemd accepts."""
+        for option, value in (("cpu-weight", self.cpu_weight), ("io-weight", self.io_weight)):
+            if not 1 <= value <= 10000:
+                raise ValueError(
+                    "Invalid value for logrotate-timer-{}: {}, valid range: 1-10000".format(
+                        option, value
+                    )
+                )
+        if not -20 <= self.nice <= 19:
+            raise ValueError(
+                "Invalid value for logrotate-timer-nice: {}, valid range: -20-19".format(self.nice)
+            )
+
+    def render_timer(self, timer):
+        """Return the content of the .timer unit of timer."""
+        randomized_delay = timer.randomized_delay or self.randomized_delay
+        return """{marker}
+[Unit]
+Description={description} timer
+
+[Timer]
+OnCalendar={on_calendar}
+RandomizedDelaySec={randomized_delay}
+AccuracySec={accuracy}
+Persistent={persistent}
+
+[Install]
+WantedBy=timers.target
+""".format(
+            marker=MANAGED_MARKER,
+            description=timer.description,
+            on_calendar=timer.on_calendar,
+            randomized_delay=randomized_delay,
+            accuracy=self.accuracy,
+            persistent="true" if self.persistent else "false",
+        )
+
+    def render_service(self, timer):
+        """Return the content of the .service unit of timer."""
+        return """{marker}
+[Unit]
+Description={description}
+
+[Service]
+Type=oneshot
+ExecStart={exec_start}
+Nice={nice}
+CPUWeight={cpu_weight}
+IOWeight={io_weight}
+""".format(
+            marker=MANAGED_MARKER,
+            description=timer.description,
+            exec_start=timer.exec_start,
+            nice=self.nice,
+            cpu_weight=self.cpu_weight,
+            io_weight=self.io_weight,
+        )
+
+    @staticmethod
+    def is_managed(name):
+        """Check whether the unit name was written by the charm."""
+        content = read_unit(name)
+        return content is not None and content.startswith(MANAGED_MARKER + "\n")
+
+    def update_timers(self, timers):
+        """Install and start timers, and remove the other timers of the charm."""
+        self.validate()
+        wanted = {timer.name: timer for timer in timers}
+        changed = []
+        removed = []
+        with WriteBatch() as batch:
+            for timer in wanted.values():
+                timer_changed = write_unit(
+                    timer.name + ".timer", self.render_timer(timer), batch=batch
+                )
+                service_changed = write_unit(
+                    timer.name + ".service", self.render_service(timer), batch=batch
+                )
+                if timer_changed or service_changed:
+                    changed.append(timer.name)
+        for name in TIMERS:
+            if name not in wanted and self.is_managed(name + ".timer"):
+                removed.append(name)
+
+        if not changed and not removed:
+            for name in wanted:
+                systemctl("enable", "--now", name + ".timer")
+            return
+
+        for name in removed:
+            if not packaged_unit_exists(name + ".timer"):
+                systemctl("disable", "--now", name + ".timer")
+            remove_unit(name + ".timer")
+            remove_unit(name + ".service")
+        systemctl("daemon-reload")
+        for name in wanted:
+            if name in changed:
+                systemctl("enable", name + ".timer")
+                systemctl("restart", name + ".timer")
+            else:
+                systemctl("enable", "--now", name + ".timer")
+        for name in removed:
+            if packaged_unit_exists(name + ".timer"):
+                # the timer shipped by the package takes over again
+                systemctl("reenable", name + ".timer")
+                systemctl("try-restart", name + ".timer")
@@ -0,0 +1,194 @@
+"""Watcher module.
+
+Long running service that keeps the files in /etc/logrotate.d/ up to date
+as soon as they are created or modified, instead of waiting for the cron job.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+
+from lib_systemd import remove_unit, systemctl, unit_exists, write_unit
+
+WATCHER_SERVICE = "charm-logrotate-watcher.service"
+DEBOUNCE_SECONDS = 2.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+
+EVENT_HEADER = struct.Struct("iIII")
+
+logger = logging.getLogger(__name__)
+
+
+class Inotify:
+    """Minimal inotify binding."""
+
+    def __init__(self):
+        """Init function."""
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path, mask):
+        """Watch path for the events in mask."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self, timeout=None):
+        """Return the pending (mask, name) events.
+
+        Block until an event arrives, or for at most timeout seconds when
+        timeout is given.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        """Close the inotify file descriptor."""
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """Watch a directory and report the files touched in bursts of events."""
+
+    # Marker returned when the kernel dropped events and every file needs a look
+    ALL = None
+
+    def __init__(self, path, debounce=DEBOUNCE_SECONDS):
+        """Init function."""
+        self.path = path
+        self.debounce = debounce
+        self.inotify = Inotify()
+        self.inotify.add_watch(path, WATCH_MASK)
+
+    def wait_for_changes(self):
+        """Block until files change and return their names.
+
+        Once a first event arrives, events keep being collected until none
+        arrive for the debounce period, so a package install touching many
+        files results in a single batch. Return ALL if events were lost.
+        """
+        names = set()
+        overflow = False
+        timeout = None
+        while True:
+            events = self.inotify.read_events(timeout)
+            if not events and timeout is not None:
+                break
+            for mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif not mask & IN_IGNORED and self.is_relevant(name):
+                    names.add(name)
+            # start debouncing only once a relevant event arrived, events
+            # about temporary files alone go back to blocking
+            if names or overflow:
+                timeout = self.debounce
+        return self.ALL if overflow else sorted(names)
+
+    @staticmethod
+    def is_relevant(name):
+        """Check whether name is a config file rather than a temporary file."""
+        return bool(name) and not name.startswith(".") and not name.endswith(("~", ".tmp"))
+
+    def close(self):
+        """Stop watching."""
+        self.inotify.close()
+
+
+class WatcherHelper:
+    """Helper class to manage the watcher service."""
+
+    def __init__(self):
+        """Init function."""
+        self.service_name = WATCHER_SERVICE
+
+    def render_service(self):
+        """Return the content of the watcher systemd unit."""
+        watcher_path = os.path.realpath(__file__)
+        python_venv_path = os.getcwd().replace("charm", "") + ".venv/bin/python3"
+        return """[Unit]
+Description=Juju logrotate charm watcher for /etc/logrotate.d
+After=local-fs.target
+
+[Service]
+Type=simple
+ExecStart={python_venv_path} {watcher_path}
+Restart=on-failure
+RestartSec=10
+Nice=10
+IOSchedulingClass=idle
+
+[Install]
+WantedBy=multi-user.target
+""".format(python_venv_path=python_venv_path, watcher_path=watcher_path)
+
+    def update_service(self, enabled):
+        """Install and start the watcher service, or remove it if disabled."""
+        if enabled:
+            if write_unit(self.service_name, self.render_service()):
+                systemctl("daemon-reload")
+                systemctl("enable", self.service_name)
+                systemctl("restart", self.service_name)
+            else:
+                systemctl("enable", "--now", self.service_name)
+        elif unit_exists(self.service_name):
+            systemctl("disable", "--now", self.service_name)
+            remove_unit(self.service_name)
+            systemctl("daemon-reload")
+
+
+def process(config_files):
+    """Rewrite config_files, or every file if config_files is ALL."""
+    from lib_logrotate import LogrotateHelper
+
+    logrotate = LogrotateHelper.from_config_file()
+    logrotate.modify_configs(config_files)
+
+
+def main():
+    """Ran by the watcher service."""
+    from lib_logrotate import LOGROTATE_DIR
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    watcher = ConfigWatcher(LOGROTATE_DIR)
+    # catch up with whatever changed while the service was not running
+    config_files = ConfigWatcher.ALL
+    while True:
+        try:
+            process(config_files)
+            logger.info(
+                "Processed %s.",
+                "all files" if config_files is ConfigWatcher.ALL else ", ".join(config_files),
+            )
+        except Exception as ex:
+            logger.error("Error processing logrotate files: %s", ex)
+        config_files = watcher.wait_for_changes()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
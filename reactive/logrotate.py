@@ -1,24 +1,56 @@
 """Reactive charm hooks."""
 
+import functools
+
 from charmhelpers.core import hookenv
-from charms.reactive import set_flag, when, when_not
-from lib_cron import CronHelper
-from lib_logrotate import LogrotateHelper
+from charms.reactive import clear_flag, hook, set_flag, when, when_not
+from lib_jujulog import setup_juju_logging
 
 hooks = hookenv.Hooks()
-logrotate = LogrotateHelper()
-cron = CronHelper()
+
+# the helpers log with the logging module
+setup_juju_logging()
+
+
+# The helpers are built, and their modules imported, by the first handler
+# using them, so that the hooks not touching logrotate start faster.
+@functools.lru_cache(maxsize=None)
+def logrotate_helper():
+    """Return the logrotate helper, built on first use."""
+    from lib_logrotate import LogrotateHelper
+
+    return LogrotateHelper()
+
+
+@functools.lru_cache(maxsize=None)
+def cron_helper():
+    """Return the cron helper, built on first use."""
+    from lib_cron import CronHelper
+
+    return CronHelper()
+
+
+@functools.lru_cache(maxsize=None)
+def watcher_helper():
+    """Return the watcher helper, built on first use."""
+    from lib_watcher import WatcherHelper
+
+    return WatcherHelper()
 
 
 @when_not("logrotate.installed")
 def install_logrotate():
     """Install the logrotate charm."""
     try:
+        logrotate = logrotate_helper()
+        cron = cron_helper()
         dump_config_to_disk()
         logrotate.read_config()
         cron.read_config()
         logrotate.modify_configs()
         cron.install_cronjob()
+        watcher_helper().update_service(cron.watcher_enabled)
+        mark_config_applied()
     except Exception as ex:
         hookenv.log(
             "Error running install hook: {}".format(str(ex)),
@@ -26,20 +58,38 @@ def install_logrotate():
         )
         hookenv.status_set("blocked", "Install hook failed. Check logs for more info.")
         return
-    hookenv.status_set("active", "Unit is ready.")
+    hookenv.status_set("active", ready_message())
     set_flag("logrotate.installed")
 
 
+@hook("upgrade-charm")
+def upgrade_charm():
+    """Run the install stages again in full with the new charm code."""
+    clear_flag("logrotate.installed")
+
+
 @when("config.changed")
 def config_changed():
-    """Run when configuration changes."""
+    """Run when configuration changes.
+
+    Only the stages depending on the options that changed since the last
+    saved config are run, or all of them if they failed with the saved config.
+    """
+    from lib_logrotate import RENDER_OPTIONS
+
     try:
-        dump_config_to_disk()
+        logrotate = logrotate_helper()
+        cron = cron_helper()
+        changed = dump_config_to_disk()
         cron.read_config()
         logrotate.read_config()
-        hookenv.status_set("maintenance", "Modifying configs.")
-        logrotate.modify_configs()
-        cron.install_cronjob()
+        if changed & RENDER_OPTIONS:
+            hookenv.status_set("maintenance", "Modifying configs.")
+            logrotate.modify_configs()
+        cron.install_cronjob(changed)
+        if "logrotate-watcher" in changed:
+            watcher_helper().update_service(cron.watcher_enabled)
+        mark_config_applied()
     except Exception as ex:
         hookenv.log(
             "Error running config-changed hook: {}".format(str(ex)),
@@ -47,17 +97,112 @@ def config_changed():
         )
         hookenv.status_set("blocked", "Config-changed hook failed. Check logs for more info.")
         return
-    hookenv.status_set("active", "Unit is ready.")
+    hookenv.status_set("active", ready_message())
+
+
+@hook("stop")
+def stop():
+    """Undo the changes of the charm to the host before the unit is removed.
+
+    The watcher service, the timers and the cron.daily wrapper are removed,
+    and the logrotate files are rendered again without the copytruncate
+    helper scripts, which go away with the charm.
+    """
+    from lib_state import merge_shards
+
+    try:
+        watcher_helper().update_service(False)
+        cron_helper().uninstall_cronjob()
+        logrotate = logrotate_helper()
+        logrotate.copytruncate_helper = False
+        logrotate.modify_configs()
+        if merge_shards() is False:
+            hookenv.log("logrotate is running, the state shards are left in place.")
+    except Exception as ex:
+        hookenv.log(
+            "Error running stop hook: {}".format(str(ex)),
+            level=hookenv.ERROR,
+        )
+        hookenv.status_set("blocked", "Stop hook failed. Check logs for more info.")
+
+
+@hook("update-status")
+def update_status():
+    """Forward the outcome of the last standalone cron job to the Juju status.
+
+    The state shards left by a running logrotate are merged, and the log
+    globs checked, too.
+    """
+    from lib_refresh import pop_status
+
+    merge_state_shards()
+    check_log_globs()
+    status = pop_status()
+    if status is None:
+        return
+    if status["status"] != "active":
+        hookenv.log(
+            "Error running cron job: {}".format(status.get("error")),
+            level=hookenv.ERROR,
+        )
+    hookenv.status_set(status["status"], status["message"])
+
+
+def check_log_globs():
+    """Check the glob costs of the logrotate blocks once per check interval.
+
+    The workload status is left alone: the flagged patterns are counted in
+    one log line and in the metrics, and listed by the glob-costs action.
+    """
+    from lib_globs import check_globs
+
+    try:
+        patterns = check_globs(hookenv.config("logrotate-glob-threshold"))
+    except OSError as ex:
+        hookenv.log("Error checking the log globs: {}".format(ex), level=hookenv.ERROR)
+        return
+    if patterns:
+        hookenv.log(
+            "{} log globs match nothing or list too many directories, "
+            "see the glob-costs action.".format(len(patterns))
+        )
+
+
+def merge_state_shards():
+    """Merge the state shards back into the global state once sharding is off.
+
+    Merging is left for later while logrotate holds the lock of the global
+    state, so every update-status tries again until the shards are gone.
+    """
+    if hookenv.config("logrotate-state-shards"):
+        return
+    from lib_state import merge_shards
+
+    if merge_shards() is False:
+        hookenv.log("logrotate is running, merging the state shards later.")
+
+
+def ready_message():
+    """Return the active status message, noting what the last checks found."""
+    from lib_refresh import ready_message
+
+    return ready_message()
 
 
 def dump_config_to_disk():
-    """Dump configurations to disk."""
-    cronjob_enabled = hookenv.config("logrotate-cronjob")
-    cronjob_frequency = hookenv.config("logrotate-cronjob-frequency")
-    logrotate_retention = hookenv.config("logrotate-retention")
-    cron_daily_schedule = hookenv.config("update-cron-daily-schedule")
-    with open("/etc/logrotate_cronjob_config", "w+") as cronjob_config_file:
-        cronjob_config_file.write(str(cronjob_enabled) + "\n")
-        cronjob_config_file.write(str(cronjob_frequency) + "\n")
-        cronjob_config_file.write(str(logrotate_retention) + "\n")
-        cronjob_config_file.write(str(cron_daily_schedule) + "\n")
+    """Dump configurations to disk.
+
+    Return the names of the options changed since the last dump.
+    """
+    from lib_snapshot import ConfigSnapshot
+
+    snapshot = ConfigSnapshot.from_charm_config(hookenv.config())
+    snapshot.write()
+    return snapshot.changed
+
+
+def mark_config_applied():
+    """Record that all the stages ran with the config dumped to disk."""
+    from lib_snapshot import mark_applied
+
+    mark_applied()
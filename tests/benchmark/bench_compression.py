@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Benchmarks for the compression policies.
+
+A synthetic log is generated in a temporary directory and compressed with
+every installed compressor the way logrotate runs it: by a forced logrotate
+run if logrotate is installed, otherwise by piping the log through the
+compress command and options of the policy. The wall time and compression
+ratio of each policy are printed, and can be saved as JSON:
+
+    PYTHONPATH=lib python3 tests/benchmark/bench_compression.py --size-mb 256
+    PYTHONPATH=lib python3 tests/benchmark/bench_compression.py --output compression.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from lib_compression import COMPRESSORS, available_cpus, resolve_policy
+from lib_parser import BlockEdit, parse_config
+
+LEVELS = ("DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR")
+MESSAGES = (
+    "request completed method=GET path=/api/v1/items/{id} status=200 duration_ms={ms}",
+    "request completed method=POST path=/api/v1/orders status=201 duration_ms={ms}",
+    "cache miss key=item:{id} backend=redis",
+    "connection reset by peer remote=10.0.{a}.{b}:443 retry={retry}",
+    "worker {a} picked job {id} from queue default",
+)
+
+
+def generate_log(path, size, seed=0):
+    """Write about size bytes of log lines, as repetitive as a real log."""
+    rng = random.Random(seed)
+    timestamp = 1700000000.0
+    written = 0
+    with open(path, "w") as log_file:
+        while written < size:
+            timestamp += rng.random()
+            line = "{} {} [{}] {}\n".format(
+                time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)),
+                "app-{}".format(rng.randrange(4)),
+                rng.choice(LEVELS),
+                rng.choice(MESSAGES).format(
+                    id=rng.randrange(100000),
+                    ms=rng.randrange(2000),
+                    a=rng.randrange(256),
+                    b=rng.randrange(256),
+                    retry=rng.randrange(5),
+                ),
+            )
+            log_file.write(line)
+            written += len(line)
+
+
+def logrotate_config(policy, log_path):
+    """Return a logrotate file rotating log_path with the directives of policy."""
+    content = "{} {{\n  rotate 1\n  nodelaycompress\n}}\n".format(log_path)
+    edit = BlockEdit()
+    policy.apply(edit, delaycompress=False)
+    return parse_config(content).serialize({0: edit})
+
+
+def compress_logrotate(policy, log_path, workdir):
+    """Rotate log_path with a forced logrotate run, return the archive path."""
+    config_path = os.path.join(workdir, "logrotate.conf")
+    with open(config_path, "w") as config_file:
+        config_file.write(logrotate_config(policy, log_path))
+    state_path = os.path.join(workdir, "logrotate.state")
+    subprocess.run(["logrotate", "-f", "-s", state_path, config_path], check=True)
+    return log_path + ".1" + policy.extension
+
+
+def compress_pipe(policy, log_path, workdir):
+    """Compress log_path like logrotate does, return the archive path."""
+    archive_path = log_path + ".1" + policy.extension
+    with open(log_path, "rb") as log_file, open(archive_path, "wb") as archive:
+        subprocess.run(
+            [policy.command] + policy.options.split(), stdin=log_file, stdout=archive, check=True
+        )
+    return archive_path
+
+
+def bench_policy(policy, source, rounds, workdir, compress):
+    """Return the timing statistics and compression ratio of policy."""
+    log_path = os.path.join(workdir, "app.log")
+    timings = []
+    for _ in range(rounds):
+        for name in os.listdir(workdir):
+            if name.startswith("app.log"):
+                os.unlink(os.path.join(workdir, name))
+        shutil.copyfile(source, log_path)
+        start = time.perf_counter()
+        archive_path = compress(policy, log_path, workdir)
+        timings.append(time.perf_counter() - start)
+    return {
+        "rounds": rounds,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "ratio": os.path.getsize(source) / os.path.getsize(archive_path),
+        "options": policy.options,
+    }
+
+
+def run(size, rounds, threads):
+    """Run the benchmarks and return the results document."""
+    use_logrotate = shutil.which("logrotate") is not None
+    compress = compress_logrotate if use_logrotate else compress_pipe
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="logrotate-bench-") as workdir:
+        source = os.path.join(workdir, "source.log")
+        generate_log(source, size)
+        for name in COMPRESSORS:
+            policy = resolve_policy(name, threads)
+            if policy.name != name:
+                print("{:<10} not installed, skipped".format(name), file=sys.stderr)
+                continue
+            rotate_dir = os.path.join(workdir, name)
+            os.mkdir(rotate_dir)
+            results[name] = bench_policy(policy, source, rounds, rotate_dir, compress)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": available_cpus(),
+            "size": size,
+            "rounds": rounds,
+            "threads": threads,
+            "method": "logrotate" if use_logrotate else "pipe",
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--size-mb",
+        type=int,
+        default=64,
+        help="size of the synthetic log in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="runs per policy (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="threads of pigz and zstd, 0 for half of the CPUs (default: %(default)s)",
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    current = run(args.size_mb * 1024**2, args.rounds, args.threads)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+
+    print("method: {}, cpus: {}".format(current["meta"]["method"], current["meta"]["cpus"]))
+    for name, timing in current["results"].items():
+        print(
+            "{:<10} {:>10.4f}s {:>8.1f} MiB/s {:>7.2f}x  {}".format(
+                name,
+                timing["median"],
+                args.size_mb / timing["median"],
+                timing["ratio"],
+                timing["options"],
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Benchmarks for the copytruncate helper.
+
+A synthetic log is rotated the way logrotate does with copytruncate, by a
+userspace read/write copy followed by a truncation, and by the copytruncate
+helper. Run it in directories on the filesystems to compare, such as tmpfs,
+btrfs and xfs loopback mounts (btrfs and xfs reflink the log):
+
+    truncate -s 8G /tmp/xfs.img && mkfs.xfs /tmp/xfs.img
+    mkdir -p /mnt/xfs && mount -o loop /tmp/xfs.img /mnt/xfs
+    PYTHONPATH=lib python3 tests/benchmark/bench_copytruncate.py --dir /mnt/xfs --dir /dev/shm
+    PYTHONPATH=lib python3 tests/benchmark/bench_copytruncate.py --output copytruncate.json
+
+The wall time, and the bytes the process read from and wrote to storage,
+of each method are printed for every directory. tmpfs does no storage I/O.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import lib_copytruncate
+
+# Buffer of the copy made by logrotate
+LOGROTATE_BUFFER = 64 * 1024
+
+
+def filesystem_type(path):
+    """Return the type of the filesystem mounted on the longest prefix of path."""
+    path = os.path.realpath(path)
+    best = ("", "unknown")
+    with open("/proc/mounts", "r") as mounts:
+        for line in mounts:
+            _, mount_point, fs_type = line.split()[:3]
+            if (path + "/").startswith(mount_point.rstrip("/") + "/") and len(mount_point) > len(
+                best[0]
+            ):
+                best = (mount_point, fs_type)
+    return best[1]
+
+
+def io_counters():
+    """Return the bytes this process read from and wrote to storage so far."""
+    counters = {}
+    try:
+        with open("/proc/self/io", "r") as io_file:
+            for line in io_file:
+                name, value = line.split(":")
+                counters[name] = int(value)
+    except OSError:
+        return 0, 0
+    return counters.get("read_bytes", 0), counters.get("write_bytes", 0)
+
+
+def generate_log(path, size):
+    """Write size bytes of log lines."""
+    line = b"2024-01-01T00:00:00 app-1 [INFO] request completed status=200\n"
+    chunk = line * (1024 * 1024 // len(line))
+    with open(path, "wb") as log_file:
+        written = 0
+        while written < size:
+            written += log_file.write(chunk[: size - written])
+
+
+def rotate_stock(log_path):
+    """Rotate log_path like logrotate's copytruncate."""
+    with open(log_path, "rb") as log_file, open(log_path + ".1", "wb") as archive:
+        while True:
+            data = log_file.read(LOGROTATE_BUFFER)
+            if not data:
+                break
+            archive.write(data)
+    os.truncate(log_path, 0)
+    return "read/write"
+
+
+def rotate_helper(log_path):
+    """Rotate log_path with the copytruncate helper around logrotate's copy."""
+    method = lib_copytruncate.stage(log_path)
+    rotate_stock(log_path)
+    lib_copytruncate.finish(log_path)
+    return method
+
+
+def bench_method(rotate, directory, size, rounds):
+    """Return the timing and I/O statistics of rotate in directory."""
+    timings = []
+    io = []
+    method = None
+    for _ in range(rounds):
+        with tempfile.TemporaryDirectory(prefix="copytruncate-bench-", dir=directory) as workdir:
+            log_path = os.path.join(workdir, "app.log")
+            generate_log(log_path, size)
+            os.sync()
+            read_before, written_before = io_counters()
+            start = time.perf_counter()
+            method = rotate(log_path)
+            os.sync()
+            timings.append(time.perf_counter() - start)
+            read_after, written_after = io_counters()
+            io.append((read_after - read_before, written_after - written_before))
+            if os.path.getsize(log_path + ".1") != size:
+                raise RuntimeError("{} lost data in {}".format(rotate.__name__, directory))
+    return {
+        "rounds": rounds,
+        "method": method,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "bytes_read": statistics.median(read for read, _ in io),
+        "bytes_written": statistics.median(written for _, written in io),
+    }
+
+
+def run(directories, size, rounds):
+    """Run the benchmarks and return the results document."""
+    results = {}
+    for directory in directories:
+        results[directory] = {
+            "filesystem": filesystem_type(directory),
+            "stock": bench_method(rotate_stock, directory, size, rounds),
+            "helper": bench_method(rotate_helper, directory, size, rounds),
+        }
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": size,
+            "rounds": rounds,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--dir",
+        action="append",
+        dest="directories",
+        help="directory to rotate the log in, can be repeated (default: the temp directory)",
+    )
+    parser.add_argument(
+        "--size-mb",
+        type=int,
+        default=256,
+        help="size of the synthetic log in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="runs per method (default: %(default)s)"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    current = run(args.directories or [tempfile.gettempdir()], args.size_mb * 1024**2, args.rounds)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+
+    for directory, result in current["results"].items():
+        print("{} ({})".format(directory, result["filesystem"]))
+        for name in ("stock", "helper"):
+            timing = result[name]
+            print(
+                "  {:<7} {:<16} {:>10.4f}s {:>10.1f} MiB read {:>10.1f} MiB written".format(
+                    name,
+                    timing["method"],
+                    timing["median"],
+                    timing["bytes_read"] / 1024**2,
+                    timing["bytes_written"] / 1024**2,
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
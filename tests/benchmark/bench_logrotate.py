@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""Benchmarks for the config rewrite hot path.
+
+Synthetic /etc/logrotate.d trees are generated in a temporary directory and
+the helpers run against them with a stubbed hookenv, so no Juju, network or
+root access is needed. Results are written as JSON and can be compared with
+the results of a previous release:
+
+    PYTHONPATH=lib python3 tests/benchmark/bench_logrotate.py --output new.json
+    PYTHONPATH=lib python3 tests/benchmark/bench_logrotate.py --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timezone
+from unittest import mock
+
+DEFAULT_SIZES = (10, 1000, 10000)
+INTERVALS = ("daily", "weekly", "monthly", "yearly")
+CRONTAB = """\
+SHELL=/bin/sh
+17 *\t* * *\troot\tcd / && run-parts --report /etc/cron.hourly
+25 6\t* * *\troot\ttest -x /usr/sbin/anacron || ( cd / && run-parts --report /etc/cron.daily )
+47 6\t* * 7\troot\ttest -x /usr/sbin/anacron || ( cd / && run-parts --report /etc/cron.weekly )
+52 6\t1 * *\troot\ttest -x /usr/sbin/anacron || ( cd / && run-parts --report /etc/cron.monthly )
+"""
+
+
+def stub_hookenv():
+    """Install a stub charmhelpers.core.hookenv in sys.modules."""
+    hookenv = types.ModuleType("charmhelpers.core.hookenv")
+    hookenv.DEBUG, hookenv.INFO, hookenv.WARNING, hookenv.ERROR = (
+        "DEBUG",
+        "INFO",
+        "WARNING",
+        "ERROR",
+    )
+    hookenv.config = lambda scope=None: None
+    hookenv.log = lambda message, level=None: None
+    hookenv.status_set = lambda workload_state, message, application=False: None
+    hookenv.local_unit = lambda: "logrotated/0"
+    hookenv.has_juju_version = lambda version: True
+    core = types.ModuleType("charmhelpers.core")
+    core.hookenv = hookenv
+    charmhelpers = types.ModuleType("charmhelpers")
+    charmhelpers.core = core
+    sys.modules.update(
+        {
+            "charmhelpers": charmhelpers,
+            "charmhelpers.core": core,
+            "charmhelpers.core.hookenv": hookenv,
+        }
+    )
+
+
+def generate_config(rng, index):
+    """Return the content of a synthetic logrotate file."""
+    blocks = []
+    for block in range(rng.randint(1, 5)):
+        lines = [
+            "/var/log/app{}/service{}-*.log /var/log/app{}/extra{}.log {{".format(
+                index, block, index, block
+            )
+        ]
+        lines.append("    {}".format(rng.choice(INTERVALS)))
+        if rng.random() < 0.7:
+            lines.append("    rotate {}".format(rng.randint(1, 99)))
+        if rng.random() < 0.2:
+            lines.append("    size {}M".format(rng.randint(1, 500)))
+        lines.extend(["    missingok", "    notifempty", "    compress", "    delaycompress"])
+        if rng.random() < 0.5:
+            lines.extend(
+                [
+                    "    sharedscripts",
+                    "    postrotate",
+                    '        if [ -f "${PIDFILE}" ]; then',
+                    '            kill -HUP "$(cat ${PIDFILE})" > /dev/null 2>&1 || true',
+                    "        fi",
+                    "    endscript",
+                ]
+            )
+        lines.append("}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_override(size, config_dir):
+    """Return a large override list covering part of a tree of size files."""
+    override = [
+        {"path": config_dir + "conf{:05d}".format(index), "rotate": 7, "interval": "weekly"}
+        for index in range(0, size, 2)
+    ]
+    override.extend(
+        {"path": config_dir + "conf{:03d}*9".format(prefix), "size": "100M"}
+        for prefix in range(20)
+    )
+    override.append({"regex": config_dir + "conf0+1[0-9]", "rotate": 3})
+    return override
+
+
+def generate_tree(config_dir, size, seed=0):
+    """Write a synthetic logrotate.d tree and return {path: content}."""
+    rng = random.Random(seed)
+    tree = {}
+    for index in range(size):
+        file_path = config_dir + "conf{:05d}".format(index)
+        tree[file_path] = generate_config(rng, index)
+    write_tree(tree)
+    return tree
+
+
+def write_tree(tree):
+    """Write every file of tree."""
+    for file_path, content in tree.items():
+        with open(file_path, "w") as config_file:
+            config_file.write(content)
+
+
+def rng_size(index):
+    """Return a deterministic log size for the log of config file index."""
+    return 100 + (index * 7919) % 4000
+
+
+def measure(func, rounds, setup=None):
+    """Return timing statistics of rounds calls of func, in seconds."""
+    timings = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "rounds": rounds,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+    }
+
+
+def bench_size(size, rounds, workdir):
+    """Run every benchmark against a tree of size files."""
+    import lib_cron
+    import lib_logfiles
+    import lib_logrotate
+    import lib_manifest
+    import lib_overlap
+    import lib_parser
+
+    config_dir = os.path.join(workdir, "logrotate.d-{}".format(size)) + "/"
+    os.makedirs(config_dir)
+    manifest_file = os.path.join(workdir, "manifest-{}.json".format(size))
+    state_files = {
+        "log_index": os.path.join(workdir, "log-index-configs-{}.json".format(size)),
+        "overlaps": os.path.join(workdir, "overlaps-{}.json".format(size)),
+    }
+    crontab_file = os.path.join(workdir, "crontab")
+    tree = generate_tree(config_dir, size)
+    override = generate_override(size, config_dir)
+
+    logrotate = lib_logrotate.LogrotateHelper(
+        retention=90,
+        override=json.dumps(override),
+        workers=1,
+        disk_budget="",
+        dateext_threshold=0,
+        compression="",
+        compression_threads=0,
+        copytruncate_helper=False,
+        overlap_policy="report",
+        state_prune_days=0,
+    )
+    results = {}
+
+    def modify_content():
+        lib_parser.parse_config.cache_clear()
+        for file_path, content in tree.items():
+            logrotate.modify_content(content, file_path, header=lib_logrotate.HEADER)
+
+    results["modify_content"] = measure(modify_content, rounds)
+
+    def cold_start():
+        write_tree(tree)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        lib_parser.parse_config.cache_clear()
+
+    with mock.patch.object(lib_logrotate, "LOGROTATE_DIR", config_dir), mock.patch.object(
+        lib_manifest, "MANIFEST_FILE", manifest_file
+    ), mock.patch.object(
+        lib_logfiles, "LOG_INDEX_FILE", state_files["log_index"]
+    ), mock.patch.object(
+        lib_overlap, "OVERLAPS_FILE", state_files["overlaps"]
+    ):
+        results["modify_configs_cold"] = measure(logrotate.modify_configs, rounds, cold_start)
+        # the tree is fully rendered by now, this is the steady state of the cron job
+        results["modify_configs_warm"] = measure(logrotate.modify_configs, rounds)
+
+    items = list(tree.values())
+
+    def calculate_count():
+        for item in items:
+            logrotate.calculate_count(item, 90)
+
+    results["calculate_count"] = measure(calculate_count, rounds)
+
+    def get_override_settings():
+        override_files = logrotate.get_override_files()
+        logrotate.override_files = override_files
+        for file_path in tree:
+            logrotate.get_override_settings(file_path)
+
+    results["get_override_settings"] = measure(get_override_settings, rounds)
+
+    real_open = open
+
+    def crontab_open(path, *args, **kwargs):
+        if path == "/etc/crontab":
+            path = crontab_file
+        return real_open(path, *args, **kwargs)
+
+    def reset_crontab():
+        with real_open(crontab_file, "w") as crontab:
+            crontab.write(CRONTAB)
+
+    # every config file rotates a log with 10 rotated files, so the usage
+    # report of the 10k tree looks at 100k rotated files
+    log_dir = os.path.join(workdir, "log-{}".format(size))
+    os.makedirs(log_dir)
+    usage_dir = os.path.join(workdir, "logrotate.d-usage-{}".format(size)) + "/"
+    os.makedirs(usage_dir)
+    for index in range(size):
+        log_path = os.path.join(log_dir, "app{:05d}.log".format(index))
+        for suffix in [""] + [".{}.gz".format(number) for number in range(1, 11)]:
+            with open(log_path + suffix, "w") as log_file:
+                log_file.write("x" * rng_size(index))
+        with open(usage_dir + "conf{:05d}".format(index), "w") as config_file:
+            config_file.write("{} {{\n    daily\n}}\n".format(log_path))
+    # listings of directories modified within the last second are not cached
+    os.utime(log_dir, (0, 0))
+    index_file = os.path.join(workdir, "log-index-{}.json".format(size))
+
+    def clear_index():
+        lib_parser.parse_config.cache_clear()
+        if os.path.exists(index_file):
+            os.remove(index_file)
+
+    results["log_usage_cold"] = measure(
+        lambda: lib_logfiles.log_usage(usage_dir, index_path=index_file), rounds, clear_index
+    )
+    results["log_usage_warm"] = measure(
+        lambda: lib_logfiles.log_usage(usage_dir, index_path=index_file), rounds
+    )
+
+    cron = lib_cron.CronHelper()
+    with mock.patch.object(lib_cron, "open", crontab_open, create=True):
+        results["write_to_crontab"] = measure(
+            lambda: cron.write_to_crontab("30 4"), rounds, reset_crontab
+        )
+
+    return results
+
+
+def run(sizes, rounds):
+    """Run the benchmarks and return the results document."""
+    stub_hookenv()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="logrotate-bench-") as workdir:
+        for size in sizes:
+            for name, timing in bench_size(size, rounds, workdir).items():
+                results["{}[{}]".format(name, size)] = timing
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": list(sizes),
+            "rounds": rounds,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold, min_delta):
+    """Print the comparison of two results documents.
+
+    Return the names of the benchmarks whose median is slower than the
+    baseline by more than the threshold ratio, ignoring differences below
+    min_delta seconds which are measurement noise.
+    """
+    regressions = []
+    for name, timing in sorted(current["results"].items()):
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print("{:<40} {:>10.4f}s  (new)".format(name, timing["median"]))
+            continue
+        ratio = timing["median"] / previous["median"] if previous["median"] else 1.0
+        flag = ""
+        if ratio > threshold and timing["median"] - previous["median"] > min_delta:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            "{:<40} {:>10.4f}s {:>10.4f}s {:>7.2f}x{}".format(
+                name, previous["median"], timing["median"], ratio, flag
+            )
+        )
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma separated number of files per tree (default: %(default)s)",
+    )
+    parser.add_argument("--rounds", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="compare with results saved by --output")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio reported as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.001,
+        help="slowdown in seconds below which no regression is reported (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.rounds)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        return 1 if compare(current, baseline, args.threshold, args.min_delta) else 0
+
+    for name, timing in sorted(current["results"].items()):
+        print("{:<40} {:>10.4f}s".format(name, timing["median"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Configurations for tests."""
 
+import logging
 from unittest import mock
 
 import pytest
@@ -33,9 +34,9 @@ def mock_hookenv_config(monkeypatch):
     """Hookenv mock."""
     import yaml
 
-    def mock_config():
+    def mock_config(scope=None):
         cfg = {}
-        yml = yaml.load(open("./config.yaml"))
+        yml = yaml.safe_load(open("./config.yaml"))
 
         # Load all defaults
         for key, value in yml["options"].items():
@@ -43,27 +44,27 @@ def mock_hookenv_config(monkeypatch):
 
         # Manually add cfg from other layers
         # cfg['my-other-layer'] = 'mock'
-        return cfg
+        return cfg if scope is None else cfg.get(scope)
 
-    monkeypatch.setattr("lib_logrotate.hookenv.config", mock_config)
+    monkeypatch.setattr("charmhelpers.core.hookenv.config", mock_config)
 
 
 @pytest.fixture
 def mock_remote_unit(monkeypatch):
     """Remote unit mock."""
-    monkeypatch.setattr("lib_logrotate.hookenv.remote_unit", lambda: "unit-mock/0")
+    monkeypatch.setattr("charmhelpers.core.hookenv.remote_unit", lambda: "unit-mock/0")
 
 
 @pytest.fixture()
 def mock_local_unit(monkeypatch):
     """Local unit mock."""
-    monkeypatch.setattr("lib_logrotate.hookenv.local_unit", lambda: "unit-logrotated/0")
+    monkeypatch.setattr("charmhelpers.core.hookenv.local_unit", lambda: "unit-logrotated/0")
 
 
 @pytest.fixture
 def mock_charm_dir(monkeypatch):
     """Charm dir mock."""
-    monkeypatch.setattr("lib_logrotate.hookenv.charm_dir", lambda: "/mock/charm/dir")
+    monkeypatch.setattr("charmhelpers.core.hookenv.charm_dir", lambda: "/mock/charm/dir")
 
 
 @pytest.fixture
@@ -85,3 +86,75 @@ def cron():
     from lib_cron import CronHelper
 
     return CronHelper
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(tmp_path, monkeypatch):
+    """Textfile collector directory, not created unless a test needs it."""
+    path = tmp_path / "node-exporter"
+    monkeypatch.setattr("lib_metrics.METRICS_DIR", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def systemd_dir(tmp_path, monkeypatch):
+    """Temporary systemd unit directories."""
+    path = tmp_path / "systemd"
+    path.mkdir()
+    (path / "packaged").mkdir()
+    monkeypatch.setattr("lib_systemd.SYSTEMD_DIR", str(path) + "/")
+    monkeypatch.setattr("lib_systemd.PACKAGED_DIRS", (str(path / "packaged") + "/",))
+    monkeypatch.setattr("lib_systemd.SYSTEMD_RUN_DIR", str(path / "run"))
+    return path
+
+
+@pytest.fixture
+def write_log():
+    """Return a function writing a log file of size bytes."""
+
+    def write(path, size):
+        path.write_bytes(b"x" * size)
+
+    return write
+
+
+@pytest.fixture
+def logrotate_dir(tmp_path, monkeypatch):
+    """Temporary /etc/logrotate.d/ and charm state directory."""
+    config_dir = tmp_path / "logrotate.d"
+    config_dir.mkdir()
+    monkeypatch.setattr("lib_logrotate.LOGROTATE_DIR", str(config_dir) + "/")
+    monkeypatch.setattr("lib_manifest.MANIFEST_FILE", str(tmp_path / "state" / "manifest.json"))
+    monkeypatch.setattr("lib_logfiles.LOG_INDEX_FILE", str(tmp_path / "state" / "log-index.json"))
+    monkeypatch.setattr("lib_overlap.OVERLAPS_FILE", str(tmp_path / "state" / "overlaps.json"))
+    return config_dir
+
+
+@pytest.fixture
+def logrotate_helper():
+    """Logrotate helper instance fixture."""
+    from lib_logrotate import LogrotateHelper
+
+    with mock.patch("charmhelpers.core.hookenv.config") as mock_config:
+        mock_config.return_value = "[]"
+        helper = LogrotateHelper()
+    helper.retention = 30
+    helper.workers = 1
+    helper.disk_budget = ""
+    helper.dateext_threshold = 0
+    helper.compression = ""
+    helper.compression_threads = 0
+    helper.copytruncate_helper = False
+    helper.overlap_policy = "report"
+    helper.state_prune_days = 0
+    return helper
+
+
+@pytest.fixture
+def root_logger():
+    """Root logger, with its handlers and level restored afterwards."""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    root.handlers[:] = handlers
+    root.setLevel(level)
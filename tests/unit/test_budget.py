@@ -0,0 +1,137 @@
+"""Disk budget tests."""
+
+import pytest
+from lib_budget import fit_counts, parse_size
+from lib_logfiles import LogScanner, rotated_base
+
+
+class TestLogScanner:
+    """Log scanner tests."""
+
+    @pytest.mark.parametrize(
+        ("name", "base"),
+        [
+            ("syslog.1", "syslog"),
+            ("syslog.2.gz", "syslog"),
+            ("app.log-20240131", "app.log"),
+            ("app.log-2024013112.xz", "app.log"),
+            ("app.log.2024-01-31", "app.log"),
+            ("app.log", None),
+            ("1.gz", None),
+        ],
+    )
+    def test_rotated_base(self, name, base):
+        """Test the names of rotated files are recognized."""
+        assert rotated_base(name) == base
+
+    def test_find(self, tmp_path, write_log):
+        """Test logs are found with the sizes of their rotated files."""
+        write_log(tmp_path / "app.log", 50)
+        write_log(tmp_path / "app.log.1", 100)
+        write_log(tmp_path / "app.log.2.gz", 20)
+        write_log(tmp_path / "other.log", 10)
+
+        (log,) = LogScanner().find(str(tmp_path / "app.log"))
+
+        assert log.path == str(tmp_path / "app.log")
+        assert log.size == 50
+        assert sorted(log.rotated) == [20, 100]
+        assert log.rotation_size() == 60
+
+    def test_find_glob(self, tmp_path, write_log):
+        """Test rotated files matched by a glob are not taken for logs."""
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            write_log(tmp_path / name / "app.log", 10)
+            write_log(tmp_path / name / "app.log.1", 30)
+
+        logs = LogScanner().find(str(tmp_path / "*" / "app*"))
+
+        assert [log.path for log in logs] == [
+            str(tmp_path / "a" / "app.log"),
+            str(tmp_path / "b" / "app.log"),
+        ]
+        assert [log.rotation_size() for log in logs] == [30, 30]
+
+    def test_find_missing(self, tmp_path):
+        """Test a missing log or directory is not an error."""
+        assert LogScanner().find(str(tmp_path / "missing" / "app.log")) == []
+
+
+class TestFitCounts:
+    """Disk budget fitting tests."""
+
+    @pytest.mark.parametrize(
+        ("value", "expected"),
+        [("100", 100), ("100k", 102400), ("2M", 2 * 1024**2), (" 10G ", 10 * 1024**3)],
+    )
+    def test_parse_size(self, value, expected):
+        """Test sizes are parsed with their unit."""
+        assert parse_size(value) == expected
+
+    def test_parse_invalid_size(self):
+        """Test an invalid size is rejected."""
+        with pytest.raises(ValueError, match="Invalid size"):
+            parse_size("10 gigabytes")
+
+    def test_within_budget(self):
+        """Test the retention based counts are kept when they fit."""
+        demands = {"a": (100, 30), "b": (10, 4)}
+
+        assert fit_counts(demands, 10000) == {"a": 30, "b": 4}
+
+    def test_over_budget(self):
+        """Test all counts are lowered by the same fraction to fit the budget."""
+        demands = {"a": (100, 30), "b": (10, 4)}
+
+        counts = fit_counts(demands, 1600)
+
+        assert counts == {"a": 15, "b": 2}
+        assert sum(demands[key][0] * count for key, count in counts.items()) <= 1600
+
+    def test_minimum_count(self):
+        """Test counts never go below 1."""
+        assert fit_counts({"a": (100, 30)}, 10) == {"a": 1}
+
+    def test_zero_count(self):
+        """Test a block keeping no rotated files is never raised to 1."""
+        assert fit_counts({"a": (100, 0), "b": (100, 30)}, 10) == {"a": 0, "b": 1}
+
+
+class TestDiskBudgetMode:
+    """Disk budget mode of the logrotate files update tests."""
+
+    def test_modify_configs(self, logrotate_helper, logrotate_dir, tmp_path, write_log):
+        """Test rotate counts are sized from the rotated logs."""
+        log_dir = tmp_path / "log"
+        log_dir.mkdir()
+        write_log(log_dir / "busy.log", 1000)
+        for index in range(1, 4):
+            write_log(log_dir / "busy.log.{}".format(index), 1000)
+        write_log(log_dir / "quiet.log", 10)
+        (logrotate_dir / "busy").write_text("{}/busy.log {{\n  daily\n}}\n".format(log_dir))
+        (logrotate_dir / "quiet").write_text("{}/quiet.log {{\n  weekly\n}}\n".format(log_dir))
+        (logrotate_dir / "new").write_text("{}/new.log {{\n  daily\n}}\n".format(log_dir))
+        logrotate_helper.disk_budget = "15100"
+
+        logrotate_helper.modify_configs()
+
+        # 30 days of busy.log would take 30000 bytes, it gets half of that
+        assert "rotate 15" in (logrotate_dir / "busy").read_text()
+        assert "rotate 2" in (logrotate_dir / "quiet").read_text()
+        assert "rotate 30" in (logrotate_dir / "new").read_text()
+
+    def test_counts_change(self, logrotate_helper, logrotate_dir, tmp_path, write_log):
+        """Test files are rendered again when the logs grow."""
+        log_dir = tmp_path / "log"
+        log_dir.mkdir()
+        write_log(log_dir / "app.log", 10)
+        (logrotate_dir / "app").write_text("{}/app.log {{\n  daily\n}}\n".format(log_dir))
+        logrotate_helper.disk_budget = "1k"
+
+        logrotate_helper.modify_configs()
+        assert "rotate 30" in (logrotate_dir / "app").read_text()
+
+        write_log(log_dir / "app.log.1", 100)
+        logrotate_helper.modify_configs()
+        assert "rotate 10" in (logrotate_dir / "app").read_text()
@@ -0,0 +1,138 @@
+"""Compression policy tests."""
+
+import json
+
+import pytest
+from lib_compression import resolve_policy
+
+CONTENT = "/var/log/app.log {\n  daily\n  compress\n  delaycompress\n}\n"
+
+
+@pytest.fixture
+def installed(mocker):
+    """Set the compressors found on the PATH."""
+    programs = set()
+
+    def which(program):
+        return "/usr/bin/" + program if program in programs else None
+
+    mocker.patch("lib_compression.shutil.which", side_effect=which)
+    mocker.patch("lib_compression.available_cpus", return_value=8)
+    return programs
+
+
+class TestResolvePolicy:
+    """Compression policy resolution tests."""
+
+    def test_not_managed(self, installed):
+        """Test an empty policy leaves the compression of the files alone."""
+        assert resolve_policy("") is None
+
+    def test_invalid(self, installed):
+        """Test an unknown compressor is rejected."""
+        with pytest.raises(ValueError, match="Invalid compression 'bzip2'"):
+            resolve_policy("bzip2")
+
+    def test_auto(self, installed):
+        """Test auto picks the first installed compressor, with half of the CPUs."""
+        installed.update(["gzip", "gunzip", "pigz", "unpigz"])
+
+        policy = resolve_policy("auto")
+
+        assert policy.name == "pigz"
+        assert policy.options == "-6 -p 4"
+        assert policy.extension == ".gz"
+
+    def test_threads(self, installed):
+        """Test the configured threads are used by multi-threaded compressors."""
+        installed.update(["zstd", "unzstd"])
+
+        assert resolve_policy("zstd", 2).options == "-3 -q -T2"
+
+    def test_missing_fallback(self, installed):
+        """Test a compressor that is not installed falls back to gzip."""
+        installed.update(["gzip", "gunzip"])
+
+        policy = resolve_policy("zstd")
+
+        assert policy.name == "gzip"
+        assert policy.command == "/usr/bin/gzip"
+        assert policy.options == "-6"
+
+    def test_installed_later(self, installed):
+        """Test a compressor installed after a first resolution is picked up."""
+        installed.update(["gzip", "gunzip"])
+        assert resolve_policy("auto").name == "gzip"
+
+        installed.update(["zstd", "unzstd"])
+        assert resolve_policy("auto").name == "zstd"
+        assert resolve_policy("auto") is resolve_policy("auto")
+
+
+class TestCompressionDirectives:
+    """Compression directives of the logrotate files tests."""
+
+    def test_policy(self, logrotate_helper, installed):
+        """Test the directives of the compressor are set in every block."""
+        installed.update(["zstd", "unzstd"])
+
+        content = logrotate_helper.modify_content(
+            CONTENT, "/etc/logrotate.d/app", compression=resolve_policy("zstd")
+        )
+
+        assert content == (
+            "\n/var/log/app.log {\n"
+            "  daily\n"
+            "  compress\n"
+            "  delaycompress\n"
+            "    rotate 30\n"
+            "    compresscmd /usr/bin/zstd\n"
+            "    uncompresscmd /usr/bin/unzstd\n"
+            "    compressoptions -3 -q -T4\n"
+            "    compressext .zst\n"
+            "}\n"
+        )
+
+    def test_delaycompress_kept(self, logrotate_helper, installed):
+        """Test the policy leaves delaycompress to the block unless the override sets it."""
+        installed.update(["gzip", "gunzip"])
+        content = "/var/log/app.log {\n  daily\n}\n/var/log/b.log {\n  nodelaycompress\n}\n"
+
+        content = logrotate_helper.modify_content(
+            content, "/etc/logrotate.d/app", compression=resolve_policy("gzip")
+        )
+
+        assert "delaycompress" not in content.replace("  nodelaycompress\n", "", 1)
+        assert "  nodelaycompress\n" in content
+
+    def test_none(self, logrotate_helper, installed):
+        """Test the none policy disables compression."""
+        content = logrotate_helper.modify_content(
+            CONTENT, "/etc/logrotate.d/app", compression=resolve_policy("none")
+        )
+
+        assert content == "\n/var/log/app.log {\n  daily\n  nocompress\n    rotate 30\n}\n"
+
+    def test_override(self, logrotate_helper, installed):
+        """Test an override entry sets the compressor and delaycompress of a file."""
+        installed.update(["gzip", "gunzip"])
+        logrotate_helper.override = json.loads(
+            '[{"path": "/etc/logrotate.d/app", "compression": "gzip", "delaycompress": false}]'
+        )
+        logrotate_helper.override_files = logrotate_helper.get_override_files()
+
+        content = logrotate_helper.modify_content(CONTENT, "/etc/logrotate.d/app")
+
+        assert "  nodelaycompress\n" in content
+        assert "    compresscmd /usr/bin/gzip\n" in content
+        assert "    compressoptions -6\n" in content
+        assert "delaycompress\n" not in content.replace("nodelaycompress", "")
+
+    def test_settings_generation(self, logrotate_helper, installed):
+        """Test changing the compression renders the files again."""
+        installed.update(["gzip", "gunzip", "zstd", "unzstd"])
+        generation = logrotate_helper.settings_generation()
+
+        logrotate_helper.compression = "zstd"
+
+        assert logrotate_helper.settings_generation() != generation
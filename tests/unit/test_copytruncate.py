@@ -0,0 +1,218 @@
+"""Copytruncate helper tests."""
+
+import errno
+
+import lib_copytruncate
+import pytest
+from lib_copytruncate import (
+    ARCHIVES_SUFFIX,
+    STAGED_SUFFIX,
+    clone,
+    finish,
+    helper_command,
+    stage,
+)
+from lib_parser import parse_config
+
+CONFIG = """\
+/var/log/app/*.log {
+    daily
+    copytruncate
+}
+
+/var/log/web.log {
+    daily
+    copytruncate
+    postrotate
+        systemctl reload web
+    endscript
+}
+
+/var/log/db.log {
+    daily
+}
+"""
+
+
+@pytest.fixture
+def log(tmp_path):
+    """Log with some content."""
+    path = tmp_path / "app.log"
+    path.write_text("line 1\nline 2\n")
+    return path
+
+
+class TestRender:
+    """Copytruncate helper scripts of the blocks tests."""
+
+    def test_helper_scripts(self, logrotate_helper):
+        """Test only copytruncate blocks without scripts of their own get the helper."""
+        content = logrotate_helper.modify_content(
+            CONFIG, "/etc/logrotate.d/app", copytruncate_helper=True
+        )
+
+        app, web, db = content.strip().split("\n\n")
+        assert "    prerotate\n        {}\n    endscript".format(helper_command("stage")) in app
+        assert "    postrotate\n        {}\n    endscript".format(helper_command("finish")) in app
+        assert "lib_copytruncate" not in web + db
+
+    def test_stable_and_removed(self, logrotate_helper):
+        """Test the scripts render the same again, and are removed once disabled."""
+        content = logrotate_helper.modify_content(
+            CONFIG, "/etc/logrotate.d/app", copytruncate_helper=True
+        )
+
+        assert (
+            logrotate_helper.modify_content(
+                content, "/etc/logrotate.d/app", copytruncate_helper=True
+            )
+            == content
+        )
+        disabled = logrotate_helper.modify_content(content, "/etc/logrotate.d/app")
+        assert "lib_copytruncate" not in disabled
+        assert "systemctl reload web" in disabled
+
+    def test_command(self):
+        """Test the helper runs with the python of the charm virtualenv."""
+        command = helper_command("stage")
+
+        assert command.split()[0].endswith("/.venv/bin/python3")
+        assert command.endswith('/lib/lib_copytruncate.py stage "$1" .1')
+
+    @pytest.mark.parametrize(
+        ("directives", "date_format", "suffix"),
+        [
+            ("daily", None, ".1"),
+            ("daily\n    start 0", None, ".0"),
+            ("daily\n    dateext", None, "-%Y%m%d"),
+            ("hourly\n    dateext", None, "-%Y%m%d%H"),
+            ("daily\n    dateext\n    dateformat .%Y-%m-%d", None, ".%Y-%m-%d"),
+            ("size 1G", "-%Y%m%d-%s", "-%Y%m%d-%s"),
+        ],
+    )
+    def test_archive_suffix(self, directives, date_format, suffix):
+        """Test the helper is told how logrotate names the new archive."""
+        content = "/var/log/app.log {{\n    copytruncate\n    {}\n}}\n".format(directives)
+        (block,) = parse_config(content).blocks
+
+        assert lib_copytruncate.archive_suffix(block, date_format) == suffix
+
+    def test_dateext_threshold(self, logrotate_helper):
+        """Test the blocks switched to dated archives run the helper with their dateformat."""
+        content = logrotate_helper.modify_content(
+            "/var/log/app.log {\n    daily\n    copytruncate\n}\n",
+            "/etc/logrotate.d/app",
+            dateext_threshold=7,
+            copytruncate_helper=True,
+        )
+
+        assert "{}\n".format(helper_command("finish", "-%Y%m%d")) in content
+
+    def test_extension_skipped(self, logrotate_helper):
+        """Test blocks naming archives with an extension do not get the helper."""
+        content = logrotate_helper.modify_content(
+            "/var/log/app.log {\n    daily\n    copytruncate\n    extension .log\n}\n",
+            "/etc/logrotate.d/app",
+            copytruncate_helper=True,
+        )
+
+        assert "lib_copytruncate" not in content
+
+
+class TestHelper:
+    """Copytruncate helper tests."""
+
+    def test_rotation(self, log, tmp_path):
+        """Test the staged copy, with what was logged since, replaces the archive."""
+        assert stage(str(log)) is not None
+        assert log.read_text() == ""
+
+        # logrotate copies what was logged since the staging, then truncates
+        log.write_text("line 3\n")
+        archive = tmp_path / "app.log.1"
+        archive.write_text(log.read_text())
+        log.write_text("")
+
+        assert finish(str(log)) == str(archive)
+        assert archive.read_text() == "line 1\nline 2\nline 3\n"
+        assert not (tmp_path / ("app.log" + STAGED_SUFFIX)).exists()
+        assert not (tmp_path / ("app.log" + ARCHIVES_SUFFIX)).exists()
+
+    def test_numbered_archives(self, tmp_path):
+        """Test the new numbered archive is replaced, not a sibling log or an older archive."""
+        log = tmp_path / "app"
+        log.write_text("line 2\n")
+        sibling = tmp_path / "app-access.log"
+        (tmp_path / "app.1").write_text("line 1\n")
+        stage(str(log))
+
+        # logrotate shifts the archives, copies the log, then it is written to
+        (tmp_path / "app.1").rename(tmp_path / "app.2")
+        (tmp_path / "app.1").write_text("")
+        sibling.write_text("GET /\n")
+
+        assert finish(str(log)) == str(tmp_path / "app.1")
+        assert (tmp_path / "app.1").read_text() == "line 2\n"
+        assert (tmp_path / "app.2").read_text() == "line 1\n"
+        assert sibling.read_text() == "GET /\n"
+
+    def test_dated_archives(self, log, tmp_path):
+        """Test the new dated archive is replaced, not the older ones."""
+        for day in ("20261016", "20261017"):
+            (tmp_path / "app.log-{}".format(day)).write_text(day + "\n")
+        stage(str(log), "-%Y%m%d")
+
+        archive = tmp_path / "app.log-20261018"
+        archive.write_text("")
+
+        assert finish(str(log), "-%Y%m%d") == str(archive)
+        assert archive.read_text() == "line 1\nline 2\n"
+        assert (tmp_path / "app.log-20261016").read_text() == "20261016\n"
+        assert (tmp_path / "app.log-20261017").read_text() == "20261017\n"
+
+    def test_unknown_archive(self, log, tmp_path):
+        """Test nothing is overwritten when the new archive is not named as expected."""
+        old = tmp_path / "app.log.1"
+        old.write_text("line 0\n")
+        stage(str(log))
+
+        # a dateext set in logrotate.conf names the archive with the date
+        (tmp_path / "app.log-20261018").write_text("")
+
+        assert finish(str(log)) is None
+        assert old.read_text() == "line 0\n"
+        assert (tmp_path / ("app.log" + STAGED_SUFFIX)).read_text() == "line 1\nline 2\n"
+
+    def test_unfinished_rotation(self, log, tmp_path):
+        """Test a copy left by an unfinished rotation is not overwritten."""
+        staged = tmp_path / ("app.log" + STAGED_SUFFIX)
+        staged.write_text("line 0\n")
+
+        assert stage(str(log)) is None
+        assert log.read_text() == "line 1\nline 2\n"
+        assert staged.read_text() == "line 0\n"
+
+    @pytest.mark.parametrize(
+        ("unsupported", "method"),
+        [
+            (["ioctl"], "copy_file_range"),
+            (["ioctl", "copy_file_range"], "sendfile"),
+        ],
+    )
+    def test_fallback(self, log, tmp_path, mocker, unsupported, method):
+        """Test the copy falls back when the filesystem does not support a method."""
+        error = OSError(errno.EOPNOTSUPP, "not supported")
+        mocker.patch("lib_copytruncate.fcntl.ioctl", side_effect=error)
+        if "copy_file_range" in unsupported:
+            mocker.patch("lib_copytruncate.os.copy_file_range", side_effect=error, create=True)
+        copy = tmp_path / "copy.log"
+
+        assert clone(str(log), str(copy)) == method
+        assert copy.read_text() == log.read_text()
+
+    def test_failure_keeps_log(self, log, mocker):
+        """Test logrotate makes its own copy if the helper cannot copy the log."""
+        mocker.patch("lib_copytruncate.clone", side_effect=OSError(errno.ENOSPC, "full"))
+
+        assert lib_copytruncate.main(["stage", str(log)]) == 0
+        assert log.read_text() == "line 1\nline 2\n"
@@ -0,0 +1,116 @@
+"""Dateext conversion tests."""
+
+import os
+import time
+
+import pytest
+from lib_dateext import dateformat, migrate_archives, needs_dateext
+from lib_parser import parse_config
+
+DAY = 86400
+
+
+def block_of(content):
+    """Return the first block of content."""
+    return parse_config(content).blocks[0]
+
+
+class TestDateext:
+    """Dateext policy tests."""
+
+    @pytest.mark.parametrize(
+        ("content", "expected"),
+        [
+            ("/var/log/a.log {\n  daily\n}\n", "-%Y%m%d"),
+            ("/var/log/a.log {\n  hourly\n}\n", "-%Y%m%d%H"),
+            ("/var/log/a.log {\n  daily\n  maxsize 100M\n}\n", "-%Y%m%d-%s"),
+        ],
+    )
+    def test_dateformat(self, content, expected):
+        """Test archives of blocks rotating several times a day get unique names."""
+        assert dateformat(block_of(content)) == expected
+
+    @pytest.mark.parametrize(
+        ("content", "count", "expected"),
+        [
+            ("/var/log/a.log {\n  daily\n}\n", 365, True),
+            ("/var/log/a.log {\n  daily\n}\n", 30, False),
+            ("/var/log/a.log {\n  daily\n  nodateext\n}\n", 365, False),
+            ("/var/log/a.log {\n  daily\n  olddir /var/log/old\n}\n", 365, False),
+        ],
+    )
+    def test_needs_dateext(self, content, count, expected):
+        """Test only blocks above the threshold and without a choice of their own convert."""
+        assert needs_dateext(block_of(content), count, 100) is expected
+
+    def test_disabled(self):
+        """Test a threshold of 0 disables the conversion."""
+        assert not needs_dateext(block_of("/var/log/a.log {\n  daily\n}\n"), 365, 0)
+
+    def test_migrate_archives(self, tmp_path):
+        """Test numbered archives are renamed after the day they were rotated."""
+        for name in ("app.log", "app.log.1", "app.log.2.gz", "app.log.3.gz", "other.log.1"):
+            (tmp_path / name).write_text(name)
+        now = time.time()
+        for number in (1, 2, 3):
+            path = str(tmp_path / "app.log.{}{}".format(number, ".gz" if number > 1 else ""))
+            os.utime(path, (now - number * DAY, now - number * DAY))
+        # the same day as .3.gz
+        os.utime(str(tmp_path / "app.log.3.gz"), (now - 2 * DAY, now - 2 * DAY))
+
+        block = block_of("{}/app.log {{\n  daily\n}}\n".format(tmp_path))
+        renamed, skipped = migrate_archives(block, "-%Y%m%d")
+
+        def dated(days, suffix=""):
+            date = time.strftime("-%Y%m%d", time.localtime(now - days * DAY))
+            return str(tmp_path / "app.log{}{}".format(date, suffix))
+
+        assert renamed == [
+            (str(tmp_path / "app.log.1"), dated(1)),
+            (str(tmp_path / "app.log.2.gz"), dated(2, ".gz")),
+        ]
+        assert skipped == [(str(tmp_path / "app.log.3.gz"), dated(2, ".gz"))]
+        assert (tmp_path / "other.log.1").exists()
+        assert (tmp_path / "app.log").exists()
+
+
+class TestDateextConversion:
+    """Dateext conversion of the logrotate files tests."""
+
+    def test_modify_configs(self, logrotate_helper, logrotate_dir, tmp_path):
+        """Test high rotate counts switch to dateext and archives are renamed once."""
+        log_dir = tmp_path / "log"
+        log_dir.mkdir()
+        (log_dir / "app.log").write_text("")
+        (log_dir / "app.log.1").write_text("")
+        (logrotate_dir / "app").write_text("{}/app.log {{\n  daily\n}}\n".format(log_dir))
+        (logrotate_dir / "weekly").write_text("/var/log/weekly.log {\n  weekly\n}\n")
+        logrotate_helper.retention = 365
+        logrotate_helper.dateext_threshold = 100
+
+        logrotate_helper.modify_configs()
+
+        content = (logrotate_dir / "app").read_text()
+        assert "    rotate 365\n    dateext\n    dateformat -%Y%m%d\n" in content
+        assert "dateext" not in (logrotate_dir / "weekly").read_text()
+        assert sorted(os.listdir(str(log_dir))) == [
+            "app.log",
+            "app.log" + time.strftime("-%Y%m%d"),
+        ]
+
+    def test_repeated_dateformat(self, logrotate_helper, logrotate_dir, tmp_path):
+        """Test the archives of a block with two dateformat lines are named after the last."""
+        log_dir = tmp_path / "log"
+        log_dir.mkdir()
+        (log_dir / "app.log").write_text("")
+        (log_dir / "app.log.1").write_text("")
+        (logrotate_dir / "app").write_text(
+            "{}/app.log {{\n  daily\n  dateformat -%Y\n  dateformat -%Y%m\n}}\n".format(log_dir)
+        )
+        logrotate_helper.retention = 365
+        logrotate_helper.dateext_threshold = 100
+
+        logrotate_helper.modify_configs()
+
+        assert "    dateext\n" in (logrotate_dir / "app").read_text()
+        assert sorted(os.listdir(str(log_dir))) == ["app.log", "app.log" + time.strftime("-%Y%m")]
@@ -0,0 +1,85 @@
+"""File I/O helper tests."""
+
+import os
+
+import lib_fileio
+import pytest
+from lib_fileio import TMP_SUFFIX, WriteBatch, replace_file
+
+
+class TestReplaceFile:
+    """Atomic file replacement tests."""
+
+    def test_new_file(self, tmp_path):
+        """Test a new file is created with the given mode."""
+        path = tmp_path / "charm-logrotate"
+
+        assert replace_file(str(path), "#!/bin/bash\n", mode=0o755) is True
+
+        assert path.read_text() == "#!/bin/bash\n"
+        assert path.stat().st_mode & 0o7777 == 0o755
+
+    def test_default_mode(self, tmp_path):
+        """Test a new file is readable by all, and an existing file keeps its mode."""
+        path = tmp_path / "status.json"
+
+        replace_file(str(path), "{}")
+        assert path.stat().st_mode & 0o7777 == 0o644
+
+        path.chmod(0o600)
+        replace_file(str(path), "[]")
+        assert path.read_text() == "[]"
+        assert path.stat().st_mode & 0o7777 == 0o600
+
+    def test_temporary_file(self, tmp_path, mocker):
+        """Test the temporary file has a name logrotate skips, and is removed on failure."""
+        mocker.patch("lib_fileio.os.replace", side_effect=OSError("broken"))
+        mkstemp = mocker.spy(lib_fileio.tempfile, "mkstemp")
+
+        with pytest.raises(OSError):
+            replace_file(str(tmp_path / "apt"), "rotate 30\n")
+
+        _, tmp_name = mkstemp.spy_return
+        assert os.path.basename(tmp_name).startswith(".apt")
+        assert tmp_name.endswith(TMP_SUFFIX)
+        assert not os.path.exists(tmp_name)
+
+    def test_identical_content(self, tmp_path, mocker):
+        """Test a file with the same content is not written."""
+        path = tmp_path / "apt"
+        path.write_text("rotate 30\n")
+        mtime = path.stat().st_mtime_ns
+        mock_sync = mocker.patch("lib_fileio.sync_directory")
+
+        assert replace_file(str(path), "rotate 30\n") is False
+
+        assert path.stat().st_mtime_ns == mtime
+        mock_sync.assert_not_called()
+
+    def test_attributes_kept(self, tmp_path):
+        """Test the replaced file keeps its inode attributes."""
+        path = tmp_path / "apt"
+        path.write_text("rotate 12\n")
+        path.chmod(0o640)
+        try:
+            os.setxattr(str(path), "user.origin", b"package")
+        except OSError:
+            pytest.skip("extended attributes not supported")
+
+        replace_file(str(path), "rotate 30\n")
+
+        assert path.read_text() == "rotate 30\n"
+        assert path.stat().st_mode & 0o7777 == 0o640
+        assert os.getxattr(str(path), "user.origin") == b"package"
+        assert not list(tmp_path.glob(".apt*"))
+
+    def test_batch(self, tmp_path, mocker):
+        """Test the directory is synced once for all the files of a batch."""
+        mock_sync = mocker.patch("lib_fileio.sync_directory")
+
+        with WriteBatch() as batch:
+            for name in ("apt", "dpkg", "syslog"):
+                replace_file(str(tmp_path / name), name, batch=batch)
+            mock_sync.assert_not_called()
+
+        mock_sync.assert_called_once_with(str(tmp_path))
@@ -0,0 +1,107 @@
+"""Glob expansion cost tests."""
+
+import os
+
+import pytest
+from lib_globs import GlobWalker, check_globs, flagged, glob_costs
+
+
+@pytest.fixture
+def log_tree(tmp_path):
+    """Create the logs of services, each in a logs directory of its own."""
+    root = tmp_path / "srv"
+    for service in ("api", "web", ".cache"):
+        (root / service / "logs").mkdir(parents=True)
+        (root / service / "logs" / "app.log").write_text("")
+    (root / "web" / "logs" / "access.log").write_text("")
+    (root / "README").write_text("")
+    return root
+
+
+class TestGlobWalker:
+    """Pattern expansion tests."""
+
+    @pytest.mark.parametrize(
+        ("pattern", "matches", "directories"),
+        [
+            (
+                "{root}/*/logs/*.log",
+                ["api/logs/app.log", "web/logs/access.log", "web/logs/app.log"],
+                3,
+            ),
+            (
+                "{root}/*/logs/**",
+                ["api/logs/app.log", "web/logs/access.log", "web/logs/app.log"],
+                3,
+            ),
+            ("{root}/.*/logs/app.log", [".cache/logs/app.log"], 1),
+            ("{root}/*/logs/app.log", ["api/logs/app.log", "web/logs/app.log"], 1),
+            ("{root}/web/logs/app.log", ["web/logs/app.log"], 0),
+            ("{root}/*/missing/*.log", [], 3),
+        ],
+    )
+    def test_expand(self, log_tree, pattern, matches, directories):
+        """Test patterns expand like glob(3), hidden directories and ** included."""
+        paths, listed, _ = GlobWalker().expand(pattern.format(root=log_tree))
+
+        assert paths == [str(log_tree / match) for match in matches]
+        assert listed == directories
+
+    def test_listings_cached(self, log_tree, mocker):
+        """Test each directory is listed once, but counted for every pattern."""
+        walker = GlobWalker()
+        listing = mocker.spy(walker, "listing")
+        mock_scandir = mocker.patch("lib_globs.os.scandir", wraps=os.scandir)
+
+        for _ in range(2):
+            assert walker.expand("{}/*/logs/*.log".format(log_tree))[1] == 3
+
+        assert listing.call_count == 6
+        assert mock_scandir.call_count == 3
+
+
+class TestGlobCosts:
+    """Glob cost report tests."""
+
+    def test_flags(self, log_tree, logrotate_dir):
+        """Test patterns matching nothing or listing too many directories are flagged."""
+        (logrotate_dir / "srv").write_text(
+            "{root}/*/logs/*.log {{\n    daily\n}}\n\n"
+            "{root}/*/gone/*.log {root}/web/logs/app.log {{\n    missingok\n}}\n".format(
+                root=log_tree
+            )
+        )
+        config_path = str(logrotate_dir / "srv")
+
+        blocks = glob_costs([config_path], threshold=2)
+
+        assert [
+            (block["matches"], block["directories"], block["missingok"]) for block in blocks
+        ] == [
+            (3, 3, False),
+            (1, 3, True),
+        ]
+        assert flagged(blocks) == [
+            (config_path, "{}/*/logs/*.log".format(log_tree), ["costly"]),
+            (config_path, "{}/*/gone/*.log".format(log_tree), ["no-match", "costly"]),
+        ]
+        assert flagged(glob_costs([config_path], threshold=0)) == [
+            (config_path, "{}/*/gone/*.log".format(log_tree), ["no-match"]),
+        ]
+
+    def test_periodic_check(self, log_tree, logrotate_dir, metrics_dir, tmp_path):
+        """Test the check only runs again once due or with another threshold."""
+        (logrotate_dir / "srv").write_text("{}/*/gone/*.log {{\n}}\n".format(log_tree))
+        (logrotate_dir / ".srv.tmp~").write_text("{}/*/tmp/*.log {{\n}}\n".format(log_tree))
+        metrics_dir.mkdir()
+        check = str(tmp_path / "state" / "glob-check.json")
+
+        assert check_globs(100, check) == [
+            (str(logrotate_dir / "srv"), "{}/*/gone/*.log".format(log_tree), ["no-match"])
+        ]
+        assert check_globs(100, check) is None
+        assert check_globs(10, check) is not None
+        assert check_globs(10, check, interval=0) is not None
+        metrics = (metrics_dir / "charm-logrotate-glob_check.prom").read_text()
+        assert 'charm_logrotate_globs_no_match{job="glob_check"} 1\n' in metrics
+        assert 'charm_logrotate_globs_costly{job="glob_check"} 0\n' in metrics
@@ -0,0 +1,37 @@
+"""Import time tests."""
+
+import os
+import subprocess
+import sys
+
+import lib_logrotate
+import pytest
+
+LIB_DIR = os.path.dirname(os.path.abspath(lib_logrotate.__file__))
+# Modules only some code paths need, imported on first use
+DEFERRED_MODULES = ("charmhelpers.core.hookenv", "difflib", "concurrent.futures")
+
+
+def imported_modules(module):
+    """Import module in a fresh interpreter and return the names of the modules loaded."""
+    code = "import sys, {}; print('\\n'.join(sys.modules))".format(module)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=dict(os.environ, PYTHONPATH=LIB_DIR),
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return set(result.stdout.split())
+
+
+class TestImportTime:
+    """Import time of the helper modules tests."""
+
+    @pytest.mark.parametrize("module", ["lib_logrotate", "lib_cron"])
+    def test_deferred_imports(self, module):
+        """Test the helpers import without the modules they defer."""
+        modules = imported_modules(module)
+
+        assert module in modules
+        assert not modules & set(DEFERRED_MODULES)
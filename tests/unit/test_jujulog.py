@@ -0,0 +1,22 @@
+"""Juju log forwarding tests."""
+
+import logging
+
+from lib_jujulog import JujuLogHandler, setup_juju_logging
+
+
+def test_forwarded(root_logger, mocker):
+    """Test the records of the helpers reach juju-log at their level, once."""
+    mock_log = mocker.patch("charmhelpers.core.hookenv.log")
+
+    setup_juju_logging()
+    setup_juju_logging()
+    logging.getLogger("lib_cron").info("Executing cron job.")
+    logging.getLogger("lib_logrotate").error("Error updating %s: %s", "/etc/a", "broken")
+    logging.getLogger("lib_cron").debug("Not forwarded.")
+
+    assert sum(isinstance(handler, JujuLogHandler) for handler in root_logger.handlers) == 1
+    assert mock_log.call_args_list == [
+        mocker.call("Executing cron job.", level="INFO"),
+        mocker.call("Error updating /etc/a: broken", level="ERROR"),
+    ]
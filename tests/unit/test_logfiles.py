@@ -0,0 +1,113 @@
+"""Log files index and usage tests."""
+
+import os
+
+import pytest
+from lib_logfiles import LogIndex, LogScanner, log_usage
+
+OLD = 1000000000
+
+
+def age(path):
+    """Make the mtime of path old enough for its listing to be cached."""
+    os.utime(str(path), (OLD, OLD))
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    """Log directory fixture."""
+    path = tmp_path / "log"
+    path.mkdir()
+    return path
+
+
+class TestLogIndex:
+    """Log index tests."""
+
+    def test_listing_cached(self, log_dir, tmp_path, mocker, write_log):
+        """Test a directory is listed again only when its mtime changes."""
+        write_log(log_dir / "app.log", 10)
+        age(log_dir)
+        index = LogIndex(str(tmp_path / "index.json"))
+
+        files, rotated = index.listing(str(log_dir))
+        assert files == {"app.log": [10, os.stat(str(log_dir)).st_dev]}
+        assert rotated == {}
+        index.save()
+
+        reloaded = LogIndex(str(tmp_path / "index.json"))
+        reloaded.load()
+        mock_scandir = mocker.patch("lib_logfiles.os.scandir")
+        assert list(reloaded.listing(str(log_dir))[0]) == ["app.log"]
+        mock_scandir.assert_not_called()
+        assert not reloaded.dirty
+
+        mocker.stopall()
+        write_log(log_dir / "app.log.1", 5)
+        files, rotated = reloaded.listing(str(log_dir))
+        assert sorted(files) == ["app.log", "app.log.1"]
+        assert rotated == {"app.log": [5]}
+
+    def test_recent_listing_not_cached(self, log_dir, tmp_path, write_log):
+        """Test a directory modified within the mtime granularity is not cached."""
+        write_log(log_dir / "app.log", 10)
+        index = LogIndex(str(tmp_path / "index.json"))
+
+        index.listing(str(log_dir))
+
+        assert str(log_dir) not in index.directories
+
+    def test_live_log_size(self, log_dir, tmp_path, write_log):
+        """Test live logs growing in place are stat'ed again."""
+        write_log(log_dir / "app.log", 10)
+        age(log_dir)
+        index = LogIndex(str(tmp_path / "index.json"))
+        LogScanner(index).find(str(log_dir / "app.log"))
+
+        write_log(log_dir / "app.log", 50)
+        age(log_dir)
+        (log,) = LogScanner(index).find(str(log_dir / "app.log"))
+
+        assert log.size == 50
+
+    def test_block_paths_cached(self, tmp_path, mocker):
+        """Test unchanged logrotate files are not parsed again."""
+        config_path = tmp_path / "apt"
+        config_path.write_text("/var/log/apt/*.log /var/log/apt.log {\n  daily\n}\n")
+        age(config_path)
+        index = LogIndex(str(tmp_path / "index.json"))
+        assert index.block_paths(str(config_path)) == [["/var/log/apt/*.log", "/var/log/apt.log"]]
+
+        mock_parse_config = mocker.patch("lib_logfiles.parse_config")
+        assert index.block_paths(str(config_path)) == [["/var/log/apt/*.log", "/var/log/apt.log"]]
+        mock_parse_config.assert_not_called()
+
+        index.prune([])
+        assert index.configs == {}
+
+
+class TestLogUsage:
+    """Log usage report tests."""
+
+    def test_log_usage(self, log_dir, tmp_path, write_log):
+        """Test the largest logs of every logrotate file are reported."""
+        config_dir = tmp_path / "logrotate.d"
+        config_dir.mkdir()
+        write_log(log_dir / "a.log", 10)
+        write_log(log_dir / "a.log.1.gz", 100)
+        write_log(log_dir / "b.log", 50)
+        write_log(log_dir / "c.log", 500)
+        (config_dir / "ab").write_text(
+            "{0}/a.log {0}/b.log {{\n  daily\n}}\n{0}/missing.log {{\n  daily\n}}\n".format(
+                log_dir
+            )
+        )
+        (config_dir / "c").write_text("{}/c.log {{\n  daily\n}}\n".format(log_dir))
+
+        usage = log_usage(str(config_dir), top=1, index_path=str(tmp_path / "index.json"))
+
+        assert usage == {
+            "c": {"total": 500, "logs": [[str(log_dir / "c.log"), 500]]},
+            "ab": {"total": 160, "logs": [[str(log_dir / "a.log"), 110]]},
+        }
+        assert list(usage) == ["c", "ab"]
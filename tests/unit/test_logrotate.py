@@ -210,7 +210,7 @@ class TestLogrotateHelper:
     )
     def test_override_config_option(self, test_override, input_contents, expected_contents):
         """Test override config option."""
-        with mock.patch("lib_logrotate.hookenv.config") as mock_config:
+        with mock.patch("charmhelpers.core.hookenv.config") as mock_config:
             mock_config.return_value = "[]"
             file_path = "/etc/logrotate.d/apt"
             logrotate_helper = LogrotateHelper()
@@ -229,7 +229,9 @@ class TestLogrotateHelper:
             (False, "monthly", 365, "random,06:00,07:00"),
         ],
     )
-    def test_read_config(self, logrotate, status, frequency, retention, cron_schedule, mocker):
+    def test_read_config(
+        self, logrotate, status, frequency, retention, cron_schedule, tmp_path, mocker
+    ):
         """Test read_config method."""
         logrotate_crontab_config_content = dedent(
             f"""\
@@ -239,11 +241,9 @@ class TestLogrotateHelper:
             {cron_schedule}
             """
         )
-        mocker.patch(
-            "lib_logrotate.open",
-            mock.mock_open(read_data=logrotate_crontab_config_content),
-        )
-        mocker.patch("lib_logrotate.os.path.isfile", return_value=True)
+        config_path = tmp_path / "logrotate_cronjob_config"
+        config_path.write_text(logrotate_crontab_config_content)
+        mocker.patch("lib_snapshot.SNAPSHOT_FILE", str(config_path))
 
         logrotate.read_config(logrotate)
 
@@ -373,6 +373,41 @@ class TestCronHelper:
         with pytest.raises(ValueError):
             cron_config.get_random_time(start_time, end_time)
 
+    @pytest.mark.parametrize(
+        ("position", "expected"),
+        [(0.0, ("6", "0")), (0.5, ("6", "30")), (0.999, ("7", "0")), (0.25, ("6", "15"))],
+    )
+    def test_get_spread_time(self, cron, position, expected):
+        """Test the position of the unit is mapped to a minute of the range."""
+        assert cron.get_spread_time("06:00", "07:00", position) == expected
+
+    def test_unit_position(self, cron, mocker):
+        """Test consecutive units get stable, evenly spaced slots."""
+        mocker.patch("charmhelpers.core.hookenv.model_uuid", return_value="model-uuid")
+        mock_local_unit = mocker.patch("charmhelpers.core.hookenv.local_unit")
+        slots = []
+        for number in range(20):
+            mock_local_unit.return_value = "logrotated/{}".format(number)
+            position = cron.unit_position()
+            assert cron.unit_position() == position
+            hour, minute = cron.get_spread_time("01:00", "02:59", position)
+            slots.append(int(hour) * 60 + int(minute))
+
+        slots.sort()
+        # 20 units in a 120 minute range are at least 3 minutes apart
+        assert min(later - earlier for earlier, later in zip(slots, slots[1:])) >= 3
+
+    def test_update_cron_daily_schedule_spread(self, cron, mocker):
+        """Test the spread schedule writes the slot of the unit to the crontab."""
+        mock_write_to_crontab = mocker.patch.object(cron, "write_to_crontab")
+        mocker.patch.object(cron, "unit_position", return_value=0.5)
+        cron_config = cron()
+        cron_config.cron_daily_schedule = "spread,02:00,04:00"
+
+        assert cron_config.validate_cron_daily_schedule_conf()
+        assert cron_config.update_cron_daily_schedule() == "0 3"
+        mock_write_to_crontab.assert_called_once_with("0 3")
+
     @pytest.mark.parametrize(
         "cron_daily_timestamp", ["00 08", "25 6", "40 18", "5 7", "20 4", "5 35"]
     )
@@ -402,11 +437,11 @@ class TestCronHelper:
             """  # noqa
         )
         mock_handle.read.return_value = default_crontab_contents
+        mock_replace_file = mocker.patch("lib_cron.replace_file")
         cron_config.write_to_crontab(cron_daily_timestamp)
 
-        mock_open.assert_any_call("/etc/crontab", "r")
-        mock_open.assert_any_call("/etc/crontab", "w")
-        mock_handle.write.assert_called_with(updated_crontab_contents)
+        mock_open.assert_called_once_with("/etc/crontab", "r")
+        mock_replace_file.assert_called_once_with("/etc/crontab", updated_crontab_contents)
 
     @pytest.mark.parametrize(
         ("cron_schedule"),
@@ -417,6 +452,7 @@ class TestCronHelper:
             ("random,08:40,09:20"),
             ("set,8:00"),
             ("set,12:10"),
+            ("spread,22:00,23:30"),
             ("unset"),
         ],
     )
@@ -440,6 +476,7 @@ class TestCronHelper:
             ("random,07:00,39:00"),
             ("random,09:20,08:40"),
             ("random,08:00,08:00"),
+            ("spread,09:20,08:40"),
             ("set,28:00"),
             ("set,02:80"),
             ("invalid_setting"),
@@ -462,7 +499,6 @@ class TestCronHelper:
         mock_charm_dir = "/mock/unit-logrotated-0/charm"
         mock_exists = mocker.patch("lib_cron.os.path.exists", return_value=True)
         mock_remove = mocker.patch("lib_cron.os.remove")
-        mock_chmod = mocker.patch("lib_cron.os.chmod")
         mocker.patch(
             "lib_cron.os.path.realpath",
             return_value=os.path.join(mock_charm_dir, "lib/lib_cron.py"),
@@ -470,14 +506,14 @@ class TestCronHelper:
         # has_juju_version is used to test for juju3,
         # so keep it false here to verify the original juju2 behaviour.
         mocker.patch(
-            "lib_cron.hookenv.has_juju_version",
+            "charmhelpers.core.hookenv.has_juju_version",
             return_value=False,
         )
         mocker.patch("lib_cron.os.getcwd", return_value=mock_charm_dir)
-        mock_open = mocker.patch("lib_cron.open")
-        mock_handle = mock_open.return_value.__enter__.return_value
+        mock_replace_file = mocker.patch("lib_cron.replace_file")
         mock_write_to_crontab = mocker.Mock()
         mocker.patch.object(cron, "write_to_crontab", new=mock_write_to_crontab)
+        mocker.patch.object(cron, "update_cron_daily_wrapper")
         expected_files_to_be_removed = [
             "/etc/cron.hourly/charm-logrotate",
             "/etc/cron.daily/charm-logrotate",
@@ -497,23 +533,22 @@ class TestCronHelper:
         mock_remove.assert_has_calls(
             [mock.call(file) for file in expected_files_to_be_removed], any_order=True
         )
-        mock_open.assert_called_once_with("/etc/cron.weekly/charm-logrotate", "w")
-        mock_handle.write.assert_called_once_with(
+        mock_replace_file.assert_called_once_with(
+            "/etc/cron.weekly/charm-logrotate",
             dedent(
                 """\
                 #!/bin/bash
                 /usr/bin/sudo /usr/bin/juju-run unit-logrotated/0 "/mock/unit-logrotated-0/.venv/bin/python3 /mock/unit-logrotated-0/charm/lib/lib_cron.py"
                 """
-            )
+            ),
+            mode=0o755,
         )
-        mock_chmod.assert_called_once_with("/etc/cron.weekly/charm-logrotate", 0o755)
 
     def test_install_cronjob_juju3(self, cron, mock_local_unit, mocker):
         """Test install cronjob method under juju3."""
         mock_charm_dir = "/mock/unit-logrotated-0/charm"
         mock_exists = mocker.patch("lib_cron.os.path.exists", return_value=True)
         mock_remove = mocker.patch("lib_cron.os.remove")
-        mock_chmod = mocker.patch("lib_cron.os.chmod")
         mocker.patch(
             "lib_cron.os.path.realpath",
             return_value=os.path.join(mock_charm_dir, "lib/lib_cron.py"),
@@ -521,14 +556,14 @@ class TestCronHelper:
         # has_juju_version is used to test for juju3.
         # Set it True here so it thinks it's running under juju3.
         mocker.patch(
-            "lib_cron.hookenv.has_juju_version",
+            "charmhelpers.core.hookenv.has_juju_version",
             return_value=True,
         )
         mocker.patch("lib_cron.os.getcwd", return_value=mock_charm_dir)
-        mock_open = mocker.patch("lib_cron.open")
-        mock_handle = mock_open.return_value.__enter__.return_value
+        mock_replace_file = mocker.patch("lib_cron.replace_file")
         mock_write_to_crontab = mocker.Mock()
         mocker.patch.object(cron, "write_to_crontab", new=mock_write_to_crontab)
+        mocker.patch.object(cron, "update_cron_daily_wrapper")
         expected_files_to_be_removed = [
             "/etc/cron.hourly/charm-logrotate",
             "/etc/cron.daily/charm-logrotate",
@@ -548,17 +583,17 @@ class TestCronHelper:
         mock_remove.assert_has_calls(
             [mock.call(file) for file in expected_files_to_be_removed], any_order=True
         )
-        mock_open.assert_called_once_with("/etc/cron.weekly/charm-logrotate", "w")
         # should be juju-exec under juju3
-        mock_handle.write.assert_called_once_with(
+        mock_replace_file.assert_called_once_with(
+            "/etc/cron.weekly/charm-logrotate",
             dedent(
                 """\
                 #!/bin/bash
                 /usr/bin/sudo /usr/bin/juju-exec unit-logrotated/0 "/mock/unit-logrotated-0/.venv/bin/python3 /mock/unit-logrotated-0/charm/lib/lib_cron.py"
                 """
-            )
+            ),
+            mode=0o755,
         )
-        mock_chmod.assert_called_once_with("/etc/cron.weekly/charm-logrotate", 0o755)
 
     def test_install_cronjob_removes_etc_config_when_cronjob_disabled(self, cron, mocker):
         """Test that all cronjob related files created upon cronjobs being disabled."""
@@ -583,6 +618,33 @@ class TestCronHelper:
             [mock.call(file) for file in expected_files_to_be_removed], any_order=True
         )
 
+    @pytest.mark.parametrize(
+        ("changed", "refresh_job", "cron_daily"),
+        [
+            ({"update-cron-daily-schedule"}, False, True),
+            ({"logrotate-cronjob-frequency"}, True, False),
+            ({"logrotate-retention", "override"}, False, False),
+            (None, True, True),
+        ],
+    )
+    def test_install_cronjob_changed(self, cron, changed, refresh_job, cron_daily, mocker):
+        """Test only the cron files depending on the changed options are rewritten."""
+        mock_cleanup = mocker.patch.object(cron, "cleanup_cronjob_files")
+        mock_write_cronjob_file = mocker.patch.object(cron, "write_cronjob_file")
+        mock_update_schedule = mocker.patch.object(cron, "update_cron_daily_schedule")
+        mocker.patch.object(cron, "update_cron_daily_wrapper")
+        mocker.patch("lib_timer.systemctl")
+
+        cron_config = cron()
+        cron_config.cronjob_enabled = True
+        cron_config.cronjob_frequency = 0
+        cron_config.cron_daily_schedule = "set,06:30"
+        cron_config.install_cronjob(changed)
+
+        assert mock_cleanup.called is refresh_job
+        assert mock_write_cronjob_file.called is refresh_job
+        assert mock_update_schedule.called is cron_daily
+
     @pytest.mark.parametrize(
         ("status", "frequency", "retention", "cron_schedule"),
         [
@@ -592,7 +654,9 @@ class TestCronHelper:
             (False, "monthly", "365", "random,06:00,07:00"),
         ],
     )
-    def test_cron_read_config(self, cron, status, frequency, retention, cron_schedule, mocker):
+    def test_cron_read_config(
+        self, cron, status, frequency, retention, cron_schedule, tmp_path, mocker
+    ):
         """Test cronjob read_config method."""
         logrotate_crontab_config_content = dedent(
             f"""\
@@ -602,10 +666,11 @@ class TestCronHelper:
             {cron_schedule}
             """
         )
-        mocker.patch("lib_cron.open", mock.mock_open(read_data=logrotate_crontab_config_content))
-        mocker.patch("lib_cron.os.path.isfile", return_value=True)
+        config_path = tmp_path / "logrotate_cronjob_config"
+        config_path.write_text(logrotate_crontab_config_content)
 
         cron_config = cron()
+        cron_config.cronjob_etc_config = str(config_path)
         cron_config.cronjob_check_paths = ["hourly", "daily", "weekly", "monthly"]
         cron_config.read_config()
 
@@ -0,0 +1,194 @@
+"""Unit tests for the config manifest."""
+
+import os
+from unittest import mock
+
+import lib_logrotate
+import pytest
+from lib_jujulog import setup_juju_logging
+from lib_manifest import ConfigManifest, content_hash
+
+
+class TestConfigManifest:
+    """Config manifest test class."""
+
+    def test_load_missing_manifest(self, tmp_path):
+        """Test a missing manifest is loaded as empty."""
+        manifest = ConfigManifest(str(tmp_path / "missing.json"))
+        manifest.load()
+        assert manifest.entries == {}
+
+    def test_load_corrupt_manifest(self, tmp_path):
+        """Test a corrupt manifest is loaded as empty."""
+        path = tmp_path / "manifest.json"
+        path.write_text("{not json")
+        manifest = ConfigManifest(str(path))
+        manifest.load()
+        assert manifest.entries == {}
+
+    def test_save_and_load(self, tmp_path):
+        """Test the manifest round-trips through disk."""
+        path = tmp_path / "state" / "manifest.json"
+        config = tmp_path / "apt"
+        config.write_text("content")
+        stat = os.stat(config)
+
+        manifest = ConfigManifest(str(path))
+        manifest.update(str(config), stat, content_hash("content"), "gen")
+        manifest.save()
+
+        loaded = ConfigManifest(str(path))
+        loaded.load()
+        assert loaded.is_fresh(str(config), stat, "gen")
+        assert not loaded.is_fresh(str(config), stat, "other-gen")
+        assert loaded.matches_content(str(config), content_hash("content"), "gen")
+
+    def test_prune(self, tmp_path):
+        """Test entries of removed files are dropped."""
+        config = tmp_path / "apt"
+        config.write_text("content")
+        manifest = ConfigManifest(str(tmp_path / "manifest.json"))
+        manifest.update("/gone", os.stat(config), "hash", "gen")
+        manifest.update(str(config), os.stat(config), "hash", "gen")
+        manifest.prune([str(config)])
+        assert list(manifest.entries) == [str(config)]
+
+
+class TestIncrementalModifyConfigs:
+    """Incremental modify_configs test class."""
+
+    def test_rendered_file_is_not_rewritten(self, logrotate_helper, logrotate_dir):
+        """Test a second run neither reads nor writes unchanged files."""
+        config = logrotate_dir / "apt"
+        config.write_text("/var/log/apt/history.log {\n  rotate 12\n  daily\n}\n")
+
+        logrotate_helper.modify_configs()
+        rendered = config.read_text()
+        assert "rotate 30" in rendered
+        mtime = os.stat(config).st_mtime_ns
+
+        with mock.patch("lib_logrotate.open") as mock_open:
+            logrotate_helper.modify_configs()
+        mock_open.assert_not_called()
+        assert os.stat(config).st_mtime_ns == mtime
+
+    def test_identical_output_is_not_written(self, logrotate_helper, logrotate_dir):
+        """Test a file already in rendered form is read but never written."""
+        config = logrotate_dir / "apt"
+        config.write_text(
+            "# Configuration file maintained by Juju. Local changes may be overwritten\n"
+            "/var/log/apt/history.log {\n  rotate 30\n  daily\n}\n"
+        )
+        mtime = os.stat(config).st_mtime_ns
+
+        logrotate_helper.modify_configs()
+
+        assert os.stat(config).st_mtime_ns == mtime
+
+    def test_settings_change_rerenders(self, logrotate_helper, logrotate_dir):
+        """Test a new retention invalidates the manifest entries."""
+        config = logrotate_dir / "apt"
+        config.write_text("/var/log/apt/history.log {\n  rotate 12\n  daily\n}\n")
+
+        logrotate_helper.modify_configs()
+        logrotate_helper.retention = 7
+        logrotate_helper.modify_configs()
+
+        assert "rotate 7" in config.read_text()
+
+    def test_render_version_rerenders(self, logrotate_helper, logrotate_dir, mocker):
+        """Test files rendered by another version of the charm are rendered again."""
+        config = logrotate_dir / "apt"
+        config.write_text("/var/log/apt/history.log {\n  rotate 12\n  daily\n}\n")
+        logrotate_helper.modify_configs()
+        mocker.patch("lib_logrotate.RENDER_VERSION", lib_logrotate.RENDER_VERSION + 1)
+        mock_modify = mocker.spy(logrotate_helper, "modify_content")
+
+        logrotate_helper.modify_configs()
+
+        mock_modify.assert_called_once()
+
+    def test_override_change_rerenders_covered_files(self, logrotate_helper, logrotate_dir):
+        """Test an override change only reads the files it covers."""
+        apt = logrotate_dir / "apt"
+        dpkg = logrotate_dir / "dpkg"
+        apt.write_text("/var/log/apt/history.log {\n  rotate 12\n  daily\n}\n")
+        dpkg.write_text("/var/log/dpkg.log {\n  rotate 12\n  daily\n}\n")
+        logrotate_helper.modify_configs()
+
+        logrotate_helper.override = [{"path": str(apt), "rotate": 3}]
+        logrotate_helper.override_files = logrotate_helper.get_override_files()
+        with mock.patch("lib_logrotate.open", side_effect=open) as mock_open:
+            logrotate_helper.modify_configs()
+
+        assert [call.args[0] for call in mock_open.call_args_list] == [str(apt)]
+        assert "rotate 3" in apt.read_text()
+
+    def test_changed_file_is_rerendered(self, logrotate_helper, logrotate_dir):
+        """Test a file modified by a package install is rendered again."""
+        config = logrotate_dir / "apt"
+        config.write_text("/var/log/apt/history.log {\n  rotate 12\n  daily\n}\n")
+
+        logrotate_helper.modify_configs()
+        config.write_text("/var/log/apt/term.log {\n  rotate 99\n  daily\n}\n")
+        logrotate_helper.modify_configs()
+
+        assert "/var/log/apt/term.log {\n  rotate 30\n" in config.read_text()
+
+    def test_dotfiles_are_skipped(self, logrotate_helper, logrotate_dir):
+        """Test the temporary files left by an interrupted write are not processed."""
+        leftover = logrotate_dir / ".apt1a2b3c.tmp~"
+        leftover.write_text("/var/log/apt.log {\n  rotate 12\n}\n")
+
+        logrotate_helper.modify_configs()
+
+        assert leftover.read_text() == "/var/log/apt.log {\n  rotate 12\n}\n"
+
+
+class TestParallelModifyConfigs:
+    """Worker pool modify_configs test class."""
+
+    def test_workers_process_all_files(self, logrotate_helper, logrotate_dir):
+        """Test every file is processed by the worker pool."""
+        for index in range(20):
+            (logrotate_dir / "conf{:02d}".format(index)).write_text(
+                "/var/log/{}.log {{\n  rotate 1\n  weekly\n}}\n".format(index)
+            )
+        logrotate_helper.workers = 4
+
+        logrotate_helper.modify_configs()
+
+        for index in range(20):
+            assert "rotate 4" in (logrotate_dir / "conf{:02d}".format(index)).read_text()
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_failure_does_not_abort(
+        self, logrotate_helper, logrotate_dir, root_logger, mocker, workers
+    ):
+        """Test a failing file is reported, in juju-log too, after the others are processed."""
+        for name in ("a", "b", "c", "d"):
+            (logrotate_dir / name).write_text("/var/log/{}.log {{\n  daily\n}}\n".format(name))
+        logrotate_helper.workers = workers
+        setup_juju_logging()
+        mock_log = mocker.patch("charmhelpers.core.hookenv.log")
+        modify_content = logrotate_helper.modify_content
+
+        def failing_modify_content(content, file_path, **kwargs):
+            if file_path.endswith(("/b", "/c")):
+                raise ValueError("broken")
+            return modify_content(content, file_path, **kwargs)
+
+        mocker.patch.object(logrotate_helper, "modify_content", failing_modify_content)
+
+        with pytest.raises(logrotate_helper.ConfigUpdateError) as err:
+            logrotate_helper.modify_configs()
+
+        assert str(err.value) == "Failed to update {}, {}".format(
+            logrotate_dir / "b", logrotate_dir / "c"
+        )
+        assert "rotate 30" in (logrotate_dir / "a").read_text()
+        assert "rotate 30" in (logrotate_dir / "d").read_text()
+        assert mock_log.call_args_list == [
+            mock.call("Error updating {}: broken".format(logrotate_dir / "b"), level="ERROR"),
+            mock.call("Error updating {}: broken".format(logrotate_dir / "c"), level="ERROR"),
+        ]
@@ -0,0 +1,138 @@
+"""Metrics tests."""
+
+import re
+
+import pytest
+from lib_metrics import RunMetrics
+
+
+def sample(content, name, labels='job="test"'):
+    """Return the value of the sample name in content."""
+    match = re.search(
+        r"^charm_logrotate_{}\{{{}\}} (\S+)$".format(name, re.escape(labels)),
+        content,
+        re.MULTILINE,
+    )
+    assert match, "sample {} not found".format(name)
+    return float(match.group(1))
+
+
+class TestRunMetrics:
+    """Run metrics tests."""
+
+    def test_render(self):
+        """Test counters and the file histogram are rendered."""
+        metrics = RunMetrics("test")
+        metrics.inc("files_scanned", 3)
+        metrics.inc("bytes_read", 120)
+        metrics.observe_file(0.0001)
+        metrics.observe_file(0.02)
+        metrics.observe_file(5)
+
+        content = metrics.render(last_success=1700000000)
+
+        assert "# TYPE charm_logrotate_file_duration_seconds histogram" in content
+        assert sample(content, "files_scanned") == 3
+        assert sample(content, "bytes_read") == 120
+        assert sample(content, "files_rewritten") == 0
+        assert sample(content, "last_success_timestamp_seconds") == 1700000000
+        bucket = 'job="test",le="{}"'
+        assert sample(content, "file_duration_seconds_bucket", bucket.format(0.0005)) == 1
+        assert sample(content, "file_duration_seconds_bucket", bucket.format(0.025)) == 2
+        assert sample(content, "file_duration_seconds_bucket", bucket.format(1.0)) == 2
+        assert sample(content, "file_duration_seconds_bucket", bucket.format("+Inf")) == 3
+        assert sample(content, "file_duration_seconds_count") == 3
+
+    def test_run_success(self, metrics_dir):
+        """Test a successful run saves its duration and success time."""
+        metrics_dir.mkdir()
+        metrics = RunMetrics("test")
+
+        with metrics.run():
+            metrics.inc("files_scanned")
+
+        content = (metrics_dir / "charm-logrotate-test.prom").read_text()
+        assert sample(content, "run_success") == 1
+        assert sample(content, "run_duration_seconds") >= 0
+        assert sample(content, "last_success_timestamp_seconds") > 0
+
+    def test_readable(self, metrics_dir):
+        """Test the metrics file is readable by the node exporter."""
+        metrics_dir.mkdir()
+        with RunMetrics("test").run():
+            pass
+
+        path = metrics_dir / "charm-logrotate-test.prom"
+        assert path.stat().st_mode & 0o7777 == 0o644
+
+    def test_run_failure_keeps_last_success(self, metrics_dir):
+        """Test a failed run keeps the time of the previous successful run."""
+        metrics_dir.mkdir()
+        with RunMetrics("test").run():
+            pass
+        path = metrics_dir / "charm-logrotate-test.prom"
+        last_success = sample(path.read_text(), "last_success_timestamp_seconds")
+
+        with pytest.raises(RuntimeError):
+            with RunMetrics("test").run():
+                raise RuntimeError("failed")
+
+        content = path.read_text()
+        assert sample(content, "run_success") == 0
+        assert sample(content, "last_success_timestamp_seconds") == last_success
+
+    def test_missing_directory(self, metrics_dir):
+        """Test nothing is saved when node-exporter is not installed."""
+        with RunMetrics("test").run():
+            pass
+
+        assert not metrics_dir.exists()
+
+    def test_disabled(self):
+        """Test nothing is saved when metrics are disabled."""
+        metrics = RunMetrics("test", directory="")
+
+        with metrics.run():
+            pass
+
+        assert metrics.path() is None
+
+
+class TestModifyConfigsMetrics:
+    """Metrics of the logrotate files update tests."""
+
+    def test_modify_configs_skipped(self, logrotate_helper, logrotate_dir, metrics_dir):
+        """Test files unchanged since the previous run are counted as skipped."""
+        metrics_dir.mkdir()
+        (logrotate_dir / "apt").write_text("/var/log/apt.log {\n  daily\n}\n")
+        (logrotate_dir / "dpkg").write_text("/var/log/dpkg.log {\n  weekly\n}\n")
+
+        logrotate_helper.modify_configs()
+        logrotate_helper.modify_configs()
+
+        labels = 'job="modify_configs"'
+        content = (metrics_dir / "charm-logrotate-modify_configs.prom").read_text()
+        assert sample(content, "run_success", labels) == 1
+        assert sample(content, "files_scanned", labels) == 2
+        assert sample(content, "files_skipped", labels) == 2
+        assert sample(content, "files_rewritten", labels) == 0
+        assert sample(content, "file_duration_seconds_count", labels) == 2
+
+    def test_modify_configs_first_run(self, logrotate_helper, logrotate_dir, metrics_dir):
+        """Test rewritten files, parse errors and override hits are counted."""
+        metrics_dir.mkdir()
+        (logrotate_dir / "apt").write_text("/var/log/apt.log {\n  daily\n}\n")
+        (logrotate_dir / "dpkg").write_text("/var/log/dpkg.log {\n  weekly\n")
+        logrotate_helper.override = [{"path": str(logrotate_dir / "dpkg"), "rotate": 2}]
+        logrotate_helper.override_files = logrotate_helper.get_override_files()
+
+        logrotate_helper.modify_configs()
+
+        labels = 'job="modify_configs"'
+        content = (metrics_dir / "charm-logrotate-modify_configs.prom").read_text()
+        assert sample(content, "files_scanned", labels) == 2
+        assert sample(content, "files_rewritten", labels) == 2
+        assert sample(content, "bytes_read", labels) > 0
+        assert sample(content, "bytes_written", labels) > 0
+        assert sample(content, "parse_errors", labels) == 1
+        assert sample(content, "override_hits", labels) == 1
@@ -0,0 +1,142 @@
+"""Overlapping log paths tests."""
+
+import pytest
+from lib_logfiles import LogIndex, LogScanner
+from lib_overlap import find_overlaps, load_report, status_message
+from lib_parser import DISABLED_MARKER, parse_config
+
+APP = """\
+/var/log/app/*.log {
+    daily
+}
+"""
+
+APP_COPY = """\
+/var/log/app/*.log {
+    weekly
+    rotate 4
+}
+
+/var/log/app/new/*.log /var/log/app/*.log {
+    daily
+}
+"""
+
+
+@pytest.fixture
+def overlapping(logrotate_dir):
+    """Package configs, the second claiming the logs of the first."""
+    (logrotate_dir / "app").write_text(APP)
+    (logrotate_dir / "app-copy").write_text(APP_COPY)
+    (logrotate_dir / "zz-unrelated").write_text("/var/log/other.log {\n    daily\n}\n")
+    return logrotate_dir
+
+
+class TestFindOverlaps:
+    """Overlap detection tests."""
+
+    def test_overlaps(self, overlapping, tmp_path):
+        """Test later blocks claiming paths of earlier files are reported."""
+        index = LogIndex(str(tmp_path / "index.json"))
+        config_paths = sorted(str(path) for path in overlapping.iterdir())
+
+        overlaps, redundant = find_overlaps(config_paths, index, LogScanner(index))
+
+        app, app_copy = str(overlapping / "app"), str(overlapping / "app-copy")
+        assert overlaps == [
+            {
+                "file": app_copy,
+                "block": block,
+                "owner": app,
+                "owner_block": 0,
+                "logs": ["/var/log/app/*.log"],
+            }
+            for block in (0, 1)
+        ]
+        # the second block also claims logs no earlier file does
+        assert redundant == {app_copy: {0: app}}
+
+    def test_logs_matched(self, logrotate_dir, tmp_path):
+        """Test a plain path matched by an earlier glob is claimed by it."""
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        (log_dir / "web.log").write_text("")
+        (logrotate_dir / "a-web").write_text("{}/*.log {{\n}}\n".format(log_dir))
+        (logrotate_dir / "b-web").write_text("{}/web.log {{\n}}\n".format(log_dir))
+        (logrotate_dir / "c-web").write_text("{}/w*.log {{\n}}\n".format(log_dir))
+        index = LogIndex(str(tmp_path / "index.json"))
+        config_paths = sorted(str(path) for path in logrotate_dir.iterdir())
+
+        overlaps, redundant = find_overlaps(config_paths, index, LogScanner(index))
+
+        assert [overlap["logs"] for overlap in overlaps] == [[str(log_dir / "web.log")]] * 2
+        # a different glob may match other logs later
+        assert list(redundant) == [str(logrotate_dir / "b-web")]
+
+
+class TestOverlapPolicy:
+    """Overlap policy tests."""
+
+    def test_report(self, logrotate_helper, overlapping):
+        """Test the report policy saves the overlaps without disabling blocks."""
+        logrotate_helper.modify_configs()
+
+        assert len(load_report()) == 2
+        assert DISABLED_MARKER not in (overlapping / "app-copy").read_text()
+        assert status_message() == (
+            "Unit is ready. 2 logrotate blocks in 1 files overlap, see log-overlaps."
+        )
+
+    def test_comment_and_restore(self, logrotate_helper, overlapping):
+        """Test redundant blocks are commented out, and restored with the report policy."""
+        logrotate_helper.overlap_policy = "comment"
+        logrotate_helper.modify_configs()
+
+        content = (overlapping / "app-copy").read_text()
+        first, second = parse_config(content).blocks
+        assert first.disabled == "overlaps with {}".format(overlapping / "app")
+        assert "\n# /var/log/app/*.log {\n#     weekly\n" in content
+        assert second.disabled is None
+        assert DISABLED_MARKER not in (overlapping / "app").read_text()
+
+        # detection sees the commented block, so the next run keeps it as is
+        logrotate_helper.modify_configs()
+        assert (overlapping / "app-copy").read_text() == content
+
+        logrotate_helper.overlap_policy = "report"
+        logrotate_helper.modify_configs()
+        content = (overlapping / "app-copy").read_text()
+        assert DISABLED_MARKER not in content
+        assert "\n/var/log/app/*.log {\n    weekly\n    rotate 4\n}" in content
+
+    def test_scan_skipped_when_unchanged(self, logrotate_helper, overlapping, mocker):
+        """Test the overlaps are only looked for again once a file changes."""
+        logrotate_helper.overlap_policy = "comment"
+        logrotate_helper.modify_configs()
+        content = (overlapping / "app-copy").read_text()
+        mock_find = mocker.spy(logrotate_helper, "find_overlaps")
+
+        logrotate_helper.modify_configs()
+        mock_find.assert_not_called()
+        assert (overlapping / "app-copy").read_text() == content
+        assert len(load_report()) == 2
+
+        (overlapping / "zz-unrelated").write_text("/var/log/app/*.log {\n    daily\n}\n")
+        logrotate_helper.modify_configs()
+        mock_find.assert_called_once()
+        assert len(load_report()) == 3
+
+    def test_invalid_policy(self, logrotate_helper, overlapping):
+        """Test an unknown policy is rejected."""
+        logrotate_helper.overlap_policy = "delete"
+
+        with pytest.raises(ValueError):
+            logrotate_helper.modify_configs()
+
+    def test_no_overlap_status(self, logrotate_helper, logrotate_dir):
+        """Test the status is unchanged when no blocks overlap."""
+        (logrotate_dir / "app").write_text(APP)
+        logrotate_helper.modify_configs()
+
+        assert load_report() == []
+        assert status_message() == "Unit is ready."
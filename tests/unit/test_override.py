@@ -0,0 +1,95 @@
+"""Unit tests for the override index."""
+
+import pytest
+from lib_override import OverrideIndex
+
+
+class TestOverrideIndex:
+    """Override index test class."""
+
+    def test_exact_path(self):
+        """Test exact paths are looked up directly."""
+        index = OverrideIndex([{"path": "/etc/logrotate.d/apt", "rotate": 5}, {}])
+        assert index.get("/etc/logrotate.d/apt") == {"path": "/etc/logrotate.d/apt", "rotate": 5}
+        assert "/etc/logrotate.d/dpkg" not in index
+        assert index.matchers == []
+
+    def test_last_exact_entry_wins(self):
+        """Test the last entry for the same path is used."""
+        index = OverrideIndex(
+            [
+                {"path": "/etc/logrotate.d/apt", "rotate": 5},
+                {"path": "/etc/logrotate.d/apt", "rotate": 7},
+            ]
+        )
+        assert index.get("/etc/logrotate.d/apt")["rotate"] == 7
+
+    @pytest.mark.parametrize(
+        "file_path, expected_rotate",
+        [
+            ("/etc/logrotate.d/apt", 1),
+            ("/etc/logrotate.d/apache2", 2),
+            ("/etc/logrotate.d/ceph-osd", 3),
+            ("/etc/logrotate.d/ceph", 4),
+            ("/etc/logrotate.d/dpkg", None),
+        ],
+    )
+    def test_precedence(self, file_path, expected_rotate):
+        """Test exact paths win over patterns, and patterns match in order."""
+        index = OverrideIndex(
+            [
+                {"path": "/etc/logrotate.d/a*", "rotate": 2},
+                {"regex": "/etc/logrotate.d/ceph-.+", "rotate": 3},
+                {"path": "/etc/logrotate.d/ceph*", "rotate": 4},
+                {"path": "/etc/logrotate.d/apt", "rotate": 1},
+            ]
+        )
+        entry = index.get(file_path)
+        assert (entry or {}).get("rotate") == expected_rotate
+
+    def test_regex_matches_whole_path(self):
+        """Test regex patterns must match the whole path."""
+        index = OverrideIndex([{"regex": "/etc/logrotate.d/ceph"}])
+        assert "/etc/logrotate.d/ceph" in index
+        assert "/etc/logrotate.d/ceph-osd" not in index
+
+    @pytest.mark.parametrize(
+        "regex, file_path",
+        [
+            ("(?i)/etc/logrotate.d/CEPH", "/etc/logrotate.d/ceph"),
+            ("/etc/logrotate.d/(a)\\1pt", "/etc/logrotate.d/aapt"),
+            ("/etc/logrotate.d/(?P<name>ceph)", "/etc/logrotate.d/ceph"),
+        ],
+    )
+    def test_regex_features(self, regex, file_path):
+        """Test regexes with inline flags, backreferences and named groups all apply."""
+        index = OverrideIndex(
+            [
+                {"regex": "/etc/logrotate.d/(?P<name>apt)", "rotate": 1},
+                {"regex": regex, "rotate": 2},
+            ]
+        )
+        assert index.get(file_path)["rotate"] == 2
+        assert index.get("/etc/logrotate.d/apt")["rotate"] == 1
+        assert OverrideIndex.from_dict(index.to_dict()).get(file_path)["rotate"] == 2
+
+    def test_invalid_regex(self):
+        """Test an invalid regex is reported."""
+        with pytest.raises(ValueError):
+            OverrideIndex([{"regex": "/etc/logrotate.d/(ceph"}])
+
+    def test_iter_and_len(self):
+        """Test iterating over the configured paths and patterns."""
+        index = OverrideIndex([{"path": "/etc/logrotate.d/apt"}, {"regex": ".*ceph"}])
+        assert list(index) == ["/etc/logrotate.d/apt", ".*ceph"]
+        assert len(index) == 2
+
+    def test_modify_content_with_glob_override(self, logrotate_helper):
+        """Test a glob override applies to modify_content."""
+        logrotate_helper.override = [{"path": "/etc/logrotate.d/ceph*", "rotate": 3}]
+        logrotate_helper.override_files = logrotate_helper.get_override_files()
+        content = "/var/log/ceph/*.log {\n  rotate 7\n  daily\n}\n"
+
+        mod_contents = logrotate_helper.modify_content(content, "/etc/logrotate.d/ceph-common")
+
+        assert mod_contents == "\n/var/log/ceph/*.log {\n  rotate 3\n  daily\n}\n"
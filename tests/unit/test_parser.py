@@ -0,0 +1,190 @@
+"""Unit tests for the logrotate config parser."""
+
+from textwrap import dedent
+
+from lib_parser import INCLUDE, SCRIPT, BlockEdit, parse_config
+
+
+class TestParseConfig:
+    """Config parser test class."""
+
+    def test_blocks_and_paths(self):
+        """Test blocks, globs and quoted paths are recognised."""
+        document = parse_config(dedent("""\
+                /var/log/a.log "/var/log/with space.log" {
+                  daily
+                }
+                /var/log/*/*.log
+                {
+                  weekly
+                }
+                """))
+        assert [block.paths for block in document.blocks] == [
+            ("/var/log/a.log", "/var/log/with space.log"),
+            ("/var/log/*/*.log",),
+        ]
+        assert document.blocks[1].interval() == "weekly"
+
+    def test_braces_in_scripts(self):
+        """Test braces inside script sections do not close the block."""
+        document = parse_config(dedent("""\
+                /var/log/app.log {
+                  postrotate
+                    if [ -f "${PIDFILE}" ]; then kill -HUP "$(cat ${PIDFILE})"; fi
+                  endscript
+                  daily
+                }
+                """))
+        (block,) = document.blocks
+        assert [node.kind for node in block.body] == [SCRIPT, "directive"]
+        assert block.body[0].keyword == "postrotate"
+        assert block.has("daily")
+
+    def test_include_and_globals(self):
+        """Test top level directives are kept outside of blocks."""
+        document = parse_config("include /etc/other.d\nweekly\n/var/log/a.log {\n}\n")
+        (block,) = document.blocks
+        assert [node.kind for node in block.leading] == [INCLUDE, "directive"]
+        assert not block.has("weekly")
+
+    def test_one_line_block(self):
+        """Test a block on a single line is split into directives."""
+        document = parse_config("/var/log/a.log { daily }\n")
+        (block,) = document.blocks
+        assert block.paths == ("/var/log/a.log",)
+        assert block.has("daily")
+
+    def test_one_line_block_directives(self):
+        """Test every directive of a block on a single line is parsed on its own."""
+        document = parse_config(
+            "/var/log/x.log { weekly rotate 3 create 0640 root adm"
+            " postrotate kill -HUP 1 endscript }\n/var/log/y.log {}\n"
+        )
+        block, empty = document.blocks
+        assert [(node.keyword, node.args) for node in block.directives()] == [
+            ("weekly", ""),
+            ("rotate", "3"),
+            ("create", "0640 root adm"),
+        ]
+        assert block.scripts("postrotate")[0].lines[1].strip() == "kill -HUP 1"
+        assert empty.paths == ("/var/log/y.log",)
+
+        edit = BlockEdit()
+        edit.set(["rotate"], "rotate 30")
+        assert document.serialize({0: edit}).startswith(
+            "\n/var/log/x.log {\n    weekly\n    rotate 30\n    create 0640 root adm\n"
+        )
+
+    def test_brace_ending_directive(self):
+        """Test a directive ending with a brace does not close the block."""
+        document = parse_config("/var/log/app/*.log {\n  olddir /var/log/${SVC}\n  daily\n}\n")
+        (block,) = document.blocks
+        assert [node.args for node in block.directives("olddir")] == ["/var/log/${SVC}"]
+        assert block.has("daily")
+        assert not document.incomplete
+
+    def test_multi_line_header_kept(self):
+        """Test a header of several path lines, as packaged for rsyslog, is kept verbatim."""
+        content = "/var/log/syslog\n/var/log/mail.log\n{\n\trotate 4\n\tweekly\n}\n"
+        document = parse_config(content)
+        (block,) = document.blocks
+        assert block.paths == ("/var/log/syslog", "/var/log/mail.log")
+        assert document.serialize() == "\n" + content
+
+    def test_trailing_content_is_kept(self):
+        """Test content after the last block and unclosed blocks survive."""
+        content = "/var/log/a.log {\n  daily\n}\n# trailing comment\n/var/log/b.log {\n  weekly\n"
+        document = parse_config(content)
+        assert len(document.blocks) == 1
+        assert document.serialize() == (
+            "\n/var/log/a.log {\n  daily\n}\n" "\n# trailing comment\n/var/log/b.log {\n  weekly\n"
+        )
+
+    def test_parse_is_cached(self):
+        """Test identical content shares the parsed document."""
+        content = "/var/log/a.log {\n  daily\n}\n"
+        assert parse_config(content) is parse_config(content)
+
+    def test_serialize_does_not_modify_document(self):
+        """Test edits are applied on serialization only."""
+        document = parse_config("/var/log/a.log {\n  rotate 5\n  daily\n}\n")
+        edit = BlockEdit()
+        edit.set(["rotate"], "rotate 9")
+        edit.set(["compress"], "compress")
+        edit.set(["size"], "size 1G", append=False)
+
+        assert document.serialize({0: edit}) == (
+            "\n/var/log/a.log {\n  rotate 9\n  daily\n    compress\n}\n"
+        )
+        assert document.serialize() == "\n/var/log/a.log {\n  rotate 5\n  daily\n}\n"
+
+    def test_serialize_with_header(self):
+        """Test the header is put on top and blank lines are dropped."""
+        header = "# header"
+        document = parse_config(header + "\n\n/var/log/a.log {\n\n  daily\n}\n")
+        assert document.serialize(header=header) == "# header\n/var/log/a.log {\n  daily\n}\n"
+
+    def test_disabled_block_round_trip(self):
+        """Test a block commented out by the charm is parsed back and can be restored."""
+        content = "/var/log/a.log {\n  # keep\n\n  daily\n}\n\n/var/log/b.log {\n  weekly\n}\n"
+        edit = BlockEdit()
+        edit.disable("overlaps with /etc/logrotate.d/a")
+
+        disabled = parse_config(content).serialize({0: edit})
+        document = parse_config(disabled)
+
+        assert disabled.startswith(
+            "\n# Disabled by the logrotate charm: overlaps with /etc/logrotate.d/a\n"
+            "# /var/log/a.log {\n#   # keep\n#\n#   daily\n# }\n"
+        )
+        assert [block.disabled for block in document.blocks] == [
+            "overlaps with /etc/logrotate.d/a",
+            None,
+        ]
+        assert document.serialize() == disabled
+        edit = BlockEdit()
+        edit.enable()
+        assert document.serialize({0: edit}) == parse_config(content).serialize()
+
+
+class TestModifyContentParsing:
+    """modify_content parsing test class."""
+
+    def test_postrotate_variables(self, logrotate_helper):
+        """Test ${VAR} in a postrotate script does not split the block."""
+        content = dedent("""\
+            /var/log/app.log {
+              daily
+              postrotate
+                kill -HUP ${PID}
+              endscript
+            }
+            """)
+        mod_contents = logrotate_helper.modify_content(content, "/etc/logrotate.d/app")
+        assert mod_contents == (
+            "\n/var/log/app.log {\n  daily\n  postrotate\n    kill -HUP ${PID}\n"
+            "  endscript\n    rotate 30\n}\n"
+        )
+
+    def test_interval_in_path_is_ignored(self, logrotate_helper):
+        """Test only interval directives are used to calculate the count."""
+        content = "/var/log/weekly-report.log {\n  rotate 2\n  daily\n}\n"
+        mod_contents = logrotate_helper.modify_content(content, "/etc/logrotate.d/report")
+        assert "rotate 30" in mod_contents
+
+    def test_rotate_in_script_is_kept(self, logrotate_helper):
+        """Test rotate inside a script section is not rewritten."""
+        content = "/var/log/app.log {\n  weekly\n  prerotate\n    echo rotate 3\n  endscript\n}\n"
+        mod_contents = logrotate_helper.modify_content(content, "/etc/logrotate.d/app")
+        assert "echo rotate 3" in mod_contents
+        assert "    rotate 4\n}" in mod_contents
+
+    def test_header_in_single_pass(self, logrotate_helper):
+        """Test the header rendering matches modify_header."""
+        content = "/var/log/a.log {\n  rotate 2\n  daily\n}\n\n/var/log/b.log {\n  weekly\n}\n"
+        file_path = "/etc/logrotate.d/a"
+        expected = logrotate_helper.modify_header(
+            logrotate_helper.modify_content(content, file_path)
+        )
+        header = "# Configuration file maintained by Juju. Local changes may be overwritten"
+        assert logrotate_helper.modify_content(content, file_path, header=header) == expected
@@ -0,0 +1,94 @@
+"""Plan tests."""
+
+from lib_plan import TRUNCATED, PlanReport
+
+APT = "/var/log/apt.log {\n  daily\n}\n"
+
+
+class TestPlanConfigs:
+    """Planned logrotate files changes tests."""
+
+    def test_plan_configs(self, logrotate_helper, logrotate_dir):
+        """Test the planned changes are diffed without writing the files."""
+        (logrotate_dir / "apt").write_text(APT)
+
+        plan = list(logrotate_helper.plan_configs())
+
+        assert (logrotate_dir / "apt").read_text() == APT
+        assert len(plan) == 1
+        file_path, diff = plan[0]
+        assert file_path == str(logrotate_dir / "apt")
+        assert diff.startswith("--- {}\n+++ {} (planned)\n".format(file_path, file_path))
+        assert "+    rotate 30\n" in diff
+        assert "+# Configuration file maintained by Juju" in diff
+
+    def test_plan_unchanged(self, logrotate_helper, logrotate_dir):
+        """Test files already up to date have an empty diff."""
+        (logrotate_dir / "apt").write_text(APT)
+        logrotate_helper.modify_configs()
+
+        assert list(logrotate_helper.plan_configs()) == [(str(logrotate_dir / "apt"), "")]
+
+    def test_plan_other_settings(self, logrotate_helper, logrotate_dir):
+        """Test changes are planned for settings other than the applied ones."""
+        (logrotate_dir / "apt").write_text(APT)
+        logrotate_helper.modify_configs()
+
+        logrotate_helper.retention = 90
+        ((_, diff),) = logrotate_helper.plan_configs()
+
+        assert "-    rotate 30\n+    rotate 90\n" in diff
+
+    def test_plan_writes_nothing(self, logrotate_helper, logrotate_dir, tmp_path):
+        """Test planning, with a disk budget and overlap detection, leaves the disk alone."""
+        (logrotate_dir / "apt").write_text(APT)
+        (logrotate_dir / "apt-copy").write_text(APT)
+        logrotate_helper.disk_budget = "1G"
+        before = sorted(tmp_path.rglob("*"))
+
+        assert len(list(logrotate_helper.plan_configs())) == 2
+
+        assert sorted(tmp_path.rglob("*")) == before
+
+
+class TestPlanReport:
+    """Plan report tests."""
+
+    def test_summary(self):
+        """Test every file is counted."""
+        report = PlanReport(1024)
+
+        assert report.add("/etc/logrotate.d/apt", "") == ""
+        assert report.add("/etc/logrotate.d/dpkg", "-a\n+b\n") == "-a\n+b\n"
+
+        assert report.summary() == {
+            "files-checked": 2,
+            "files-changed": 1,
+            "truncated": False,
+        }
+        assert report.diff() == "-a\n+b\n"
+
+    def test_bounded(self):
+        """Test diffs are cut at the size bound, on a line boundary, marker included."""
+        report = PlanReport(10 + len(TRUNCATED) + 2)
+
+        assert (
+            report.add("/etc/logrotate.d/apt", "-aaa\n+bbb\n" + "-ccc\n" * 5)
+            == "-aaa\n+bbb\n" + TRUNCATED
+        )
+        assert report.add("/etc/logrotate.d/dpkg", "-a\n+b\n") == ""
+        assert len(report.diff()) <= report.max_bytes
+
+        assert report.summary() == {
+            "files-checked": 2,
+            "files-changed": 2,
+            "truncated": True,
+        }
+
+    def test_bound_below_marker(self):
+        """Test nothing is kept of a diff when the marker would not fit."""
+        report = PlanReport(len(TRUNCATED))
+
+        assert report.add("/etc/logrotate.d/apt", "-aaa\n+bbb\n-ccc\n+ddd\n") == ""
+        assert report.diff() == ""
+        assert report.summary()["truncated"] is True
@@ -0,0 +1,246 @@
+"""Pressure deferral tests."""
+
+import fcntl
+from unittest import mock
+
+import lib_cron
+import lib_pressure
+import pytest
+from lib_metrics import RunMetrics
+from lib_pressure import PressureGate, low_priority_command, read_pressure
+
+PSI = """\
+some avg10=4.00 avg60=35.50 avg300=1.00 total=1000
+full avg10=0.00 avg60=10.00 avg300=0.00 total=10
+"""
+
+
+@pytest.fixture
+def pressure_lock(tmp_path, monkeypatch):
+    """Directory of the job locks."""
+    monkeypatch.setattr("lib_pressure.LOCK_FILE", str(tmp_path / "charm-logrotate-{job}.lock"))
+    return tmp_path
+
+
+class FakeClock:
+    """Clock advanced by the fake sleep."""
+
+    def __init__(self):
+        """Init function."""
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the clock."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """Fake clock fixture."""
+    return FakeClock()
+
+
+class TestReadings:
+    """Pressure readings tests."""
+
+    def test_read_pressure(self, tmp_path, monkeypatch):
+        """Test the one minute average of some stalls is read."""
+        (tmp_path / "io").write_text(PSI)
+        monkeypatch.setattr("lib_pressure.PRESSURE_DIR", str(tmp_path))
+
+        assert read_pressure("io") == 35.5
+
+    def test_no_psi(self, tmp_path, monkeypatch):
+        """Test kernels without pressure stall information are not an error."""
+        monkeypatch.setattr("lib_pressure.PRESSURE_DIR", str(tmp_path))
+
+        assert read_pressure("cpu") is None
+
+    def test_busy(self):
+        """Test only the readings above a threshold are reported."""
+        gate = PressureGate(io=20.0, cpu=0, load=1.5)
+
+        assert gate.busy({"io": 35.5, "cpu": 90.0, "load": 1.0}) == ["io"]
+        assert gate.busy({"io": None, "cpu": None, "load": 2.0}) == ["load"]
+
+
+class TestPressureGate:
+    """Pressure gate tests."""
+
+    def test_quiet(self, clock, mocker):
+        """Test a job runs right away on a quiet host."""
+        mocker.patch.object(PressureGate, "readings", return_value={"io": 1, "cpu": 1, "load": 0})
+        gate = PressureGate(sleep=clock.sleep, clock=clock)
+
+        assert gate.wait() == 0
+        assert clock.sleeps == []
+
+    def test_backoff(self, clock, mocker):
+        """Test the job waits with an exponential backoff until the host is quiet."""
+        readings = [{"io": 50.0, "cpu": 0, "load": 0}] * 3 + [{"io": 5.0, "cpu": 0, "load": 0}]
+        mocker.patch.object(PressureGate, "readings", side_effect=readings)
+        gate = PressureGate(sleep=clock.sleep, clock=clock)
+        metrics = RunMetrics("defer_refresh", directory="")
+
+        assert gate.wait(metrics) == 210
+        assert clock.sleeps == [30, 60, 120]
+        assert metrics.counters["deferrals"] == 3
+        assert metrics.counters["deferred_seconds"] == 210
+
+    def test_deadline(self, clock, mocker):
+        """Test the job runs anyway once the deadline has passed."""
+        mocker.patch.object(
+            PressureGate, "readings", return_value={"io": 50.0, "cpu": 0, "load": 0}
+        )
+        gate = PressureGate(deadline=1000, sleep=clock.sleep, clock=clock)
+
+        assert gate.wait() == 1000
+        assert clock.sleeps == [30, 60, 120, 240, 480, 70]
+
+    def test_main(self, pressure_lock, mocker):
+        """Test the wrapped command runs with a low priority after the gate."""
+        mocker.patch("lib_snapshot.load_snapshot", return_value=mock.MagicMock())
+        mock_from_snapshot = mocker.patch.object(PressureGate, "from_snapshot")
+        mock_call = mocker.patch("lib_pressure.subprocess.call", return_value=3)
+
+        assert lib_pressure.main(["--job", "refresh", "/usr/sbin/logrotate", "-v"]) == 3
+
+        mock_from_snapshot.return_value.wait.assert_called_once()
+        mock_call.assert_called_once_with(low_priority_command(["/usr/sbin/logrotate", "-v"]))
+        assert mock_call.call_args[0][0][:2] == ["ionice", "-c3"]
+
+    @pytest.mark.parametrize(
+        "error", [FileNotFoundError("gone"), ValueError("Unsupported config snapshot version")]
+    )
+    def test_main_without_config(self, pressure_lock, mocker, error):
+        """Test the command runs with the default thresholds if the saved config is unusable."""
+        mocker.patch("lib_snapshot.load_snapshot", side_effect=error)
+        mock_wait = mocker.patch.object(PressureGate, "wait")
+        mock_call = mocker.patch("lib_pressure.subprocess.call", return_value=0)
+
+        assert lib_pressure.main(["--job", "logrotate", "/usr/sbin/logrotate"]) == 0
+
+        assert mock_wait.call_count == 1
+        mock_call.assert_called_once_with(low_priority_command(["/usr/sbin/logrotate"]))
+
+    def test_main_previous_run(self, pressure_lock, mocker):
+        """Test a job exits while its previous run is still deferred."""
+        mocker.patch("lib_snapshot.load_snapshot", return_value=mock.MagicMock())
+        mock_from_snapshot = mocker.patch.object(PressureGate, "from_snapshot")
+        mock_call = mocker.patch("lib_pressure.subprocess.call", return_value=0)
+
+        with open(str(pressure_lock / "charm-logrotate-refresh.lock"), "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            assert lib_pressure.main(["--job", "refresh", "/usr/sbin/logrotate"]) == 0
+            mock_from_snapshot.assert_not_called()
+            mock_call.assert_not_called()
+            # other jobs are not held back
+            lib_pressure.main(["--job", "cron_daily", "/usr/sbin/logrotate"])
+            mock_call.assert_called_once()
+
+
+class TestPressureWrapper:
+    """Pressure wrapper of the cron jobs tests."""
+
+    def test_cronjob(self, cron, mocker):
+        """Test the cron job is wrapped outside of juju-exec."""
+        mocker.patch("charmhelpers.core.hookenv.local_unit", return_value="logrotated/0")
+        mocker.patch("charmhelpers.core.hookenv.has_juju_version", return_value=True)
+        mocker.patch("lib_cron.os.getcwd", return_value="/mock/unit-logrotated-0/charm")
+        cron_config = cron()
+        cron_config.pressure_defer = True
+
+        job = cron.render_juju_exec_cronjob(
+            "/venv/bin/python3", "/charm/lib/lib_cron.py", cron_config.pressure_command("refresh")
+        )
+
+        command = job.splitlines()[1]
+        assert command.startswith("/mock/unit-logrotated-0/.venv/bin/python3 ")
+        assert "/lib_pressure.py --job refresh /usr/bin/sudo /usr/bin/juju-exec" in command
+
+    @pytest.mark.parametrize("defer", [True, False])
+    def test_juju_exec_job_priority(self, cron, root_logger, mocker, defer):
+        """Test the job run by juju-exec lowers its own priority with deferral."""
+        mocker.patch("charmhelpers.core.hookenv.config", return_value=defer)
+        mocker.patch("charmhelpers.core.hookenv.log")
+        mocker.patch("charmhelpers.core.hookenv.status_set")
+        mocker.patch("lib_refresh.ready_message", return_value="Unit is ready.")
+        mock_update = mocker.patch.object(cron, "update_logrotate_etc")
+        mock_nice = mocker.patch("lib_pressure.os.nice")
+        mock_check_call = mocker.patch("lib_pressure.subprocess.check_call")
+
+        lib_cron.main()
+
+        mock_update.assert_called_once_with()
+        assert mock_nice.call_args_list == ([mock.call(lib_pressure.NICE)] if defer else [])
+        assert mock_check_call.call_count == int(defer)
+
+    def test_lower_priority_without_ionice(self, mocker):
+        """Test the job still runs when ionice is missing."""
+        mock_nice = mocker.patch("lib_pressure.os.nice")
+        mocker.patch("lib_pressure.subprocess.check_call", side_effect=FileNotFoundError("ionice"))
+
+        lib_pressure.lower_priority()
+
+        mock_nice.assert_called_once_with(lib_pressure.NICE)
+
+    def test_cron_daily_wrapper(self, cron, tmp_path, mocker):
+        """Test the cron.daily script is diverted and wrapped, then restored."""
+        script = tmp_path / "logrotate"
+        diverted = tmp_path / "logrotate.charm-diverted"
+        script.write_text("#!/bin/sh\n/usr/sbin/logrotate /etc/logrotate.conf\n")
+        mocker.patch("lib_cron.CRON_DAILY_LOGROTATE", str(script))
+        mocker.patch("lib_cron.CRON_DAILY_LOGROTATE_DIVERTED", str(diverted))
+
+        def dpkg_divert(args):
+            if "--add" in args:
+                script.rename(diverted)
+            else:
+                diverted.rename(script)
+
+        mock_check_call = mocker.patch("lib_cron.subprocess.check_call", side_effect=dpkg_divert)
+        cron_config = cron()
+        cron_config.pressure_defer = True
+
+        cron_config.update_cron_daily_wrapper(True)
+        cron_config.update_cron_daily_wrapper(True)
+
+        assert mock_check_call.call_count == 1
+        assert script.read_text().splitlines()[-1].endswith("--job cron_daily {}".format(diverted))
+
+        cron_config.update_cron_daily_wrapper(False)
+
+        assert mock_check_call.call_count == 2
+        assert "/usr/sbin/logrotate" in script.read_text()
+        assert not diverted.exists()
+
+    def test_logrotate_service(self, cron, systemd_dir, mocker):
+        """Test the packaged logrotate.service is deferred too on systemd hosts."""
+        mock_systemctl = mocker.patch("lib_cron.systemctl")
+        drop_in = systemd_dir / "logrotate.service.d" / "charm-logrotate.conf"
+        cron_config = cron()
+        cron_config.pressure_defer = True
+
+        cron_config.update_logrotate_service(True)
+        assert not drop_in.exists()
+
+        (systemd_dir / "run").mkdir()
+        (systemd_dir / "packaged" / "logrotate.service").write_text("[Service]\n")
+        cron_config.update_logrotate_service(True)
+        cron_config.update_logrotate_service(True)
+
+        lines = drop_in.read_text().splitlines()
+        assert lines[1:3] == ["[Service]", "ExecStart="]
+        assert lines[3].startswith("ExecStart=")
+        assert lines[3].endswith("--job logrotate /usr/sbin/logrotate /etc/logrotate.conf")
+        mock_systemctl.assert_called_once_with("daemon-reload")
+
+        cron_config.update_logrotate_service(False)
+        assert not drop_in.parent.exists()
+        assert mock_systemctl.call_count == 2
@@ -0,0 +1,192 @@
+"""Reactive handlers tests."""
+
+import json
+import os
+
+import lib_snapshot
+import pytest
+
+
+@pytest.fixture
+def handlers(tmp_path, mock_hookenv_config, mocker):
+    """Reactive module fixture, with mocked helpers and flags."""
+    import logrotate
+
+    mocker.patch("lib_snapshot.SNAPSHOT_FILE", str(tmp_path / "logrotate_cronjob_config"))
+    mocker.patch("logrotate.logrotate_helper")
+    mocker.patch("logrotate.cron_helper")
+    mocker.patch("logrotate.watcher_helper")
+    mocker.patch("logrotate.set_flag")
+    mocker.patch("logrotate.clear_flag")
+    mocker.patch("logrotate.ready_message", return_value="Unit is ready.")
+    mocker.patch("lib_globs.check_globs", return_value=None)
+    mocker.patch("charmhelpers.core.hookenv.log")
+    mocker.patch("charmhelpers.core.hookenv.status_set")
+    return logrotate
+
+
+def remove_snapshot(*args):
+    """Remove the saved config, as install_cronjob does with the cron job disabled."""
+    os.remove(lib_snapshot.SNAPSHOT_FILE)
+
+
+def applied():
+    """Return whether the saved config is recorded as applied."""
+    with open(lib_snapshot.SNAPSHOT_FILE, "r") as snapshot_file:
+        data = json.load(snapshot_file)
+    return data["applied"] == data["generation"]
+
+
+class TestInstall:
+    """Install handler tests."""
+
+    def test_install(self, handlers):
+        """Test every stage runs, and the unit is marked installed."""
+        handlers.install_logrotate()
+
+        handlers.logrotate_helper().modify_configs.assert_called_once_with()
+        handlers.cron_helper().install_cronjob.assert_called_once_with()
+        handlers.set_flag.assert_called_once_with("logrotate.installed")
+        handlers.hookenv.status_set.assert_called_once_with("active", "Unit is ready.")
+        assert applied()
+
+    def test_install_cronjob_disabled(self, handlers):
+        """Test the install succeeds when the cron job stages remove the saved config."""
+        handlers.cron_helper().install_cronjob.side_effect = remove_snapshot
+
+        handlers.install_logrotate()
+
+        handlers.set_flag.assert_called_once_with("logrotate.installed")
+        handlers.hookenv.status_set.assert_called_once_with("active", "Unit is ready.")
+
+    def test_install_failed(self, handlers):
+        """Test the unit is blocked, and not marked installed, when a stage fails."""
+        handlers.logrotate_helper().modify_configs.side_effect = OSError("broken")
+
+        handlers.install_logrotate()
+
+        handlers.set_flag.assert_not_called()
+        handlers.hookenv.status_set.assert_called_once_with(
+            "blocked", "Install hook failed. Check logs for more info."
+        )
+
+    def test_upgrade_charm(self, handlers):
+        """Test an upgrade runs the install stages again."""
+        handlers.upgrade_charm()
+
+        handlers.clear_flag.assert_called_once_with("logrotate.installed")
+
+
+class TestConfigChanged:
+    """Config-changed handler tests."""
+
+    def test_only_changed_stages(self, handlers, mocker):
+        """Test the logrotate files are rendered again only when their options change."""
+        handlers.config_changed()
+        assert applied()
+        handlers.logrotate_helper().modify_configs.reset_mock()
+
+        config = handlers.hookenv.config()
+        config["update-cron-daily-schedule"] = "set,06:30"
+        mocker.patch("charmhelpers.core.hookenv.config", return_value=config)
+        handlers.config_changed()
+
+        handlers.logrotate_helper().modify_configs.assert_not_called()
+        handlers.cron_helper().install_cronjob.assert_called_with({"update-cron-daily-schedule"})
+        handlers.hookenv.status_set.assert_called_with("active", "Unit is ready.")
+
+    def test_cronjob_disabled(self, handlers):
+        """Test the hook succeeds when the cron job stages remove the saved config."""
+        handlers.cron_helper().install_cronjob.side_effect = remove_snapshot
+
+        handlers.config_changed()
+
+        handlers.hookenv.status_set.assert_called_with("active", "Unit is ready.")
+        assert not os.path.exists(lib_snapshot.SNAPSHOT_FILE)
+
+    def test_failed_stages_run_again(self, handlers):
+        """Test the unit is blocked, and every stage runs again after a failure."""
+        handlers.cron_helper().install_cronjob.side_effect = [OSError("broken"), None]
+
+        handlers.config_changed()
+        handlers.hookenv.status_set.assert_called_with(
+            "blocked", "Config-changed hook failed. Check logs for more info."
+        )
+        assert not applied()
+
+        handlers.logrotate_helper().modify_configs.reset_mock()
+        handlers.config_changed()
+        handlers.logrotate_helper().modify_configs.assert_called_once_with()
+        handlers.hookenv.status_set.assert_called_with("active", "Unit is ready.")
+        assert applied()
+
+
+class TestUpdateStatus:
+    """Update-status handler tests."""
+
+    def test_no_cron_job_run(self, handlers, mocker):
+        """Test the status is left alone when no standalone cron job ran since."""
+        mocker.patch("lib_refresh.pop_status", return_value=None)
+        mock_merge = mocker.patch("lib_state.merge_shards")
+
+        handlers.update_status()
+
+        mock_merge.assert_called_once_with()
+        handlers.hookenv.status_set.assert_not_called()
+
+    def test_flagged_globs(self, handlers, mocker):
+        """Test the flagged log globs are logged, leaving the status alone."""
+        mocker.patch("lib_refresh.pop_status", return_value=None)
+        mocker.patch("lib_state.merge_shards")
+        mock_check = mocker.patch(
+            "lib_globs.check_globs", return_value=[("/etc/logrotate.d/a", "/x/*", ["no-match"])]
+        )
+
+        handlers.update_status()
+
+        mock_check.assert_called_once_with(100)
+        handlers.hookenv.log.assert_called_once_with(
+            "1 log globs match nothing or list too many directories, see the glob-costs action."
+        )
+        handlers.hookenv.status_set.assert_not_called()
+
+    def test_cron_job_failed(self, handlers, mocker):
+        """Test a failed standalone cron job blocks the unit."""
+        mocker.patch(
+            "lib_refresh.pop_status",
+            return_value={"status": "blocked", "message": "Cron job failed: broken"},
+        )
+        mocker.patch("lib_state.merge_shards")
+
+        handlers.update_status()
+
+        handlers.hookenv.status_set.assert_called_once_with("blocked", "Cron job failed: broken")
+
+
+class TestStop:
+    """Stop handler tests."""
+
+    def test_stop(self, handlers, mocker):
+        """Test the host changes are undone, and the helper scripts rendered away."""
+        mock_merge = mocker.patch("lib_state.merge_shards", return_value=None)
+
+        handlers.stop()
+
+        handlers.watcher_helper().update_service.assert_called_once_with(False)
+        handlers.cron_helper().uninstall_cronjob.assert_called_once_with()
+        assert handlers.logrotate_helper().copytruncate_helper is False
+        handlers.logrotate_helper().modify_configs.assert_called_once_with()
+        mock_merge.assert_called_once_with()
+        handlers.hookenv.status_set.assert_not_called()
+
+    def test_stop_failed(self, handlers, mocker):
+        """Test the unit is blocked when a stage fails."""
+        mocker.patch("lib_state.merge_shards")
+        handlers.cron_helper().uninstall_cronjob.side_effect = OSError("broken")
+
+        handlers.stop()
+
+        handlers.logrotate_helper().modify_configs.assert_not_called()
+        handlers.hookenv.status_set.assert_called_once_with(
+            "blocked", "Stop hook failed. Check logs for more info."
+        )
@@ -0,0 +1,77 @@
+"""Unit tests for the standalone refresh entry point."""
+
+import os
+import subprocess
+import sys
+from textwrap import dedent
+
+import lib_refresh
+import pytest
+
+
+@pytest.fixture
+def status_file(tmp_path, monkeypatch):
+    """Temporary status file."""
+    path = tmp_path / "state" / "status.json"
+    monkeypatch.setattr("lib_refresh.STATUS_FILE", str(path))
+    return path
+
+
+class TestRefresh:
+    """Standalone refresh test class."""
+
+    def test_main_success(self, status_file, mocker):
+        """Test a successful run is saved as active."""
+        mock_helper = mocker.patch("lib_logrotate.LogrotateHelper.from_config_file")
+
+        assert lib_refresh.main() == 0
+
+        mock_helper.return_value.modify_configs.assert_called_once_with()
+        status = lib_refresh.pop_status()
+        assert status["status"] == "active"
+        assert status["message"] == "Unit is ready."
+        assert not status_file.exists()
+        assert lib_refresh.pop_status() is None
+
+    def test_main_failure(self, status_file, mocker):
+        """Test a failed run is saved as blocked."""
+        mock_helper = mocker.patch("lib_logrotate.LogrotateHelper.from_config_file")
+        mock_helper.return_value.modify_configs.side_effect = OSError("disk full")
+
+        assert lib_refresh.main() == 1
+
+        status = lib_refresh.pop_status()
+        assert status["status"] == "blocked"
+        assert status["error"] == "disk full"
+
+    def test_no_charmhelpers_import(self):
+        """Test the standalone path does not load charmhelpers."""
+        code = dedent("""\
+            import sys
+            import lib_refresh
+            from lib_logrotate import LogrotateHelper
+            LogrotateHelper(
+                retention=1, override="[]", workers=1, disk_budget="",
+                dateext_threshold=0, compression="", compression_threads=0,
+                copytruncate_helper=False, overlap_policy="report",
+                state_prune_days=0,
+            )
+            assert "charmhelpers" not in sys.modules, "charmhelpers imported"
+            """)
+        lib_dir = os.path.dirname(lib_refresh.__file__)
+        subprocess.check_call([sys.executable, "-c", code], env={"PYTHONPATH": lib_dir})
+
+    def test_standalone_cronjob(self, cron, mocker):
+        """Test the standalone cron job runs lib_refresh directly."""
+        mock_local_unit = mocker.patch("charmhelpers.core.hookenv.local_unit")
+
+        cron_job = cron.render_standalone_cronjob(
+            "/mock/unit-logrotated-0/.venv/bin/python3",
+            "/mock/unit-logrotated-0/charm/lib/lib_cron.py",
+        )
+
+        assert cron_job == dedent("""\
+            #!/bin/bash
+            /mock/unit-logrotated-0/.venv/bin/python3 /mock/unit-logrotated-0/charm/lib/lib_refresh.py
+            """)  # noqa
+        mock_local_unit.assert_not_called()
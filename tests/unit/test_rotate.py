@@ -0,0 +1,191 @@
+"""Rotation timing tests."""
+
+import json
+
+import lib_rotate
+import pytest
+from lib_rotate import RotationTimer, load_history, save_run, slowest
+
+VERBOSE_OUTPUT = """\
+reading config file /etc/logrotate.conf
+Handling 2 logs
+
+rotating pattern: /var/log/app/*.log  after 1 days (7 rotations)
+empty log files are rotated, old logs are removed
+considering log /var/log/app/big.log
+  log needs rotating
+rotating log /var/log/app/big.log, log->rotateCount is 7
+copying /var/log/app/big.log to /var/log/app/big.log.1
+truncating /var/log/app/big.log
+compressing log with: /bin/gzip
+rotating pattern: /var/log/web.log  after 1 days (7 rotations)
+considering log /var/log/web.log
+renaming /var/log/web.log to /var/log/web.log.1
+running postrotate script
+removing old log /var/log/web.log.8.gz
+"""
+
+
+@pytest.fixture
+def history_file(tmp_path, monkeypatch):
+    """Temporary rotation history."""
+    path = tmp_path / "state" / "rotate-history.json"
+    monkeypatch.setattr("lib_rotate.HISTORY_FILE", str(path))
+    return path
+
+
+def timed(output, durations):
+    """Feed output to a timer, each line taking durations[line] seconds, default 0."""
+    timer = RotationTimer()
+    now = 0.0
+    for line in output.splitlines(True):
+        timer.feed(line, now)
+        now += durations.get(line.strip(), 0.0)
+    timer.finish(now)
+    return timer
+
+
+class TestRotationTimer:
+    """Rotation timer tests."""
+
+    def test_steps(self):
+        """Test the time until the next line is charged to the step of a line."""
+        timer = timed(
+            VERBOSE_OUTPUT,
+            {
+                "copying /var/log/app/big.log to /var/log/app/big.log.1": 5.0,
+                "compressing log with: /bin/gzip": 3.0,
+                "running postrotate script": 2.0,
+                "renaming /var/log/web.log to /var/log/web.log.1": 0.5,
+                "reading config file /etc/logrotate.conf": 1.0,
+            },
+        )
+
+        assert timer.files == {
+            "/var/log/app/big.log": {
+                "block": "/var/log/app/*.log",
+                "check": 0.0,
+                "copytruncate": 5.0,
+                "compress": 3.0,
+            },
+            "/var/log/web.log": {
+                "block": "/var/log/web.log",
+                "check": 0.0,
+                "rename": 0.5,
+                "script": 2.0,
+                "remove": 0.0,
+            },
+        }
+        # the config parsing happens before any block
+        assert timer.blocks == {"/var/log/app/*.log": 8.0, "/var/log/web.log": 2.5}
+
+    def test_run(self, tmp_path, monkeypatch):
+        """Test logrotate is run verbosely and its output timed."""
+        logrotate = tmp_path / "logrotate"
+        logrotate.write_text(
+            '#!/bin/sh\necho "$@" > {}\ncat <<EOF\n{}EOF\nexit 1\n'.format(
+                tmp_path / "args", VERBOSE_OUTPUT
+            )
+        )
+        logrotate.chmod(0o755)
+        monkeypatch.setattr("lib_rotate.LOGROTATE", str(logrotate))
+
+        returncode, record = lib_rotate.run(["/etc/logrotate.conf"])
+
+        assert returncode == 1
+        assert (tmp_path / "args").read_text() == "-v /etc/logrotate.conf\n"
+        assert sorted(record["files"]) == ["/var/log/app/big.log", "/var/log/web.log"]
+        assert record["files"]["/var/log/web.log"]["block"] == "/var/log/web.log"
+
+
+class TestHistory:
+    """Rotation history tests."""
+
+    def test_rolling_history(self, history_file, monkeypatch):
+        """Test only the last runs are kept."""
+        monkeypatch.setattr("lib_rotate.HISTORY_RUNS", 2)
+        for run in range(3):
+            save_run({"timestamp": run, "files": {}})
+
+        assert [record["timestamp"] for record in load_history()] == [1, 2]
+        assert json.loads(history_file.read_text())[-1]["timestamp"] == 2
+
+    def test_slowest(self):
+        """Test logs are ranked by their mean time over the runs."""
+        history = [
+            {
+                "files": {
+                    "/a": {"block": "/a", "rename": 1.0},
+                    "/b": {"block": "/b", "script": 5.0},
+                }
+            },
+            {"files": {"/a": {"block": "/a", "rename": 1.0, "compress": 6.0}}},
+        ]
+
+        assert slowest(history) == [
+            {
+                "path": "/b",
+                "block": "/b",
+                "runs": 1,
+                "max": 5.0,
+                "mean": 5.0,
+                "steps": {"script": 5.0},
+            },
+            {
+                "path": "/a",
+                "block": "/a",
+                "runs": 2,
+                "max": 7.0,
+                "mean": 4.0,
+                "steps": {"rename": 1.0, "compress": 3.0},
+            },
+        ]
+        assert [entry["path"] for entry in slowest(history, top=1)] == ["/b"]
+
+
+class TestTimingWrapper:
+    """Rotation timing wrapper of the scheduled logrotate runs tests."""
+
+    def test_logrotate_timer(self, cron, mocker):
+        """Test the logrotate timer runs logrotate through the timing wrapper."""
+        mocker.patch("lib_cron.os.getcwd", return_value="/mock/unit-logrotated-0/charm")
+        cron_config = cron()
+        cron_config.cron_daily_schedule = "unset"
+        cron_config.rotate_timing = True
+
+        exec_start = cron_config.logrotate_timer().exec_start
+
+        assert exec_start.startswith("/mock/unit-logrotated-0/.venv/bin/python3 ")
+        assert exec_start.endswith("/lib_rotate.py /etc/logrotate.conf")
+
+    def test_cron_daily_wrapper(self, cron, tmp_path, mocker):
+        """Test the cron.daily wrapper keeps the systemd check of the packaged script."""
+        diverted = tmp_path / "logrotate.charm-diverted"
+        diverted.write_text(
+            "#!/bin/sh\nif [ -d /run/systemd/system ]; then\n  exit 0\nfi\n"
+            "/usr/sbin/logrotate /etc/logrotate.conf\n"
+        )
+        mocker.patch("lib_cron.CRON_DAILY_LOGROTATE_DIVERTED", str(diverted))
+        cron_config = cron()
+        cron_config.rotate_timing = True
+
+        lines = cron_config.render_cron_daily_wrapper().splitlines()
+
+        assert lines[2] == "if [ -d /run/systemd/system ]; then exit 0; fi"
+        assert lines[3].startswith("exec ")
+        assert lines[3].endswith("/lib_rotate.py /etc/logrotate.conf")
+
+    def test_logrotate_service(self, cron, systemd_dir, mocker):
+        """Test the packaged logrotate.service runs the timing wrapper on systemd hosts."""
+        mocker.patch("lib_cron.systemctl")
+        (systemd_dir / "run").mkdir()
+        (systemd_dir / "packaged" / "logrotate.service").write_text("[Service]\n")
+        cron_config = cron()
+        cron_config.rotate_timing = True
+
+        cron_config.update_logrotate_service(True)
+
+        drop_in = systemd_dir / "logrotate.service.d" / "charm-logrotate.conf"
+        exec_start = drop_in.read_text().splitlines()[-1]
+        assert exec_start.startswith("ExecStart=")
+        assert exec_start.endswith("/lib_rotate.py /etc/logrotate.conf")
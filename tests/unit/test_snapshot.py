@@ -0,0 +1,152 @@
+"""Config snapshot tests."""
+
+import json
+import os
+
+import lib_snapshot
+import pytest
+from lib_snapshot import ConfigSnapshot, load_snapshot, mark_applied
+
+OVERRIDE = [
+    {"path": "/etc/logrotate.d/apt", "rotate": 3},
+    {"path": "/etc/logrotate.d/ceph-*", "size": "100M"},
+]
+
+
+@pytest.fixture()
+def snapshot_file(tmp_path, monkeypatch):
+    """Snapshot file path fixture."""
+    path = tmp_path / "logrotate_cronjob_config"
+    monkeypatch.setattr(lib_snapshot, "SNAPSHOT_FILE", str(path))
+    return path
+
+
+class TestConfigSnapshot:
+    """Config snapshot tests."""
+
+    def test_from_legacy_content(self):
+        """Test the one value per line format of older versions is read."""
+        content = "False\ndaily\n14\nset,06:30\n"
+
+        snapshot = ConfigSnapshot.from_content(content)
+
+        assert snapshot.get("logrotate-cronjob") is False
+        assert snapshot.get("logrotate-cronjob-frequency") == "daily"
+        assert snapshot.get("logrotate-retention") == 14
+        assert snapshot.get("update-cron-daily-schedule") == "set,06:30"
+        assert snapshot.get("logrotate-watcher") is False
+        assert snapshot.get("override") == []
+        assert snapshot.generation == 0
+
+    def test_from_charm_config(self):
+        """Test the options are converted from the charm config."""
+        snapshot = ConfigSnapshot.from_charm_config(
+            {"logrotate-retention": 60, "override": json.dumps(OVERRIDE)}
+        )
+
+        assert snapshot.get("logrotate-retention") == 60
+        assert snapshot.get("override") == OVERRIDE
+        assert snapshot.get("logrotate-cronjob") is True
+
+    def test_unsupported_version(self):
+        """Test a snapshot written by an unknown version is rejected."""
+        with pytest.raises(ValueError, match="Unsupported config snapshot version"):
+            ConfigSnapshot.from_content(json.dumps({"version": 99, "options": {}}))
+
+    def test_write_round_trip(self, snapshot_file):
+        """Test a written snapshot is read back with its override index."""
+        snapshot = ConfigSnapshot.from_charm_config(
+            {"logrotate-retention": 60, "override": json.dumps(OVERRIDE)}
+        )
+
+        assert snapshot.write() is True
+
+        loaded = load_snapshot()
+        assert loaded.options == snapshot.options
+        assert loaded.generation == 1
+        index = loaded.override_index()
+        assert index.get("/etc/logrotate.d/apt")["rotate"] == 3
+        assert index.get("/etc/logrotate.d/ceph-osd")["size"] == "100M"
+        assert index.get("/etc/logrotate.d/dpkg") is None
+
+    def test_write_generation(self, snapshot_file):
+        """Test the generation only changes when the options change."""
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 60}).write()
+        mtime = os.stat(str(snapshot_file)).st_mtime_ns
+
+        unchanged = ConfigSnapshot.from_charm_config({"logrotate-retention": 60})
+        assert unchanged.write() is False
+        assert unchanged.generation == 1
+        assert os.stat(str(snapshot_file)).st_mtime_ns == mtime
+
+        changed = ConfigSnapshot.from_charm_config({"logrotate-retention": 90})
+        assert changed.write() is True
+        assert changed.generation == 2
+        assert load_snapshot().get("logrotate-retention") == 90
+
+    def test_write_changed_options(self, snapshot_file):
+        """Test the options that differ from the saved snapshot are reported."""
+        first = ConfigSnapshot.from_charm_config({"logrotate-retention": 60})
+        first.write()
+        assert first.changed == set(lib_snapshot.OPTIONS)
+        mark_applied()
+
+        changed = ConfigSnapshot.from_charm_config(
+            {"logrotate-retention": 60, "update-cron-daily-schedule": "set,06:30"}
+        )
+        changed.write()
+        assert changed.changed == {"update-cron-daily-schedule"}
+        mark_applied()
+
+        unchanged = ConfigSnapshot.from_charm_config(
+            {"logrotate-retention": 60, "update-cron-daily-schedule": "set,06:30"}
+        )
+        unchanged.write()
+        assert unchanged.changed == set()
+
+    def test_write_not_applied(self, snapshot_file):
+        """Test all the options are reported again until the stages ran with a snapshot."""
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 60}).write()
+        mark_applied()
+        # the stages fail with the new snapshot
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 90}).write()
+
+        retry = ConfigSnapshot.from_charm_config({"logrotate-retention": 90})
+        assert retry.write() is False
+        assert retry.changed == set(lib_snapshot.OPTIONS)
+        assert retry.generation == 2
+
+        assert mark_applied() is True
+        assert mark_applied() is False
+        unchanged = ConfigSnapshot.from_charm_config({"logrotate-retention": 90})
+        unchanged.write()
+        assert unchanged.changed == set()
+        assert unchanged.generation == 2
+
+    def test_mark_applied_removed(self, snapshot_file):
+        """Test nothing is recorded once the cron job stages removed the snapshot."""
+        ConfigSnapshot.from_charm_config({"logrotate-cronjob": False}).write()
+        snapshot_file.unlink()
+
+        assert mark_applied() is False
+        assert not snapshot_file.exists()
+
+    def test_write_over_legacy_file(self, snapshot_file):
+        """Test a legacy file is replaced by a versioned snapshot."""
+        snapshot_file.write_text("True\nhourly\n30\nunset\n")
+
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 30}).write()
+
+        data = json.loads(snapshot_file.read_text())
+        assert data["version"] == lib_snapshot.SNAPSHOT_VERSION
+        assert data["generation"] == 1
+
+    def test_load_cached(self, snapshot_file):
+        """Test the snapshot is parsed again only when the file changes."""
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 60}).write()
+
+        first = load_snapshot()
+        assert load_snapshot() is first
+
+        ConfigSnapshot.from_charm_config({"logrotate-retention": 90}).write()
+        assert load_snapshot() is not first
@@ -0,0 +1,273 @@
+"""logrotate state tests."""
+
+import fcntl
+from datetime import datetime
+
+import lib_state
+import pytest
+from lib_state import StateFile, build_shards, merge_shards, prune_state, prune_states, run_shards
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+CONF = """\
+# see "man logrotate" for details
+weekly
+su root adm
+rotate 4
+create
+
+include /etc/logrotate.local
+include {config_dir}
+"""
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """Temporary logrotate config, logrotate.d, state file and shards."""
+    config_dir = tmp_path / "logrotate.d"
+    config_dir.mkdir()
+    conf = tmp_path / "logrotate.conf"
+    conf.write_text(CONF.format(config_dir=config_dir))
+    monkeypatch.setattr("lib_state.LOGROTATE_CONF", str(conf))
+    monkeypatch.setattr("lib_state.LOGROTATE_DIR", str(config_dir) + "/")
+    monkeypatch.setattr("lib_state.STATE_FILE", str(tmp_path / "status"))
+    monkeypatch.setattr("lib_state.SHARD_DIR", str(tmp_path / "shards") + "/")
+    monkeypatch.setattr("lib_state.SHARD_LOCK", str(tmp_path / "shards.lock"))
+    monkeypatch.setattr("lib_state.PRUNE_FILE", str(tmp_path / "state" / "prune.json"))
+    return tmp_path
+
+
+def write_state(path, entries):
+    """Write a state file with entries {log path: date}."""
+    state = StateFile(str(path))
+    state.entries = entries
+    state.save()
+
+
+class TestStateFile:
+    """State file tests."""
+
+    def test_round_trip(self, tmp_path):
+        """Test entries with escaped characters and both date formats round trip."""
+        path = tmp_path / "status"
+        content = (
+            "logrotate state -- version 2\n"
+            '"/var/log/syslog" 2024-5-31-6:25:1\n'
+            '"/var/log/a \\"quoted\\" name.log" 2024-5-1\n'
+            '"/var/log/back\\\\slash.log" 2023-12-24-0:0:0\n'
+        )
+        path.write_text(content)
+        state = StateFile(str(path))
+        state.load()
+
+        assert list(state.entries) == [
+            "/var/log/syslog",
+            '/var/log/a "quoted" name.log',
+            "/var/log/back\\slash.log",
+        ]
+        assert state.rotated(state.entries["/var/log/syslog"]) == datetime(2024, 5, 31, 6, 25, 1)
+        state.save()
+        assert path.read_text() == content
+
+    def test_unknown_line(self, tmp_path):
+        """Test a state that is not understood is not loaded."""
+        path = tmp_path / "status"
+        path.write_text("logrotate state -- version 2\n/var/log/syslog 2024-5-31\n")
+
+        with pytest.raises(ValueError):
+            StateFile(str(path)).load()
+
+
+class TestPrune:
+    """Stale state entries pruning tests."""
+
+    def test_prune(self, tmp_path):
+        """Test only the entries of logs gone for longer than the retention are dropped."""
+        log = tmp_path / "live.log"
+        log.write_text("")
+        path = tmp_path / "status"
+        write_state(
+            path,
+            {
+                str(log): "2023-1-1-0:0:0",
+                "/var/log/containers/gone.log": "2024-5-1-0:0:0",
+                "/var/log/containers/recent.log": "2024-5-30-0:0:0",
+            },
+        )
+
+        assert prune_state(str(path), 7, now=NOW) == 1
+
+        state = StateFile(str(path))
+        state.load()
+        assert list(state.entries) == [str(log), "/var/log/containers/recent.log"]
+
+    def test_patterns(self, tmp_path):
+        """Test a shard state drops the entries its blocks do not match."""
+        path = tmp_path / "status"
+        write_state(
+            path,
+            {"/var/log/app/a.log": "2024-5-31", "/var/log/app/sub/b.log": "2024-5-31"},
+        )
+
+        assert prune_state(str(path), 7, ["/var/log/app/*.log"], now=NOW) == 1
+
+    def test_locked(self, tmp_path):
+        """Test the state is left alone while logrotate holds its lock."""
+        path = tmp_path / "status"
+        write_state(path, {"/var/log/gone.log": "2020-1-1"})
+
+        with open(str(path), "r") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            assert prune_state(str(path), 7, now=NOW) is None
+
+        assert prune_state(str(path), 7, now=NOW) == 1
+
+    def test_daily(self, state_dir):
+        """Test pruning runs once a day, unless disabled."""
+        write_state(state_dir / "status", {"/var/log/gone.log": "2020-1-1"})
+
+        assert prune_states(0) is None
+        assert prune_states(7) == 1
+        write_state(state_dir / "status", {"/var/log/gone.log": "2020-1-1"})
+        assert prune_states(7) is None
+        assert prune_states(7, interval=0) == 1
+
+
+class TestShards:
+    """State shards tests."""
+
+    def test_build(self, state_dir):
+        """Test every logrotate file is a shard with the global directives."""
+        config_dir = state_dir / "logrotate.d"
+        (config_dir / "apt").write_text("/var/log/apt/term.log {\n  rotate 12\n}\n")
+        (config_dir / "rsyslog").write_text("/var/log/syslog {\n  daily\n}\n")
+        (config_dir / "rsyslog.dpkg-old").write_text("/var/log/syslog {\n  daily\n}\n")
+        (config_dir / "logrotate.conf").write_text("/var/log/misnamed.log {\n}\n")
+        write_state(
+            state_dir / "status",
+            {"/var/log/apt/term.log": "2024-5-1", "/var/log/syslog": "2024-5-31"},
+        )
+
+        shards = build_shards()
+
+        shard_dir = state_dir / "shards"
+        assert shards == [
+            (str(shard_dir / ".conf"), str(shard_dir / ".status")),
+            (str(shard_dir / "apt.conf"), str(shard_dir / "apt.status")),
+            (str(shard_dir / "logrotate.conf.conf"), str(shard_dir / "logrotate.conf.status")),
+            (str(shard_dir / "rsyslog.conf"), str(shard_dir / "rsyslog.status")),
+        ]
+        assert (shard_dir / "apt.conf").read_text() == (
+            "weekly\nsu root adm\nrotate 4\ncreate\ninclude {}\n".format(config_dir / "apt")
+        )
+        main = (shard_dir / ".conf").read_text()
+        assert "include /etc/logrotate.local" in main
+        assert "include {}\n".format(config_dir) not in main
+        # new shards start from the matching entries of the global state
+        assert (shard_dir / "apt.status").read_text() == (
+            'logrotate state -- version 2\n"/var/log/apt/term.log" 2024-5-1\n'
+        )
+
+        (config_dir / "apt").unlink()
+        assert len(build_shards()) == 3
+        assert not (shard_dir / "apt.status").exists()
+
+    def test_no_include(self, state_dir):
+        """Test a main config not including logrotate.d is not sharded."""
+        (state_dir / "logrotate.conf").write_text("weekly\n")
+
+        assert build_shards() is None
+
+    def test_run(self, state_dir, mocker):
+        """Test logrotate runs on every shard with its own state."""
+        (state_dir / "logrotate.d" / "apt").write_text("/var/log/apt/term.log {\n}\n")
+        (state_dir / "logrotate.d" / "dpkg").write_text("/var/log/dpkg.log {\n}\n")
+        mock_call = mocker.patch("lib_state.subprocess.call", side_effect=[0, 1, 0])
+
+        assert run_shards(["-f"], workers=2) == 1
+
+        calls = sorted(call.args[0] for call in mock_call.call_args_list)
+        shard_dir = str(state_dir / "shards")
+        assert [
+            "/usr/sbin/logrotate",
+            "-f",
+            "--state",
+            shard_dir + "/apt.status",
+            shard_dir + "/apt.conf",
+        ] in calls
+        assert len(calls) == 3
+
+    def test_merge(self, state_dir):
+        """Test turning sharding off merges the latest rotations back into the global state."""
+        (state_dir / "logrotate.d" / "apt").write_text("/var/log/apt/term.log {\n}\n")
+        write_state(
+            state_dir / "status",
+            {"/var/log/apt/term.log": "2024-5-1", "/var/log/other.log": "2024-5-2"},
+        )
+        build_shards()
+        write_state(state_dir / "shards" / "apt.status", {"/var/log/apt/term.log": "2024-5-31"})
+
+        assert merge_shards() is True
+
+        state = StateFile(lib_state.STATE_FILE)
+        state.load()
+        assert state.entries == {
+            "/var/log/apt/term.log": "2024-5-31",
+            "/var/log/other.log": "2024-5-2",
+        }
+        assert not list((state_dir / "shards").iterdir())
+        assert merge_shards() is None
+
+    def test_merge_locked(self, state_dir):
+        """Test the merge is left for later while logrotate holds the global state lock."""
+        (state_dir / "logrotate.d" / "apt").write_text("/var/log/apt/term.log {\n}\n")
+        write_state(state_dir / "status", {"/var/log/apt/term.log": "2024-5-1"})
+        build_shards()
+
+        with open(str(state_dir / "status"), "r") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            assert merge_shards() is False
+
+        assert (state_dir / "shards" / "apt.status").exists()
+        assert merge_shards() is True
+
+    @pytest.mark.parametrize("lock", ["shards.lock", "shards/apt.status"])
+    def test_merge_shard_locked(self, state_dir, lock):
+        """Test the merge is left for later while a sharded run holds its locks."""
+        (state_dir / "logrotate.d" / "apt").write_text("/var/log/apt/term.log {\n}\n")
+        write_state(state_dir / "status", {"/var/log/apt/term.log": "2024-5-1"})
+        build_shards()
+
+        with open(str(state_dir / lock), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH)
+            assert merge_shards() is False
+            assert (state_dir / "shards" / "apt.status").exists()
+
+        assert merge_shards() is True
+
+    def test_logrotate_command(self, cron, mocker):
+        """Test the scheduled logrotate runs by shard, timed if rotation timing is enabled."""
+        mocker.patch("lib_cron.os.getcwd", return_value="/mock/unit-logrotated-0/charm")
+        cron_config = cron()
+        cron_config.shard_workers = 4
+        cron_config.rotate_timing = True
+
+        command = cron_config.logrotate_command()
+
+        assert command.startswith("/mock/unit-logrotated-0/.venv/bin/python3 ")
+        assert command.endswith("/lib_state.py --workers 4 --timing /etc/logrotate.conf")
+
+    def test_logrotate_service(self, cron, systemd_dir, mocker):
+        """Test the packaged logrotate.service runs by shard on systemd hosts."""
+        mocker.patch("lib_cron.systemctl")
+        (systemd_dir / "run").mkdir()
+        (systemd_dir / "packaged" / "logrotate.service").write_text("[Service]\n")
+        cron_config = cron()
+        cron_config.shard_workers = 4
+
+        cron_config.update_logrotate_service(True)
+
+        drop_in = systemd_dir / "logrotate.service.d" / "charm-logrotate.conf"
+        exec_start = drop_in.read_text().splitlines()[-1]
+        assert exec_start.startswith("ExecStart=")
+        assert exec_start.endswith("/lib_state.py --workers 4 /etc/logrotate.conf")
@@ -0,0 +1,183 @@
+"""Systemd timer tests."""
+
+from unittest import mock
+
+import pytest
+from lib_timer import MANAGED_MARKER, Timer, TimerHelper
+
+REFRESH = Timer("charm-logrotate-refresh", "Refresh", "hourly", "/usr/bin/refresh")
+
+
+class TestTimerHelper:
+    """Timer helper tests."""
+
+    def test_render(self):
+        """Test the timer and service carry the schedule and resource settings."""
+        helper = TimerHelper(randomized_delay="30m", persistent=False, cpu_weight=5)
+
+        timer = helper.render_timer(REFRESH)
+        service = helper.render_service(REFRESH)
+
+        assert timer.startswith(MANAGED_MARKER + "\n")
+        assert "OnCalendar=hourly\nRandomizedDelaySec=30m\nAccuracySec=1m\n" in timer
+        assert "Persistent=false\n" in timer
+        assert "ExecStart=/usr/bin/refresh\nNice=10\nCPUWeight=5\nIOWeight=20\n" in service
+
+    @pytest.mark.parametrize(
+        ("settings", "message"),
+        [({"cpu_weight": 0}, "logrotate-timer-cpu-weight"), ({"nice": 20}, "timer-nice")],
+    )
+    def test_invalid(self, settings, message):
+        """Test settings systemd would reject are refused."""
+        with pytest.raises(ValueError, match=message):
+            TimerHelper(**settings).update_timers([])
+
+    def test_install(self, systemd_dir, mocker):
+        """Test timers are installed, and only restarted when they change."""
+        mock_systemctl = mocker.patch("lib_timer.systemctl")
+        helper = TimerHelper()
+
+        helper.update_timers([REFRESH])
+
+        assert (systemd_dir / "charm-logrotate-refresh.timer").exists()
+        assert (systemd_dir / "charm-logrotate-refresh.service").exists()
+        assert mock_systemctl.call_args_list == [
+            mock.call("daemon-reload"),
+            mock.call("enable", "charm-logrotate-refresh.timer"),
+            mock.call("restart", "charm-logrotate-refresh.timer"),
+        ]
+
+        mock_systemctl.reset_mock()
+        helper.update_timers([REFRESH])
+
+        mock_systemctl.assert_called_once_with("enable", "--now", "charm-logrotate-refresh.timer")
+
+    def test_units_written_atomically(self, systemd_dir, mocker):
+        """Test the units are readable by all, with one sync of their directory."""
+        mocker.patch("lib_timer.systemctl")
+        mock_sync = mocker.patch("lib_fileio.sync_directory")
+
+        TimerHelper().update_timers([REFRESH])
+
+        assert (systemd_dir / "charm-logrotate-refresh.timer").stat().st_mode & 0o7777 == 0o644
+        mock_sync.assert_called_once_with(str(systemd_dir))
+
+    def test_remove(self, systemd_dir, mocker):
+        """Test charm timers are removed and the packaged logrotate timer restored."""
+        mock_systemctl = mocker.patch("lib_timer.systemctl")
+        helper = TimerHelper()
+        helper.update_timers([REFRESH, Timer("logrotate", "Rotate", "daily", "logrotate")])
+        (systemd_dir / "packaged" / "logrotate.timer").write_text("[Timer]\n")
+        mock_systemctl.reset_mock()
+
+        helper.update_timers([])
+
+        assert sorted(path.name for path in systemd_dir.iterdir()) == ["packaged"]
+        assert mock_systemctl.call_args_list == [
+            mock.call("disable", "--now", "charm-logrotate-refresh.timer"),
+            mock.call("daemon-reload"),
+            mock.call("reenable", "logrotate.timer"),
+            mock.call("try-restart", "logrotate.timer"),
+        ]
+
+    def test_unmanaged_kept(self, systemd_dir, mocker):
+        """Test a logrotate.timer written by the administrator is left alone."""
+        mock_systemctl = mocker.patch("lib_timer.systemctl")
+        (systemd_dir / "logrotate.timer").write_text("[Timer]\nOnCalendar=weekly\n")
+
+        TimerHelper().update_timers([])
+
+        assert (systemd_dir / "logrotate.timer").exists()
+        mock_systemctl.assert_not_called()
+
+
+class TestSystemdScheduler:
+    """Systemd scheduler of the cron helper tests."""
+
+    @pytest.mark.parametrize(
+        ("schedule", "on_calendar", "delay"),
+        [
+            ("unset", "daily", None),
+            ("set,8:05", "*-*-* 08:05:00", None),
+            ("random,06:00,07:30", "*-*-* 06:00:00", "90min"),
+        ],
+    )
+    def test_logrotate_timer(self, cron, schedule, on_calendar, delay):
+        """Test the cron.daily schedule is translated to the logrotate timer."""
+        cron_config = cron()
+        cron_config.cron_daily_schedule = schedule
+
+        timer = cron_config.logrotate_timer()
+
+        assert timer.on_calendar == on_calendar
+        assert timer.randomized_delay == delay
+        assert timer.exec_start == "/usr/sbin/logrotate /etc/logrotate.conf"
+
+    def test_spread_logrotate_timer(self, cron, mocker):
+        """Test the spread schedule runs the logrotate timer at the slot of the unit."""
+        mocker.patch.object(cron, "unit_position", return_value=0.5)
+        cron_config = cron()
+        cron_config.cron_daily_schedule = "spread,01:00,03:00"
+
+        timer = cron_config.logrotate_timer()
+
+        assert timer.on_calendar == "*-*-* 02:00:00"
+        assert timer.randomized_delay == "0"
+
+    def test_install_cronjob(self, cron, mock_local_unit, systemd_dir, mocker):
+        """Test timers replace the cron file and the crontab edit."""
+        mocker.patch("lib_cron.os.getcwd", return_value="/mock/unit-logrotated-0/charm")
+        mocker.patch("charmhelpers.core.hookenv.has_juju_version", return_value=True)
+        mocker.patch("lib_timer.systemctl")
+        mock_cleanup = mocker.patch.object(cron, "cleanup_cronjob_files")
+        mock_write_cronjob_file = mocker.patch.object(cron, "write_cronjob_file")
+        mock_write_to_crontab = mocker.patch.object(cron, "write_to_crontab")
+
+        cron_config = cron()
+        cron_config.cronjob_enabled = True
+        cron_config.cronjob_frequency = 0
+        cron_config.cron_daily_schedule = "set,02:30"
+        cron_config.scheduler = "systemd"
+        cron_config.install_cronjob()
+
+        mock_cleanup.assert_called_once_with()
+        mock_write_cronjob_file.assert_not_called()
+        mock_write_to_crontab.assert_not_called()
+        service = (systemd_dir / "charm-logrotate-refresh.service").read_text()
+        assert (
+            'ExecStart=/usr/bin/juju-exec unit-logrotated/0 "/mock/unit-logrotated-0/.venv/bin/'
+            "python3 " in service
+        )
+        assert "OnCalendar=hourly\n" in (systemd_dir / "charm-logrotate-refresh.timer").read_text()
+        assert "OnCalendar=*-*-* 02:30:00\n" in (systemd_dir / "logrotate.timer").read_text()
+
+    def test_invalid_scheduler(self, cron):
+        """Test an unknown scheduler is refused."""
+        cron_config = cron()
+        cron_config.scheduler = "anacron"
+
+        with pytest.raises(cron_config.InvalidCronConfig, match="logrotate-scheduler"):
+            cron_config.install_cronjob()
+
+    def test_uninstall_cronjob(self, cron, systemd_dir, tmp_path, mocker):
+        """Test the timers, the wrapper, the drop-in and the saved config are removed."""
+        mocker.patch("lib_timer.systemctl")
+        mock_systemctl = mocker.patch("lib_cron.systemctl")
+        mock_cleanup = mocker.patch.object(cron, "cleanup_cronjob_files")
+        mock_wrapper = mocker.patch.object(cron, "update_cron_daily_wrapper")
+        TimerHelper().update_timers([REFRESH, Timer("logrotate", "Rotate", "daily", "logrotate")])
+        drop_in = systemd_dir / "logrotate.service.d" / "charm-logrotate.conf"
+        drop_in.parent.mkdir()
+        drop_in.write_text(MANAGED_MARKER + "\n")
+        saved_config = tmp_path / "logrotate_cronjob_config"
+        saved_config.write_text("{}")
+
+        cron_config = cron()
+        cron_config.cronjob_etc_config = str(saved_config)
+        cron_config.uninstall_cronjob()
+
+        mock_cleanup.assert_called_once_with()
+        mock_wrapper.assert_called_once_with(False)
+        assert sorted(path.name for path in systemd_dir.iterdir()) == ["packaged"]
+        mock_systemctl.assert_called_once_with("daemon-reload")
+        assert not saved_config.exists()
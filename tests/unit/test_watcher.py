@@ -0,0 +1,128 @@
+"""Unit tests for the watcher service."""
+
+from unittest import mock
+
+import pytest
+from lib_snapshot import ConfigSnapshot
+from lib_watcher import ConfigWatcher, WatcherHelper
+
+
+class TestConfigWatcher:
+    """Config watcher test class."""
+
+    def test_wait_for_changes(self, tmp_path):
+        """Test a burst of events is returned as one sorted batch."""
+        watcher = ConfigWatcher(str(tmp_path), debounce=0.05)
+        try:
+            for name in ("b", "a", ".a.tmp", "b"):
+                (tmp_path / name).write_text("content")
+            (tmp_path / "c.tmp").write_text("content")
+            (tmp_path / "c.tmp").rename(tmp_path / "c")
+
+            assert watcher.wait_for_changes() == ["a", "b", "c"]
+        finally:
+            watcher.close()
+
+    @pytest.mark.parametrize(
+        "name, expected",
+        [("apt", True), (".apt.tmp", False), ("apt~", False), ("apt.tmp", False), ("", False)],
+    )
+    def test_is_relevant(self, name, expected):
+        """Test temporary files are ignored."""
+        assert ConfigWatcher.is_relevant(name) == expected
+
+
+class TestWatcherHelper:
+    """Watcher helper test class."""
+
+    def test_update_service_enabled(self, mocker):
+        """Test the service is installed and restarted when the unit changes."""
+        mocker.patch("lib_watcher.os.getcwd", return_value="/mock/unit-logrotated-0/charm")
+        mock_write_unit = mocker.patch("lib_watcher.write_unit", return_value=True)
+        mock_systemctl = mocker.patch("lib_watcher.systemctl")
+
+        WatcherHelper().update_service(True)
+
+        unit = mock_write_unit.call_args[0][1]
+        (exec_start,) = [line for line in unit.splitlines() if line.startswith("ExecStart=")]
+        assert exec_start.startswith("ExecStart=/mock/unit-logrotated-0/.venv/bin/python3 ")
+        assert exec_start.endswith("/lib/lib_watcher.py")
+        mock_systemctl.assert_has_calls(
+            [
+                mock.call("daemon-reload"),
+                mock.call("enable", "charm-logrotate-watcher.service"),
+                mock.call("restart", "charm-logrotate-watcher.service"),
+            ]
+        )
+
+    def test_update_service_disabled(self, mocker):
+        """Test the service is removed when disabled."""
+        mocker.patch("lib_watcher.unit_exists", return_value=True)
+        mock_remove_unit = mocker.patch("lib_watcher.remove_unit")
+        mock_systemctl = mocker.patch("lib_watcher.systemctl")
+
+        WatcherHelper().update_service(False)
+
+        mock_remove_unit.assert_called_once_with("charm-logrotate-watcher.service")
+        mock_systemctl.assert_has_calls(
+            [
+                mock.call("disable", "--now", "charm-logrotate-watcher.service"),
+                mock.call("daemon-reload"),
+            ]
+        )
+
+    def test_update_service_not_installed(self, mocker):
+        """Test nothing happens when disabled and not installed."""
+        mocker.patch("lib_watcher.unit_exists", return_value=False)
+        mock_systemctl = mocker.patch("lib_watcher.systemctl")
+
+        WatcherHelper().update_service(False)
+
+        mock_systemctl.assert_not_called()
+
+
+class TestWatcherConfig:
+    """Config handling for the watcher test class."""
+
+    def test_from_config_file(self, tmp_path, mocker):
+        """Test the helper is configured from the dumped config."""
+        config_path = tmp_path / "logrotate_cronjob_config"
+        mocker.patch("lib_snapshot.SNAPSHOT_FILE", str(config_path))
+        ConfigSnapshot.from_charm_config(
+            {
+                "logrotate-retention": 14,
+                "override": '[{"path": "/etc/logrotate.d/apt", "rotate": 3}]',
+            }
+        ).write()
+        mock_config = mocker.patch("charmhelpers.core.hookenv.config")
+        from lib_logrotate import LogrotateHelper
+
+        logrotate = LogrotateHelper.from_config_file()
+
+        mock_config.assert_not_called()
+        assert logrotate.retention == 14
+        assert logrotate.get_override_settings("/etc/logrotate.d/apt")["rotate"] == 3
+
+    def test_modify_selected_configs(self, logrotate_helper, logrotate_dir):
+        """Test only the requested files are processed."""
+        for name in ("apt", "dpkg"):
+            (logrotate_dir / name).write_text("/var/log/{}.log {{\n  daily\n}}\n".format(name))
+
+        logrotate_helper.modify_configs(["apt"])
+
+        assert "rotate 30" in (logrotate_dir / "apt").read_text()
+        assert "rotate" not in (logrotate_dir / "dpkg").read_text()
+
+    def test_cronjob_replaced_by_watcher(self, cron, mocker):
+        """Test the cron job is not installed when the watcher is enabled."""
+        mocker.patch("lib_cron.os.path.exists", return_value=False)
+        mock_write_cronjob_file = mocker.patch.object(cron, "write_cronjob_file")
+        mock_cleanup_etc_config = mocker.patch.object(cron, "cleanup_etc_config")
+
+        cron_config = cron()
+        cron_config.cronjob_enabled = False
+        cron_config.watcher_enabled = True
+        cron_config.install_cronjob()
+
+        mock_write_cronjob_file.assert_not_called()
+        mock_cleanup_etc_config.assert_not_called()